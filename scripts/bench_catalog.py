@@ -0,0 +1,49 @@
+"""Per-call latency of CatalogTool against the old linear scan at 1k / 100k / 1M SKUs.
+
+    python -m scripts.bench_catalog [--sizes 1000,100000,1000000] [--calls 200]
+"""
+import argparse, random, time
+from src.tools.catalog import BUNDLE_TAGS, CatalogTool
+
+TAGS = BUNDLE_TAGS + ["ergonomic", "focus_space", "acoustic", "outdoor"]
+
+def synth_catalog(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [{"sku": f"SKU-{i:07d}", "name": f"NestWell Item {i}", "price": rng.randint(20, 2500),
+             "tags": rng.sample(TAGS, 2) + rng.choice([["b2c"], ["b2b"], ["b2c", "b2b"]])} for i in range(n)]
+
+def linear_recommend(catalog, traits):
+    budget = traits.get("budget_per_room")
+    seg = traits["segment"].lower()
+    items = []
+    for k in BUNDLE_TAGS:
+        candidates = [p for p in catalog if k in p["tags"] and seg in p["tags"] and p["price"] <= budget]
+        if candidates:
+            items.append(random.choice(candidates))
+    return items[:3]
+
+def per_call_us(fn, calls):
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - t0) / calls * 1e6
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1000,100000,1000000")
+    ap.add_argument("--calls", type=int, default=200)
+    args = ap.parse_args()
+    traits = {"segment": "B2B", "budget_per_room": 1500}
+    print(f"{'skus':>9} {'build ms':>9} {'bundle us':>10} {'quote us':>9} {'linear us':>10}")
+    for n in [int(s) for s in args.sizes.split(",")]:
+        catalog = synth_catalog(n)
+        t0 = time.perf_counter()
+        tool = CatalogTool(catalog)
+        build_ms = (time.perf_counter() - t0) * 1e3
+        bundle = per_call_us(lambda: tool.recommend_bundle("lounge", traits=traits), args.calls)
+        quote = per_call_us(lambda: tool.price_quote("10 units", traits=traits), args.calls)
+        linear = per_call_us(lambda: linear_recommend(catalog, traits), max(1, min(args.calls, 2_000_000 // n)))
+        print(f"{n:>9} {build_ms:>9.1f} {bundle:>10.1f} {quote:>9.1f} {linear:>10.1f}")
+
+if __name__ == "__main__":
+    main()
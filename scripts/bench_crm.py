@@ -0,0 +1,94 @@
+"""CRM writes through the outbox vs straight to a slow, flaky CRM.
+
+    python -m scripts.bench_crm [--writes 2000] [--threads 16] [--retry-rate 0.3] [--latency-ms 40] [--fail-rate 0.2]
+
+Each thread creates leads and opportunities for its share of messages, and a --retry-rate
+fraction of messages is sent twice (a client retry). "direct" calls the fake CRM inline, one
+upsert per write. "outbox" records each write locally and lets the flusher send bulk
+upserts in the background. Reports per-write latency, time until the CRM holds everything,
+and how many CRM records and upserts there were. With idempotency keys the record count
+matches the number of distinct messages despite retries and failed batches.
+"""
+import argparse, os, random, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+
+def pct(ms: list[float], p: float) -> float:
+    ms = sorted(ms)
+    return round(ms[min(len(ms) - 1, int(p * len(ms)))], 3)
+
+def workload(n: int, retry_rate: float, seed: int = 7) -> list[tuple[str, str, str]]:
+    rng = random.Random(seed)
+    msgs = [(f"user{rng.randrange(200)}", rng.choice(["lead", "opportunity"]), f"message {i}") for i in range(n)]
+    return msgs + [m for m in msgs if rng.random() < retry_rate]
+
+def run(crm, calls, threads: int) -> list[float]:
+    def one(call):
+        user, kind, message = call
+        t0 = time.perf_counter()
+        if kind == "lead":
+            crm.create_lead(user, {"message": message}, source=message)
+        else:
+            crm.create_opportunity(user, {"total": 100.0, "items": []}, source=message)
+        return (time.perf_counter() - t0) * 1000
+    with ThreadPoolExecutor(threads) as pool:
+        return list(pool.map(one, calls))
+
+class DirectCRM:
+    """The old shape: every write is a synchronous CRM call (retried inline until it lands)."""
+    def __init__(self, backend):
+        from src.tools.crm_outbox import idempotency_key, record_id
+        self.backend, self.key, self.rid = backend, idempotency_key, record_id
+
+    def _send(self, kind, user_id, content, source):
+        key = self.key(user_id, kind, source)
+        for attempt in range(10):
+            try:
+                self.backend.upsert([{"key": key, "kind": kind, "id": self.rid(kind[0].upper(), key), "user_id": user_id,
+                                      "payload": content}])
+                return key
+            except ConnectionError:
+                time.sleep(min(1.0, 0.01 * 2 ** attempt))
+
+    def create_lead(self, user_id, context, source=None):
+        return self._send("lead", user_id, context, source)
+
+    def create_opportunity(self, user_id, quote, source=None):
+        return self._send("opportunity", user_id, quote, source)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--writes", type=int, default=2000)
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--retry-rate", type=float, default=0.3)
+    ap.add_argument("--latency-ms", type=float, default=40, help="fake CRM time per upsert call")
+    ap.add_argument("--fail-rate", type=float, default=0.2, help="fraction of upsert calls that fail")
+    args = ap.parse_args()
+
+    from src.tools.crm import CRMTool
+    from src.tools.crm_outbox import FakeCRM, Outbox
+    calls = workload(args.writes, args.retry_rate)
+    distinct = len({c for c in calls})
+    tmp = tempfile.mkdtemp(prefix="bench-crm-")
+    print(f"{len(calls)} writes ({distinct} distinct messages), {args.threads} threads, "
+          f"CRM {args.latency_ms:g} ms/call, {args.fail_rate:.0%} of calls fail")
+    print(f"{'mode':<8} {'p50 ms':>8} {'p99 ms':>8} {'writes/s':>9} {'synced s':>9} {'records':>8} {'upserts':>8}")
+
+    for mode in ("direct", "outbox"):
+        fake = FakeCRM(os.path.join(tmp, f"{mode}-crm.sqlite"), fail_rate=args.fail_rate, latency_ms=args.latency_ms)
+        outbox = Outbox(os.path.join(tmp, f"{mode}-outbox.sqlite"), backend=fake, flush_ms=20) if mode == "outbox" else None
+        crm = CRMTool(outbox) if outbox else DirectCRM(fake)
+        t0 = time.perf_counter()
+        ms = run(crm, calls, args.threads)
+        took = time.perf_counter() - t0
+        if outbox:
+            while outbox.pending():
+                time.sleep(0.05)
+        synced = time.perf_counter() - t0
+        s = fake.stats()
+        print(f"{mode:<8} {pct(ms, 0.5):>8.3f} {pct(ms, 0.99):>8.3f} {len(calls) / took:>9.0f} {synced:>9.2f} "
+              f"{s['records']:>8} {s['upserts']:>8}")
+        if outbox:
+            outbox.close()
+
+if __name__ == "__main__":
+    main()
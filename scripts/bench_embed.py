@@ -0,0 +1,35 @@
+"""Embeddings/sec: legacy per-text reseeding loop vs the batched backend, cold and cached.
+
+    python -m scripts.bench_embed [--n 20000]
+"""
+import argparse, os, tempfile, time
+import numpy as np
+from src.tools.embeddings import Embedder, EmbeddingCache, make_backend
+
+def legacy_embed(texts):
+    vecs = []
+    for t in texts:
+        np.random.seed(abs(hash(t)) % 10**8)
+        vecs.append(np.random.rand(384).astype("float32"))
+    return np.vstack(vecs)
+
+def rate(n, fn):
+    t0 = time.perf_counter()
+    fn()
+    return n / (time.perf_counter() - t0)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20000)
+    ap.add_argument("--backend", default=None)
+    args = ap.parse_args()
+    texts = [f"Question {i}: what is the return window for order NW{i:05d}?" for i in range(args.n)]
+    with tempfile.TemporaryDirectory() as tmp:
+        emb = Embedder(make_backend(args.backend), EmbeddingCache(os.path.join(tmp, "cache.sqlite")))
+        print(f"legacy loop      {rate(args.n, lambda: legacy_embed(texts)):>12,.0f} emb/s")
+        print(f"batched (cold)   {rate(args.n, lambda: emb.embed(texts)):>12,.0f} emb/s")
+        print(f"batched (cached) {rate(args.n, lambda: emb.embed(texts)):>12,.0f} emb/s")
+        print(emb.stats())
+
+if __name__ == "__main__":
+    main()
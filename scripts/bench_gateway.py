@@ -0,0 +1,79 @@
+"""Burst through the LLM gateway against a rate-limited stub.
+
+    python -m scripts.bench_gateway [--requests 120] [--rpm 600] [--threads 32]
+
+The stub answers like llm_stub but, like the real API, returns 429 with Retry-After once
+more than --rpm requests arrive in a rolling minute (scaled down: --window seconds) and
+fails --error-rate of requests with a 503. The same burst is sent twice: straight at the
+API with no retries, then through the gateway's scheduler and backoff.
+"""
+import argparse, json, random, threading, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import httpx, openai
+from src.agents import llm_stub
+from src.agents.llm_gateway import Gateway, Scheduler
+
+def limited_api(rpm: int, window: float, error_rate: float, latency: float):
+    seen, lock = deque(), threading.Lock()
+
+    def handle(req: httpx.Request) -> httpx.Response:
+        time.sleep(latency)
+        now = time.monotonic()
+        with lock:
+            while seen and now - seen[0] > window:
+                seen.popleft()
+            if len(seen) >= rpm:
+                return httpx.Response(429, headers={"retry-after": f"{window - (now - seen[0]):.3f}"},
+                                      json={"error": {"message": "rate limited", "type": "requests"}})
+            seen.append(now)
+        if random.random() < error_rate:
+            return httpx.Response(503, json={"error": {"message": "overloaded"}})
+        return httpx.Response(200, json=llm_stub.complete(json.loads(req.content), delay=False))
+
+    return openai.OpenAI(api_key="stub", base_url="http://llm-stub/v1", max_retries=0,
+                         http_client=httpx.Client(transport=httpx.MockTransport(handle)))
+
+def burst(create, n: int, threads: int) -> dict:
+    domains = ["support", "sales", "kb", "marketing"]
+    ok, latencies = 0, {d: [] for d in domains}
+
+    def one(i):
+        domain = domains[i % len(domains)]
+        t0 = time.perf_counter()
+        try:
+            create(domain, model="stub", messages=[{"role": "user", "content": f"question {i} about my order"}])
+            return domain, time.perf_counter() - t0
+        except openai.APIError:
+            return domain, None
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        for domain, took in pool.map(one, range(n)):
+            if took is not None:
+                ok += 1
+                latencies[domain].append(took)
+    return {"ok": ok, "failed": n - ok, "seconds": round(time.perf_counter() - t0, 2),
+            "p50_s_by_domain": {d: round(sorted(v)[len(v) // 2], 2) if v else None for d, v in latencies.items()}}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=120)
+    ap.add_argument("--rpm", type=int, default=600, help="limit per --window, expressed per minute")
+    ap.add_argument("--window", type=float, default=2.0, help="seconds that stand in for a minute")
+    ap.add_argument("--threads", type=int, default=32)
+    ap.add_argument("--error-rate", type=float, default=0.05)
+    ap.add_argument("--latency-ms", type=float, default=50)
+    args = ap.parse_args()
+    per_window = max(1, int(args.rpm * args.window / 60))
+    api = lambda: limited_api(per_window, args.window, args.error_rate, args.latency_ms / 1000)
+
+    raw = api()
+    print("direct   ", burst(lambda domain, **r: raw.chat.completions.create(**r), args.requests, args.threads))
+    # the scheduler's bucket refills per minute; scale it to the stub's window
+    gw = Gateway(client=api(), scheduler=Scheduler(rpm=per_window * 60 / args.window, burst_secs=args.window / 2), backoff_base=0.05, backoff_cap=1)
+    print("gateway  ", burst(gw.create, args.requests, args.threads))
+    print("stats    ", gw.stats())
+
+if __name__ == "__main__":
+    main()
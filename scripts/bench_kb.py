@@ -0,0 +1,40 @@
+"""KB retrieval throughput: one embed+search per query (old answer loop) vs one batched answer_many call.
+
+Runs with the embedding cache off so both paths pay for embedding, as fresh questions do.
+
+    python -m scripts.bench_kb [--n 2000] [--k 3]
+"""
+import argparse, os, time
+os.environ.setdefault("EMBED_CACHE", "false")
+from src.tools.kb import KBTool, embed, format_hit
+
+BASE = ["what is your return policy", "how long is the warranty", "when will my order ship",
+        "how many people fit on the lounge sofa", "is the fabric stain resistant"]
+
+def answer_one(kb, q):
+    D, I = kb.index.search(embed([q]), 1)
+    c = kb.chunks.get(int(I[0][0]))
+    return format_hit(c)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=2000)
+    ap.add_argument("--k", type=int, default=3)
+    args = ap.parse_args()
+    queries = [f"{BASE[i % len(BASE)]} (ticket {i})" for i in range(args.n)]
+    kb = KBTool()
+    kb.answer_many(queries[:10])  # warm up imports and the index mapping
+
+    t0 = time.perf_counter()
+    for q in queries:
+        answer_one(kb, q)
+    loop = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    kb.answer_many(queries, k=args.k)
+    batch = time.perf_counter() - t0
+    print(f"one-at-a-time     {args.n / loop:>10,.0f} q/s")
+    print(f"answer_many k={args.k}   {args.n / batch:>10,.0f} q/s  ({loop / batch:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""MemoryStore benchmarks.
+
+    python -m scripts.bench_memory reads  [--sizes 10000,100000,1000000] [--users 5000]
+    python -m scripts.bench_memory writes [--events 20000] [--threads 4]
+
+`reads` measures get_profile latency as the log grows; `writes` measures append
+throughput (events/sec) of the old open/append/close path against the group-commit writer.
+"""
+import argparse, json, os, random, tempfile, threading, time
+from pathlib import Path
+from src.memory.store import MemoryStore
+
+def write_log(path: Path, lines: int, users: int):
+    rng = random.Random(3)
+    with open(path, "w") as f:
+        for i in range(lines):
+            f.write(json.dumps({"user_id": f"u{rng.randrange(users)}", "intent": "kb_answer", "q": f"question {i}"}) + "\n")
+
+def scan_profile(path: Path, user_id: str, last_n: int):
+    """What a flat-file get_profile has to do: read the whole log for one user."""
+    hist = []
+    with open(path) as f:
+        for line in f:
+            ev = json.loads(line)
+            if ev["user_id"] == user_id:
+                hist.append(ev)
+    return hist[-last_n:]
+
+def legacy_append(path: Path, user_id: str, event: dict):
+    """The original add_interaction: one open/write/close per event."""
+    with open(path, "a") as f:
+        f.write(json.dumps({"user_id": user_id, **event}) + "\n")
+
+def run_writers(add, events: int, threads: int) -> float:
+    per = events // threads
+    def work(t):
+        for i in range(per):
+            add(f"u{t}-{i % 50}", {"intent": "kb_answer", "q": f"question {i}"})
+    workers = [threading.Thread(target=work, args=(t,)) for t in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return time.perf_counter() - t0
+
+def bench_writes(args):
+    print(f"{'writer':<26} {'events/s':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        log = Path(tmp) / "legacy.jsonl"
+        secs = run_writers(lambda u, e: legacy_append(log, u, e), args.events, args.threads)
+        print(f"{'legacy open/append/close':<26} {args.events / secs:>10,.0f}")
+    modes = [("unbuffered (per event)", dict(buffered=False))] + \
+            [(f"group commit, {d}", dict(buffered=True, durability=d)) for d in ("none", "flush", "fsync")]
+    for label, kw in modes:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = MemoryStore(Path(tmp) / "log", Path(tmp) / "memory.db", legacy_path=None, **kw)
+            t0 = time.perf_counter()
+            run_writers(store.add_interaction, args.events, args.threads)
+            store.close()  # include the final drain
+            secs = time.perf_counter() - t0
+            print(f"{label:<26} {args.events / secs:>10,.0f}   batches={store.batches}")
+
+def bench_reads(args):
+    print(f"{'lines':>9} {'index s':>8} {'get_profile us':>15} {'full scan ms':>13}")
+    for n in [int(s) for s in args.sizes.split(",")]:
+        with tempfile.TemporaryDirectory() as tmp:
+            log = Path(tmp) / "log" / "00000001.jsonl"
+            log.parent.mkdir()
+            write_log(log, n, args.users)
+            t0 = time.perf_counter()
+            store = MemoryStore(log.parent, Path(tmp) / "memory.db", legacy_path=None)
+            index_s = time.perf_counter() - t0
+            ids = [f"u{random.randrange(args.users)}" for _ in range(args.reads)]
+            t0 = time.perf_counter()
+            for u in ids:
+                store.get_profile(u)
+            read_us = (time.perf_counter() - t0) / args.reads * 1e6
+            t0 = time.perf_counter()
+            scan_profile(log, ids[0], 20)
+            scan_ms = (time.perf_counter() - t0) * 1e3
+            print(f"{n:>9} {index_s:>8.2f} {read_us:>15.1f} {scan_ms:>13.1f}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("mode", choices=["reads", "writes"], nargs="?", default="reads")
+    ap.add_argument("--sizes", default="10000,100000,1000000")
+    ap.add_argument("--users", type=int, default=5000)
+    ap.add_argument("--reads", type=int, default=500)
+    ap.add_argument("--events", type=int, default=20000)
+    ap.add_argument("--threads", type=int, default=4)
+    args = ap.parse_args()
+    bench_reads(args) if args.mode == "reads" else bench_writes(args)
+
+if __name__ == "__main__":
+    main()
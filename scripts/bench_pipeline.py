@@ -0,0 +1,202 @@
+"""Load and regression benchmark for the agent pipeline, with the LLM replaced by the local stub.
+
+    python -m scripts.bench_pipeline [--n 2000] [--stages router,orchestrator,orchestrator-llm,planner,api,api-llm]
+                                     [--concurrency 16] [--warmup 20] [--llm-latency-ms 0]
+                                     [--out results.json] [--compare old.json]
+
+Messages come from demo_prompts, demo_data/routing/corpus.jsonl and any --corpus JSONL files
+(one object per line with a "message", "text" or "body" field), topped up to --n with
+generated variants. Each stage replays the same messages and reports p50/p95/p99 latency,
+requests/sec, process RSS growth and its slowest instrumented operations. Memory, case and CRM
+outbox writes go to a temporary directory; completion and answer caches are off unless --caches is given.
+
+Results are written as JSON (default bench_results/pipeline-<commit>.json, next to the git
+commit and settings they came from); --compare prints the per-stage change against an
+earlier file.
+"""
+import argparse, asyncio, json, os, random, re, resource, subprocess, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+STAGES = ["router", "orchestrator", "orchestrator-llm", "planner", "api", "api-llm"]
+
+def prompts_from_demo(path: Path) -> list[str]:
+    return re.findall(r"[“\"]([^”\"]+)[”\"]", path.read_text()) if path.exists() else []
+
+def prompts_from_jsonl(path: Path) -> list[str]:
+    out = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                text = row.get("message") or row.get("text") or row.get("body")
+                if text:
+                    out.append(text)
+    return out
+
+TEMPLATES = [
+    "I'm outfitting a {room}. Our budget is about ${budget} per room. What do you recommend?",
+    "Can you recommend a bundle for our {room}?",
+    "We need a quote for {n} units by end of {period}.",
+    "What's the price for {n} {product}?",
+    "My order NW{oid} is delayed, I might cancel.",
+    "I'd like to return order NW{oid}.",
+    "What's the warranty on the {product}?",
+    "Do you deliver to {place}?",
+    "How do I care for a {product}?",
+]
+FILL = {"room": ["team lounge", "focus room", "reception", "home office", "break room"],
+        "product": ["ergonomic chairs", "standing desks", "quiet pods", "lounge sofas", "privacy screens"],
+        "period": ["quarter", "month", "year"], "place": ["Denver", "Toronto", "Austin", "Chicago"]}
+
+def variants(n: int, seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    return [rng.choice(TEMPLATES).format(room=rng.choice(FILL["room"]), product=rng.choice(FILL["product"]),
+                                         period=rng.choice(FILL["period"]), place=rng.choice(FILL["place"]),
+                                         budget=rng.randrange(500, 5000, 50), n=rng.randrange(2, 200),
+                                         oid=rng.randrange(10000, 99999))
+            for _ in range(n)]
+
+def corpus(n: int, extra: list[str]) -> list[str]:
+    msgs = prompts_from_demo(ROOT / "demo_prompts") + prompts_from_jsonl(ROOT / "demo_data/routing/corpus.jsonl")
+    for path in extra:
+        msgs += prompts_from_jsonl(Path(path))
+    msgs += variants(max(0, n - len(msgs)))
+    return msgs[:n]
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+def pct(sorted_ms: list[float], p: float) -> float:
+    return round(sorted_ms[min(len(sorted_ms) - 1, int(p * len(sorted_ms)))], 3)
+
+def summarize(latencies: list[float], seconds: float, rss0: float, errors: int, profile: list) -> dict:
+    from src.observability.metrics import summarize as ops
+    ms = sorted(t * 1000 for t in latencies)
+    return {"requests": len(ms), "errors": errors, "seconds": round(seconds, 3), "rps": round(len(ms) / seconds, 1),
+            "p50_ms": pct(ms, 0.5), "p95_ms": pct(ms, 0.95), "p99_ms": pct(ms, 0.99), "max_ms": round(ms[-1], 3),
+            "rss_mb": round(rss_mb(), 1), "rss_growth_mb": round(rss_mb() - rss0, 1),
+            "top_ops": ops(profile)[:8]}
+
+def run_sync(fn, msgs: list[str], warmup: int) -> dict:
+    from src.observability.metrics import profiled
+    for i, m in enumerate(msgs[:warmup]):  # first-call costs (index loads, imports, pools) stay out of the numbers
+        fn(f"warmup{i}", m)
+    latencies, errors, rss0 = [], 0, rss_mb()
+    with profiled() as profile:
+        t0 = time.perf_counter()
+        for i, m in enumerate(msgs):
+            s = time.perf_counter()
+            try:
+                fn(f"bench{i % 200}", m)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - s)
+        took = time.perf_counter() - t0
+    return summarize(latencies, took, rss0, errors, profile)
+
+def run_api(msgs: list[str], concurrency: int, warmup: int) -> dict:
+    import httpx
+    from src.server.app import app
+    from src.observability.metrics import profiled
+
+    async def main():
+        limit, latencies, errors = asyncio.Semaphore(concurrency), [], 0
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            async def one(i, m):
+                nonlocal errors
+                async with limit:
+                    s = time.perf_counter()
+                    r = await client.post("/chat", json={"user_id": f"bench{i % 200}", "message": m}, timeout=120)
+                    latencies.append(time.perf_counter() - s)
+                    errors += r.status_code != 200
+            for i, m in enumerate(msgs[:warmup]):
+                await client.post("/chat", json={"user_id": f"warmup{i}", "message": m}, timeout=120)
+            latencies.clear()
+            errors = 0
+            t0 = time.perf_counter()
+            await asyncio.gather(*(one(i, m) for i, m in enumerate(msgs)))
+            return latencies, errors, time.perf_counter() - t0
+
+    rss0 = rss_mb()
+    with profiled() as profile:
+        latencies, errors, took = asyncio.run(main())
+    return summarize(latencies, took, rss0, errors, profile)
+
+def run_stage(stage: str, msgs: list[str], concurrency: int, warmup: int) -> dict:
+    if stage == "router":
+        from src.agents.router import classify
+        return run_sync(lambda user, m: classify(m), msgs, warmup)
+    if stage in ("orchestrator", "orchestrator-llm"):
+        from src.agents.orchestrator import Orchestrator
+        orc = Orchestrator(use_llm=stage == "orchestrator-llm")
+        return run_sync(orc.handle_message, msgs, warmup)
+    if stage == "planner":
+        from src.agents import resources
+        graph = resources.graph()
+        return run_sync(lambda user, m: graph.invoke({"message": m, "user_id": user})["result"], msgs, warmup)
+    if stage in ("api", "api-llm"):
+        from src.server import app
+        app.orc.use_llm = stage == "api-llm"
+        return run_api(msgs, concurrency, warmup)
+    raise SystemExit(f"unknown stage {stage}")
+
+def compare(old: dict, new: dict):
+    print(f"\nvs {old.get('commit', '?')}:")
+    for stage, cur in new["stages"].items():
+        prev = old.get("stages", {}).get(stage)
+        if not prev:
+            continue
+        cells = []
+        for key in ("p50_ms", "p95_ms", "p99_ms", "rps"):
+            delta = (cur[key] - prev[key]) / prev[key] * 100 if prev[key] else 0.0
+            cells.append(f"{key} {prev[key]:g} -> {cur[key]:g} ({delta:+.1f}%)")
+        print(f"  {stage:<17} " + "  ".join(cells))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=2000, help="messages per stage")
+    ap.add_argument("--stages", default=",".join(STAGES))
+    ap.add_argument("--corpus", action="append", default=[], help="extra JSONL prompt file (repeatable)")
+    ap.add_argument("--concurrency", type=int, default=16, help="in-flight requests for the api stages")
+    ap.add_argument("--warmup", type=int, default=20, help="untimed messages before each stage")
+    ap.add_argument("--llm-latency-ms", type=float, default=0, help="simulated model latency per completion")
+    ap.add_argument("--caches", action="store_true", help="leave the completion and answer caches on")
+    ap.add_argument("--out")
+    ap.add_argument("--compare")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-pipeline-")
+    # set before anything under src/ is imported: module settings are read at import time
+    os.environ.update(LLM_BACKEND="stub", OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "stub"),
+                      LLM_STUB_LATENCY_MS=str(args.llm_latency_ms),
+                      MEMORY_LOG_DIR=os.path.join(tmp, "log"), MEMORY_INDEX_PATH=os.path.join(tmp, "memory.db"),
+                      LLM_CACHE_PATH=os.path.join(tmp, "llm_cache.sqlite"), HELPDESK_DB_PATH=os.path.join(tmp, "helpdesk.sqlite"),
+                      CRM_OUTBOX_PATH=os.path.join(tmp, "crm_outbox.sqlite"), CRM_FAKE_PATH=os.path.join(tmp, "crm_fake.sqlite"))
+    if not args.caches:
+        os.environ.update(LLM_CACHE="false", ANSWER_CACHE="false")
+    os.environ.setdefault("TRACE_EXPORTER", "none")
+
+    msgs = corpus(args.n, args.corpus)
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    result = {"commit": commit or None, "python": sys.version.split()[0], "n": len(msgs), "concurrency": args.concurrency,
+              "llm_latency_ms": args.llm_latency_ms, "caches": args.caches, "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "stages": {}}
+    print(f"{len(msgs)} messages per stage")
+    print(f"{'stage':<17} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'rss MB':>8} {'+MB':>6} {'err':>4}")
+    for stage in args.stages.split(","):
+        r = result["stages"][stage] = run_stage(stage, msgs, args.concurrency, args.warmup)
+        print(f"{stage:<17} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['p99_ms']:>9.3f} {r['rps']:>9.1f} "
+              f"{r['rss_mb']:>8.1f} {r['rss_growth_mb']:>6.1f} {r['errors']:>4}")
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    out = Path(args.out or ROOT / "bench_results" / f"pipeline-{commit or 'local'}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2) + "\n")
+    print(f"wrote {out}")
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), result)
+
+if __name__ == "__main__":
+    main()
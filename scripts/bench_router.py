@@ -0,0 +1,69 @@
+"""Intent router parity check and micro-benchmark.
+
+    python -m scripts.bench_router [--repeat 200]
+
+Every message in demo_data/routing/corpus.jsonl carries the intent the old planner and
+Orchestrator keyword checks gave it. The compiled router must agree with the planner on
+all of them; it differs from the old Orchestrator only where the Orchestrator lacked the
+planner's "by end of" sales keyword.
+"""
+import argparse, json, os, time
+from src.agents.router import classify, route, route_many
+
+CORPUS = os.path.join(os.path.dirname(__file__), "../demo_data/routing/corpus.jsonl")
+
+def legacy_planner(message: str) -> str:
+    m = message.lower()
+    if any(k in m for k in ["lounge","recommend","bundle"]):
+        return "marketing"
+    elif any(k in m for k in ["price","quote","units","by end of"]):
+        return "sales"
+    elif any(k in m for k in ["order","delayed","cancel","return"]):
+        return "support"
+    return "kb"
+
+def legacy_orchestrator(message: str) -> str:
+    m = message.lower()
+    if "lounge" in m or "recommend" in m or "bundle" in m:
+        return "marketing"
+    if "price" in m or "quote" in m or "units" in m:
+        return "sales"
+    if "order" in m or "delayed" in m or "cancel" in m or "return" in m:
+        return "support"
+    return "kb"
+
+def timed(fn, msgs, repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(msgs)
+    return (time.perf_counter() - t0) / (repeat * len(msgs)) * 1e6
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+    with open(CORPUS) as f:
+        corpus = [json.loads(line) for line in f]
+    msgs = [c["message"] for c in corpus]
+
+    routed = [r.intent for r in route_many(msgs)]
+    assert routed == [route(m).intent for m in msgs] == [classify(m) for m in msgs], "route/route_many/classify disagree"
+    wrong = [(c["message"], c["planner"], r) for c, r in zip(corpus, routed) if r != c["planner"]]
+    for msg, want, got in wrong:
+        print(f"MISMATCH {msg!r}: planner={want} router={got}")
+    changed = sum(r != c["orchestrator"] for c, r in zip(corpus, routed))
+    expected = sum(c["planner"] != c["orchestrator"] for c in corpus)
+    print(f"{len(corpus)} messages: {len(corpus) - len(wrong)} match the planner; "
+          f"{changed} differ from the old Orchestrator ({expected} expected: 'by end of')")
+
+    print(f"{'router':<26} {'us/message':>10}")
+    for label, fn in [("legacy planner (any/in)", lambda ms: [legacy_planner(m) for m in ms]),
+                      ("legacy orchestrator (in)", lambda ms: [legacy_orchestrator(m) for m in ms]),
+                      ("compiled classify()", lambda ms: [classify(m) for m in ms]),
+                      ("compiled route()", lambda ms: [route(m) for m in ms]),
+                      ("compiled route_many()", route_many)]:
+        print(f"{label:<26} {timed(fn, msgs, args.repeat):>10.2f}")
+    raise SystemExit(1 if wrong or changed != expected else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Import time and cold start: how long until a fresh process can answer its first message.
+
+    python -m scripts.bench_startup [--repeat 5] [--out startup.json]
+
+Every measurement runs in a new interpreter. "import" is `import src.agents.orchestrator`
+(and `src.server.app`) alone; each flow row is a demo message answered by a fresh
+Orchestrator: import + construction + first reply, then a second (warm) reply, and which
+tools and heavy modules that turn ended up loading. Medians over --repeat runs.
+"""
+import argparse, json, os, statistics, subprocess, sys, tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY = ["numpy", "faiss", "langgraph", "openai", "fastapi"]
+FLOWS = {
+    "marketing": "I'm outfitting a team lounge. What bundle do you recommend?",
+    "sales": "We need a quote for 10 units by end of quarter. What's the price?",
+    "support": "My order is delayed, I might cancel.",
+    "kb": "Do you offer a warranty on sofas?",
+}
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+took = {{"import_ms": (time.perf_counter() - t0) * 1000}}
+if {message!r}:
+    from src.agents import resources
+    from src.agents.orchestrator import Orchestrator
+    orc = Orchestrator(use_graph={graph})
+    orc.handle_message("startup_bench", {message!r})
+    took["first_reply_ms"] = (time.perf_counter() - t0) * 1000
+    t1 = time.perf_counter()
+    orc.handle_message("startup_bench", {message!r})
+    took["warm_reply_ms"] = (time.perf_counter() - t1) * 1000
+    took["tools"] = resources.loaded()
+took["heavy"] = [m for m in {heavy!r} if m in sys.modules]
+took["modules"] = len(sys.modules)
+print(json.dumps(took))
+"""
+
+def probe(module: str, message: str = "", graph: bool = False, env: dict | None = None) -> dict:
+    code = PROBE.format(module=module, message=message, graph=graph, heavy=HEAVY)
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def median_of(runs: list[dict]) -> dict:
+    row = {k: v for k, v in runs[-1].items() if not k.endswith("_ms")}
+    for key in runs[0]:
+        if key.endswith("_ms"):
+            row[key] = round(statistics.median(r[key] for r in runs), 1)
+    return row
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--graph", action="store_true", help="answer through the LangGraph planner")
+    ap.add_argument("--out")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-startup-")
+    env = {**os.environ, "PYTHONPATH": str(ROOT), "TRACE_EXPORTER": "none", "USE_LLM_TOOLCALLING": "false",
+           "MEMORY_LOG_DIR": os.path.join(tmp, "log"), "MEMORY_INDEX_PATH": os.path.join(tmp, "memory.db"),
+           "HELPDESK_DB_PATH": os.path.join(tmp, "helpdesk.sqlite"), "CRM_OUTBOX_PATH": os.path.join(tmp, "crm_outbox.sqlite"),
+           "CRM_FAKE_PATH": os.path.join(tmp, "crm_fake.sqlite")}
+    rows = {"import orchestrator": median_of([probe("src.agents.orchestrator", env=env) for _ in range(args.repeat)]),
+            "import server.app": median_of([probe("src.server.app", env=env) for _ in range(args.repeat)])}
+    for name, message in FLOWS.items():
+        rows[name] = median_of([probe("src.agents.orchestrator", message, args.graph, env) for _ in range(args.repeat)])
+
+    print(f"{'':<20} {'import ms':>10} {'1st reply ms':>13} {'warm ms':>8} {'modules':>8}  loaded")
+    for name, r in rows.items():
+        loaded = ",".join(r.get("tools", []) + r["heavy"])
+        print(f"{name:<20} {r['import_ms']:>10.1f} {r.get('first_reply_ms', 0):>13.1f} {r.get('warm_reply_ms', 0):>8.1f} "
+              f"{r['modules']:>8}  {loaded}")
+    if args.out:
+        Path(args.out).write_text(json.dumps({"python": sys.version.split()[0], "graph": args.graph, "repeat": args.repeat,
+                                              "rows": rows}, indent=2) + "\n")
+        print(f"wrote {args.out}")
+
+if __name__ == "__main__":
+    main()
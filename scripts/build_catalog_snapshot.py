@@ -0,0 +1,3 @@
+from src.tools.catalog_index import compile_snapshot
+if __name__ == "__main__":
+    print(f"Catalog snapshot written to {compile_snapshot()}")
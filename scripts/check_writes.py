@@ -0,0 +1,126 @@
+"""Concurrency checks for the durable write paths: goodwill caps, helpdesk cases and CRM records.
+
+    python -m scripts.check_writes [--threads 8] [--procs 4] [--per 25]
+
+Each check runs against fresh SQLite files in a temp directory. The same calls are made
+from --threads threads in this process and in each of --procs forked processes, all
+released at once. Exits non-zero if any check fails.
+
+  goodwill  every caller credits one user; the total granted is exactly the cap, never more,
+            and the ledger's running totals agree with what the callers were told
+  cases     every caller opens a case for one user's order; one open case results and
+            counts every other attempt as a repeat, and another user naming that order gets
+            a case of their own
+  crm       every message is written several times (client retries) through outboxes in
+            front of a CRM failing --fail-rate of its calls; once drained, the CRM holds one
+            record per distinct message, with distinct ids and no dead letters
+"""
+import argparse, multiprocessing, os, sys, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("CRM_BACKOFF_BASE", "0.02")  # keep retried batches quick; read when crm_outbox is imported
+os.environ.setdefault("CRM_BACKOFF_CAP", "0.5")
+os.environ.setdefault("CRM_LEASE_SECS", "2")  # a batch claimed by a child that exits is retried soon after
+
+def burst(make, call, threads: int, procs: int, per: int) -> list:
+    """Run call(obj, i) for i in range(threads * per) here and in `procs` forked processes, each
+    with its own obj = make(), released together; returns every result."""
+    ctx = multiprocessing.get_context("fork")
+    go, results = ctx.Event(), ctx.Queue()
+
+    def work():
+        obj = make()
+        go.wait()
+        with ThreadPoolExecutor(threads) as pool:
+            results.put(list(pool.map(lambda i: call(obj, i), range(threads * per))))
+
+    children = [ctx.Process(target=work) for _ in range(procs)]  # fork before this process starts any threads
+    for child in children:
+        child.start()
+    here = threading.Thread(target=work)
+    here.start()
+    go.set()
+    out = [r for _ in range(procs + 1) for r in results.get()]
+    here.join()
+    for child in children:
+        child.join()
+    return out
+
+def check_goodwill(tmp: str, threads: int, procs: int, per: int) -> tuple[bool, str]:
+    from src.tools.goodwill_ledger import GoodwillLedger
+    path = os.path.join(tmp, "helpdesk.sqlite")
+    make = lambda: GoodwillLedger(path, max_credit=50, user_cap=100, period="month", enabled=True)
+    granted = burst(make, lambda ledger, i: ledger.grant("check_user", 7.5)["amount"], threads, procs, per)
+    ledger = make()
+    day = ledger.daily_totals()
+    total, recorded = round(sum(granted), 2), round(sum(d["granted"] for d in day), 2)
+    ok = total == 100 and recorded == total and ledger.remaining("check_user") == 0 and sum(d["requests"] for d in day) == len(granted)
+    return ok, f"{len(granted)} grants of $7.50 against a $100 cap: granted ${total:g}, ledger ${recorded:g}"
+
+def check_cases(tmp: str, threads: int, procs: int, per: int) -> tuple[bool, str]:
+    from src.tools.case_store import CaseStore
+    path = os.path.join(tmp, "cases.sqlite")
+    details = {"order_id": "NW12345", "delayed": True}
+    opened = burst(lambda: CaseStore(path),
+                   lambda store, i: (lambda c: (c["id"], c["repeat"]))(
+                       store.open_case("check_user", "Delay on NW12345", details, order_id="NW12345")),
+                   threads, procs, per)
+    store = CaseStore(path)
+    case = store.open_for_order("check_user", "NW12345")
+    other = store.open_case("other_user", "Delay on NW12345", details, order_id="NW12345")
+    ids, new = {cid for cid, _ in opened}, sum(not repeat for _, repeat in opened)
+    ok = len(ids) == 1 and new == 1 and case["repeats"] == len(opened) - 1 and other["id"] != case["id"] and not other["repeat"]
+    return ok, (f"{len(opened)} attempts on one order: {len(ids)} case(s), {new} opened, repeats {case['repeats']}; "
+                f"another user got {other['id']}")
+
+def check_crm(tmp: str, threads: int, procs: int, per: int, fail_rate: float) -> tuple[bool, str]:
+    from src.tools.crm import CRMTool
+    from src.tools.crm_outbox import FakeCRM, Outbox
+    outbox_path, crm_path = os.path.join(tmp, "crm_outbox.sqlite"), os.path.join(tmp, "crm_fake.sqlite")
+    distinct = max(1, threads * per // 3)  # every message is written about three times per process
+
+    def make():
+        return CRMTool(Outbox(outbox_path, backend=FakeCRM(crm_path, fail_rate=fail_rate), batch=20, flush_ms=10))
+
+    def write(crm, i):
+        n = i % distinct
+        if n % 2:
+            return crm.create_lead(f"user{n % 7}", {"message": n}, source=f"message {n}")
+        return crm.create_opportunity(f"user{n % 7}", {"total": 100.0, "items": []}, source=f"message {n}")["id"]
+
+    written = burst(make, write, threads, procs, per)
+    crm = make()
+    deadline = time.monotonic() + 60
+    while crm.outbox.pending() and time.monotonic() < deadline:
+        crm.outbox.flush()
+        time.sleep(0.02)
+    stats = crm.outbox.stats()
+    fake = FakeCRM(crm_path)
+    records, ids = fake._db.execute("SELECT COUNT(*), COUNT(DISTINCT id) FROM records").fetchone()
+    upserts = fake.stats()["upserts"]
+    sends = crm.outbox._db.execute("SELECT COALESCE(SUM(attempts), 0) FROM outbox").fetchone()[0]  # failed ones included
+    ok = records == ids == distinct == len(set(written)) and stats["pending"] == 0 and stats["dead"] == 0
+    return ok, (f"{len(written)} writes of {distinct} messages, {fail_rate:.0%} of CRM calls failing: "
+                f"{sends} sends, {records} records, {ids} ids, {upserts} upserts, {stats['dead']} dead")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--procs", type=int, default=4)
+    ap.add_argument("--per", type=int, default=25, help="calls per thread")
+    ap.add_argument("--fail-rate", type=float, default=0.3, help="fraction of fake CRM calls that fail")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="check-writes-")
+    print(f"{args.threads} threads in this process and in each of {args.procs} forked processes, "
+          f"{args.per} calls per thread ({tmp})")
+    failed = 0
+    for name, check in (("goodwill", check_goodwill), ("cases", check_cases), ("crm", check_crm)):
+        extra = (args.fail_rate,) if name == "crm" else ()
+        ok, detail = check(tmp, args.threads, args.procs, args.per, *extra)
+        failed += not ok
+        print(f"{'ok' if ok else 'FAIL':<5} {name:<9} {detail}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+import argparse
+from src.memory.store import ARCHIVE, COMPACT_KEEP, MemoryStore
+import src.evals.analytics  # registers its checkpoint as a compaction hook
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Fold sealed interaction-log segments into a per-user snapshot.")
+    ap.add_argument("--keep", type=int, default=COMPACT_KEEP, help="events kept per user")
+    ap.add_argument("--archive", action=argparse.BooleanOptionalAction, default=ARCHIVE,
+                    help="keep gzip copies of the raw segments (default: MEMORY_ARCHIVE)")
+    args = ap.parse_args()
+    stats = MemoryStore(buffered=False).compact(keep=args.keep, archive=args.archive)
+    print(f"Memory compacted: {stats}" if stats else "Nothing to compact: no sealed segments.")
@@ -0,0 +1,24 @@
+"""Daily goodwill totals for finance, read from the ledger's running per-day rows.
+
+    python -m scripts.export_goodwill [--since 2026-10-01] [--until 2026-10-31] [--out goodwill.csv]
+"""
+import argparse, csv, sys
+from src.tools.goodwill_ledger import GoodwillLedger
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--since", help="first day, YYYY-MM-DD (UTC)")
+    ap.add_argument("--until", help="last day, YYYY-MM-DD (UTC)")
+    ap.add_argument("--out", help="CSV file (default: stdout)")
+    args = ap.parse_args()
+    rows = GoodwillLedger().daily_totals(args.since, args.until)
+    out = open(args.out, "w", newline="") if args.out else sys.stdout
+    writer = csv.DictWriter(out, fieldnames=["day", "granted", "credits", "requests", "denied"])
+    writer.writeheader()
+    writer.writerows(rows)
+    if args.out:
+        out.close()
+        print(f"wrote {len(rows)} days to {args.out}")
+
+if __name__ == "__main__":
+    main()
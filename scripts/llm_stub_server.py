@@ -0,0 +1,9 @@
+import argparse
+import uvicorn
+from src.agents.llm_stub import create_app
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Serve the deterministic chat-completions stub (point OPENAI_BASE_URL at /v1).")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8400)
+    args = ap.parse_args()
+    uvicorn.run(create_app(), host=args.host, port=args.port, log_level="warning")
@@ -1,4 +1,7 @@
-from src.tools.kb import KBTool
+import argparse
+from src.tools.kb_index import ingest
 if __name__ == "__main__":
-    KBTool()
-    print("KB seeded/indexed.")
+    ap = argparse.ArgumentParser(description="Chunk, embed and index the files under demo_data/kb.")
+    ap.add_argument("--force", action="store_true", help="rebuild from scratch instead of incrementally")
+    stats = ingest(force=ap.parse_args().force)
+    print(f"KB seeded/indexed: {stats}")
@@ -0,0 +1,52 @@
+"""Local stand-in for an OTLP/HTTP trace collector.
+
+    python -m scripts.trace_collector                       # http://127.0.0.1:6006/v1/traces
+    TRACE_EXPORTER=otlp PHOENIX_COLLECTOR_ENDPOINT=http://127.0.0.1:6006/v1/traces uvicorn src.server.app:app
+
+Accepts OTLP/JSON export requests, keeps the last --keep spans in memory and, with --out,
+appends them to a JSONL file. GET /v1/traces/summary shows what arrived.
+"""
+import argparse, json
+from collections import Counter, deque
+import uvicorn
+from fastapi import FastAPI, Request
+
+def create_app(keep: int = 10000, out: str | None = None):
+    app = FastAPI(title="OTLP trace collector stand-in")
+    spans: deque = deque(maxlen=keep)
+    batches = Counter()
+
+    @app.post("/v1/traces")
+    async def ingest(request: Request):
+        body = await request.json()
+        received = [{**s, "service": next((a["value"].get("stringValue") for a in rs.get("resource", {}).get("attributes", [])
+                                           if a["key"] == "service.name"), None)}
+                    for rs in body.get("resourceSpans", []) for ss in rs.get("scopeSpans", []) for s in ss.get("spans", [])]
+        spans.extend(received)
+        batches["batches"] += 1
+        batches["spans"] += len(received)
+        if out:
+            with open(out, "a") as f:
+                f.writelines(json.dumps(s) + "\n" for s in received)
+        return {"partialSuccess": {}}
+
+    @app.get("/v1/traces/summary")
+    def summary(last: int = 20):
+        recent = list(spans)[-last:]
+        return {**batches, "traces": len({s["traceId"] for s in spans}),
+                "by_name": Counter(s["name"] for s in spans), "errors": sum(s.get("status", {}).get("code") == 2 for s in spans),
+                "recent": [{"trace": s["traceId"][:8], "name": s["name"], "parent": s.get("parentSpanId"),
+                            "ms": (int(s["endTimeUnixNano"]) - int(s["startTimeUnixNano"])) / 1e6,
+                            **({"error": s["status"].get("message")} if s.get("status", {}).get("code") == 2 else {})}
+                           for s in recent]}
+
+    return app
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Receive OTLP/JSON spans locally (point PHOENIX_COLLECTOR_ENDPOINT at /v1/traces).")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=6006)
+    ap.add_argument("--keep", type=int, default=10000)
+    ap.add_argument("--out", help="append received spans to this JSONL file")
+    args = ap.parse_args()
+    uvicorn.run(create_app(args.keep, args.out), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,166 @@
+"""Content-addressed cache for chat completions.
+
+A request is keyed by a SHA-256 of its canonical JSON (model, messages, tools, tool_choice,
+temperature and any other arguments), so the same request from any process replays the
+stored response instead of going to the API. Entries live in SQLite on local disk, expire
+after a TTL, and the least recently used go first once the byte budget is spent.
+
+    LLM_CACHE=false                  disable
+    LLM_CACHE_DOMAINS=marketing,kb   only cache these domains (default: all)
+    LLM_CACHE_TTL=86400              seconds a completion stays valid
+    LLM_CACHE_MAX_BYTES=268435456    on-disk budget
+    LLM_CACHE_PATH=...               defaults to demo_data/llm_cache.sqlite
+"""
+import asyncio, hashlib, json, os, sqlite3, threading, time
+from functools import lru_cache
+from openai.types.chat import ChatCompletion
+
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(os.path.dirname(__file__), "../../demo_data/llm_cache.sqlite"))
+ENABLED = os.getenv("LLM_CACHE", "true").lower() == "true"
+DOMAINS = {d.strip() for d in os.getenv("LLM_CACHE_DOMAINS", "").split(",") if d.strip()}
+TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+def _plain(obj):
+    if hasattr(obj, "model_dump"):  # SDK objects that end up in message lists
+        return obj.model_dump(exclude_none=True)
+    raise TypeError(f"cannot canonicalize {type(obj).__name__}")
+
+def request_key(**request) -> str:
+    """Canonical hash of a chat-completions request: key order and whitespace don't matter."""
+    canon = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=_plain)
+    return hashlib.sha256(canon.encode()).hexdigest()
+
+class CompletionCache:
+    def __init__(self, path: str = CACHE_PATH, ttl: float = TTL, max_bytes: int = MAX_BYTES):
+        self.ttl, self.max_bytes = ttl, max_bytes
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, domain TEXT, body BLOB NOT NULL,
+                            nbytes INTEGER NOT NULL, stored_at REAL NOT NULL, used_at REAL NOT NULL)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS completions_lru ON completions (used_at)")
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key: str) -> ChatCompletion | None:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT body, stored_at FROM completions WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] <= self.ttl:
+                with self._db:
+                    self._db.execute("UPDATE completions SET used_at = ? WHERE key = ?", (now, key))
+                self.hits += 1
+                return ChatCompletion.model_validate_json(row[0])
+            self.misses += 1
+        return None
+
+    def put(self, key: str, completion: ChatCompletion, domain: str | None = None):
+        body = completion.model_dump_json(exclude_none=True).encode()
+        if len(body) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?, ?)", (key, domain, body, len(body), now, now))
+            self._db.execute("DELETE FROM completions WHERE stored_at < ?", (now - self.ttl,))
+            total = self._db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM completions").fetchone()[0]
+            if total > self.max_bytes:
+                self._evict(total - self.max_bytes)
+
+    def _evict(self, excess: int):
+        freed, doomed = 0, []
+        for key, nbytes in self._db.execute("SELECT key, nbytes FROM completions ORDER BY used_at"):
+            if freed >= excess:
+                break
+            doomed.append((key,))
+            freed += nbytes
+        self._db.executemany("DELETE FROM completions WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+
+    def clear(self, domain: str | None = None):
+        with self._lock, self._db:
+            if domain is None:
+                self._db.execute("DELETE FROM completions")
+            else:
+                self._db.execute("DELETE FROM completions WHERE domain = ?", (domain,))
+
+    def stats(self) -> dict:
+        entries, nbytes = self._db.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM completions").fetchone()
+        total = self.hits + self.misses
+        return {"entries": entries, "bytes": nbytes, "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 3) if total else None}
+
+@lru_cache(maxsize=None)
+def default_cache() -> CompletionCache:
+    return CompletionCache()
+
+def enabled_for(domain: str | None) -> bool:
+    return ENABLED and (not DOMAINS or domain in DOMAINS)
+
+def create(client, *, domain: str | None = None, **request) -> ChatCompletion:
+    """`client.chat.completions.create(**request)`, answered from the cache when this exact request was seen."""
+    if not enabled_for(domain):
+        return client.chat.completions.create(**request)
+    cache = default_cache()
+    key = request_key(**request)
+    hit = cache.get(key)
+    if hit is not None:
+        return hit
+    completion = client.chat.completions.create(**request)
+    cache.put(key, completion, domain)
+    return completion
+
+def stream_text(client, *, domain: str | None = None, **request):
+    """Yield the reply text of a streamed completion as it arrives; a cached reply comes back as one piece.
+
+    Only for plain text turns (no tool calls). The streamed reply is cached under the same
+    key as the non-streamed request, so either form replays the other.
+    """
+    cache = default_cache() if enabled_for(domain) else None
+    key = request_key(**request)
+    hit = cache.get(key) if cache else None
+    if hit is not None:
+        yield hit.choices[0].message.content or ""
+        return
+    parts, last = [], None
+    for chunk in client.chat.completions.create(stream=True, **request):
+        last = chunk
+        if chunk.choices and chunk.choices[0].delta.content:
+            parts.append(chunk.choices[0].delta.content)
+            yield parts[-1]
+    if cache and last is not None:
+        cache.put(key, _assembled(last, parts), domain)
+
+def _assembled(last_chunk, parts: list[str]) -> ChatCompletion:
+    return ChatCompletion.model_validate({
+        "id": last_chunk.id, "object": "chat.completion", "created": last_chunk.created, "model": last_chunk.model,
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "".join(parts)}}]})
+
+async def acreate(aclient, *, domain: str | None = None, **request) -> ChatCompletion:
+    """`create` for an AsyncOpenAI client; the SQLite reads and commits run on worker threads."""
+    if not enabled_for(domain):
+        return await aclient.chat.completions.create(**request)
+    cache = default_cache()
+    key = request_key(**request)
+    hit = await asyncio.to_thread(cache.get, key)
+    if hit is not None:
+        return hit
+    completion = await aclient.chat.completions.create(**request)
+    await asyncio.to_thread(cache.put, key, completion, domain)
+    return completion
+
+async def astream_text(aclient, *, domain: str | None = None, **request):
+    """`stream_text` for an AsyncOpenAI client."""
+    cache = default_cache() if enabled_for(domain) else None
+    key = request_key(**request)
+    hit = await asyncio.to_thread(cache.get, key) if cache else None
+    if hit is not None:
+        yield hit.choices[0].message.content or ""
+        return
+    parts, last = [], None
+    async for chunk in await aclient.chat.completions.create(stream=True, **request):
+        last = chunk
+        if chunk.choices and chunk.choices[0].delta.content:
+            parts.append(chunk.choices[0].delta.content)
+            yield parts[-1]
+    if cache and last is not None:
+        await asyncio.to_thread(cache.put, key, _assembled(last, parts), domain)
@@ -0,0 +1,366 @@
+"""One place every chat-completions request goes through.
+
+The gateway owns a single pooled HTTP client (sync and async) and a token-bucket scheduler
+in front of it. Each request's tokens are estimated before dispatch; requests wait in a
+priority queue (support ahead of marketing) until both the requests-per-minute and the
+tokens-per-minute buckets can cover them, so a burst is spread out instead of answered
+with 429s. Once a response arrives its reported usage replaces the estimate. 429s, 5xx
+and connection errors are retried with full-jitter exponential backoff, honouring
+Retry-After, which also holds back the rest of the queue.
+
+    LLM_RPM=0 / LLM_TPM=0          requests / tokens per minute (0: unlimited)
+    LLM_BURST_SECS=6               bucket depth in seconds of rate; the API enforces its limits over short windows
+    LLM_PRIORITIES=support,sales,kb,marketing   dispatch order when requests queue
+    LLM_MAX_RETRIES=4              retries on 429 / 5xx / connection errors
+    LLM_BACKOFF_BASE=0.5 / LLM_BACKOFF_CAP=20   backoff seconds
+    LLM_MAX_CONNECTIONS=32         pooled HTTP connections
+    LLM_HTTP_TIMEOUT=60            seconds per request
+    LLM_BACKEND=stub               answer in-process with the deterministic stub (src/agents/llm_stub.py)
+
+`gateway.client(domain)` / `gateway.aclient(domain)` stand in for `OpenAI` / `AsyncOpenAI`
+as far as `chat.completions.create` goes, so `completion_cache` sits in front unchanged.
+"""
+import asyncio, heapq, inspect, itertools, json, os, random, threading, time
+from collections import deque
+from functools import lru_cache, partial
+from types import SimpleNamespace
+import httpx
+import openai
+from src.observability.metrics import timed
+from src.observability.tracing import tracer
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+RPM = float(os.getenv("LLM_RPM", "0"))
+TPM = float(os.getenv("LLM_TPM", "0"))
+BURST_SECS = float(os.getenv("LLM_BURST_SECS", "6"))
+PRIORITIES = [d.strip() for d in os.getenv("LLM_PRIORITIES", "support,sales,kb,marketing").split(",") if d.strip()]
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+BACKOFF_CAP = float(os.getenv("LLM_BACKOFF_CAP", "20"))
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "60"))
+BACKEND = os.getenv("LLM_BACKEND", "openai")
+
+@lru_cache(maxsize=None)
+def _encoding():
+    try:
+        return tiktoken.get_encoding("o200k_base") if tiktoken else None
+    except Exception:  # encoding files not cached and no network
+        return None
+
+def _count(text: str) -> int:
+    enc = _encoding()
+    return len(enc.encode(text)) if enc else max(1, len(text) // 4)
+
+def estimate_tokens(request: dict) -> int:
+    """Prompt tokens of a chat-completions request plus its completion allowance (max_tokens, if set)."""
+    n = 3
+    for m in request.get("messages", []):
+        n += 4 + _count(m if isinstance(m, str) else json.dumps(m, default=str, ensure_ascii=False))
+    if request.get("tools"):
+        n += _count(json.dumps(request["tools"], ensure_ascii=False))
+    return n + int(request.get("max_tokens") or request.get("max_completion_tokens") or 0)
+
+class TokenBucket:
+    """`per_minute` units a minute, bursting up to `burst_secs` worth; 0 means unlimited."""
+    def __init__(self, per_minute: float, burst_secs: float = BURST_SECS):
+        self.rate = per_minute / 60
+        self.capacity = self.level = self.rate * burst_secs
+        self._at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._at) * self.rate)
+        self._at = now
+
+    def wait(self, n: float, now: float) -> float:
+        """Seconds until `n` units are available (a request bigger than the bucket waits for a full one)."""
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        short = min(n, self.capacity) - self.level
+        return short / self.rate if short > 0 else 0.0
+
+    def take(self, n: float):
+        """Spend `n` (negative refunds); the level may go below zero, which is paid back before the next dispatch."""
+        if self.capacity:
+            self._refill(time.monotonic())
+            self.level = min(self.capacity, self.level - n)
+
+class Scheduler:
+    """Priority queue drained by one dispatcher thread as the buckets allow; sync and async callers share it."""
+    def __init__(self, rpm: float = RPM, tpm: float = TPM, priorities: list[str] = PRIORITIES, burst_secs: float = BURST_SECS):
+        self.requests, self.tokens = TokenBucket(rpm, burst_secs), TokenBucket(tpm, burst_secs)
+        self._rank = {d: i for i, d in enumerate(priorities)}
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._hold_until = 0.0
+        self._thread = None
+        self.waits_ms = deque(maxlen=2048)
+        self.dispatched = self.in_flight = 0
+
+    def _priority(self, domain: str | None) -> int:
+        return self._rank.get(domain, len(self._rank))
+
+    def _submit(self, domain: str | None, tokens: int, wake) -> dict:
+        ticket = {"wake": wake, "state": "queued"}
+        with self._cond:
+            heapq.heappush(self._heap, (self._priority(domain), next(self._seq), tokens, time.monotonic(), ticket))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="llm-scheduler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return ticket
+
+    def acquire(self, domain: str | None, tokens: int):
+        ready = threading.Event()
+        self._submit(domain, tokens, ready.set)
+        ready.wait()
+
+    async def aacquire(self, domain: str | None, tokens: int):
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        ticket = self._submit(domain, tokens, lambda: loop.call_soon_threadsafe(lambda: ready.done() or ready.set_result(None)))
+        try:
+            await ready
+        except asyncio.CancelledError:  # the caller gave up: drop the ticket, or hand back its slot
+            with self._cond:
+                if ticket["state"] == "queued":
+                    ticket["state"] = "cancelled"
+                else:
+                    self.in_flight -= 1
+            raise
+
+    def release(self, estimated: int, used: int | None):
+        with self._cond:
+            self.in_flight -= 1
+            if used is not None:
+                self.tokens.take(used - estimated)
+
+    def hold(self, seconds: float):
+        """Dispatch nothing for `seconds` (the API told us to back off)."""
+        with self._cond:
+            self._hold_until = max(self._hold_until, time.monotonic() + seconds)
+
+    def _run(self):
+        with self._cond:
+            while True:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                _, _, tokens, queued_at, ticket = self._heap[0]
+                if ticket["state"] == "cancelled":
+                    heapq.heappop(self._heap)
+                    continue
+                now = time.monotonic()
+                delay = max(self._hold_until - now, self.requests.wait(1, now), self.tokens.wait(tokens, now))
+                if delay > 0:
+                    self._cond.wait(delay)  # a new, more urgent request also wakes us
+                    continue
+                heapq.heappop(self._heap)
+                self.requests.take(1)
+                self.tokens.take(tokens)
+                self.dispatched += 1
+                self.in_flight += 1
+                self.waits_ms.append((now - queued_at) * 1000)
+                ticket["state"] = "dispatched"
+                ticket["wake"]()
+
+    def stats(self) -> dict:
+        with self._cond:
+            waits = sorted(self.waits_ms)
+            by_domain = {}
+            for rank, _, _, _, ticket in self._heap:
+                if ticket["state"] == "queued":
+                    by_domain[rank] = by_domain.get(rank, 0) + 1
+        names = {i: d for d, i in self._rank.items()}
+        pct = lambda p: round(waits[min(len(waits) - 1, int(p * len(waits)))], 1) if waits else None
+        return {"queue_depth": sum(by_domain.values()),
+                "queued_by_domain": {names.get(r, "other"): n for r, n in sorted(by_domain.items())},
+                "in_flight": self.in_flight, "dispatched": self.dispatched,
+                "wait_ms_p50": pct(0.5), "wait_ms_p95": pct(0.95), "wait_ms_max": round(waits[-1], 1) if waits else None,
+                "rpm_available": round(self.requests.level, 1) if self.requests.capacity else None,
+                "tpm_available": round(self.tokens.level) if self.tokens.capacity else None}
+
+def _retryable(e: Exception) -> bool:
+    if isinstance(e, (openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError)):
+        return True
+    return isinstance(e, openai.APIStatusError) and e.status_code >= 500
+
+def _retry_after(e: Exception) -> float | None:
+    response = getattr(e, "response", None)
+    try:
+        return float(response.headers["retry-after"]) if response is not None else None
+    except (KeyError, ValueError):
+        return None
+
+class Gateway:
+    def __init__(self, client=None, aclient=None, scheduler: Scheduler | None = None,
+                 max_retries: int = MAX_RETRIES, backoff_base: float = BACKOFF_BASE, backoff_cap: float = BACKOFF_CAP):
+        self._client, self._aclient = client, aclient
+        self.scheduler = scheduler or Scheduler()
+        self.max_retries, self.backoff_base, self.backoff_cap = max_retries, backoff_base, backoff_cap
+        self._lock = threading.Lock()
+        self.retries = self.throttled = self.errors = 0
+
+    @property
+    def sync_client(self):
+        with self._lock:
+            if self._client is None:  # the SDK's own retries are off; the gateway retries through the scheduler
+                limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+                self._client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0, timeout=HTTP_TIMEOUT,
+                                             http_client=httpx.Client(limits=limits, timeout=HTTP_TIMEOUT))
+            return self._client
+
+    @property
+    def async_client(self):
+        with self._lock:
+            if self._aclient is None:
+                limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+                self._aclient = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0, timeout=HTTP_TIMEOUT,
+                                                   http_client=httpx.AsyncClient(limits=limits, timeout=HTTP_TIMEOUT))
+            return self._aclient
+
+    def _backoff(self, attempt: int, e: Exception) -> float:
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        after = _retry_after(e)
+        with self._lock:
+            self.retries += 1
+            self.throttled += isinstance(e, openai.RateLimitError)
+        if after is not None:
+            self.scheduler.hold(after)
+            delay = max(delay, after)
+        return delay
+
+    def _failed(self):
+        with self._lock:
+            self.errors += 1
+
+    @staticmethod
+    def _record(s, attempt: int, queued: float, response):
+        s.attributes["attempts"] = attempt + 1
+        s.attributes["queued_ms"] = round(s.attributes.get("queued_ms", 0) + queued * 1000, 1)
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            s.attributes["prompt_tokens"], s.attributes["completion_tokens"] = usage.prompt_tokens, usage.completion_tokens
+        return getattr(usage, "total_tokens", None)
+
+    def create(self, domain: str | None, **request):
+        """`chat.completions.create(**request)` once the scheduler admits it, retrying transient failures.
+
+        A `stream=True` request comes back as an iterator of chunks; its scheduler slot, span
+        and timer stay open until the stream is exhausted or closed."""
+        call = _Call(self, domain, request)
+        for attempt in range(self.max_retries + 1):
+            t0 = time.perf_counter()
+            with timed("llm.queue", domain=domain or "none"):
+                self.scheduler.acquire(domain, call.tokens)
+            call.attempt, call.queued = attempt, time.perf_counter() - t0
+            try:
+                response = self.sync_client.chat.completions.create(**request)
+            except BaseException as e:
+                delay = call.failed(e)
+            else:
+                return call.stream(response) if request.get("stream") else call.done(response)
+            time.sleep(delay)
+
+    async def acreate(self, domain: str | None, **request):
+        call = _Call(self, domain, request)
+        for attempt in range(self.max_retries + 1):
+            t0 = time.perf_counter()
+            with timed("llm.queue", domain=domain or "none"):
+                await self.scheduler.aacquire(domain, call.tokens)
+            call.attempt, call.queued = attempt, time.perf_counter() - t0
+            try:
+                response = await self.async_client.chat.completions.create(**request)
+            except BaseException as e:
+                delay = call.failed(e)
+            else:
+                return call.astream(response) if request.get("stream") else call.done(response)
+            await asyncio.sleep(delay)
+
+    def client(self, domain: str | None = None):
+        """Drop-in for an `OpenAI` client whose requests are scheduled under `domain`."""
+        return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=partial(self.create, domain))))
+
+    def aclient(self, domain: str | None = None):
+        """Drop-in for an `AsyncOpenAI` client whose requests are scheduled under `domain`."""
+        return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=partial(self.acreate, domain))))
+
+    def stats(self) -> dict:
+        return {**self.scheduler.stats(), "retries": self.retries, "throttled": self.throttled, "errors": self.errors}
+
+class _Call:
+    """One gateway request across its attempts: the `llm.chat` span and timer, and the scheduler
+    slot of the current attempt, given back once the response is complete."""
+    def __init__(self, gateway: Gateway, domain: str | None, request: dict):
+        self.gateway, self.tokens = gateway, estimate_tokens(request)
+        self.span = tracer.start_span("llm.chat", {"domain": domain or "", "model": request.get("model", ""),
+                                                   "stream": bool(request.get("stream")), "est_tokens": self.tokens,
+                                                   "messages": len(request.get("messages", []))})
+        self.timer, self.t0 = timed("llm.chat", domain=domain or "none"), time.perf_counter()
+        self.attempt, self.queued = 0, 0.0
+
+    def _release(self, response):
+        self.gateway.scheduler.release(self.tokens, self.gateway._record(self.span, self.attempt, self.queued, response))
+
+    def _end(self, error: BaseException | None = None):
+        if error is not None and not isinstance(error, GeneratorExit):
+            self.span.fail(error)
+        self.timer.record(time.perf_counter() - self.t0, error is not None and not isinstance(error, GeneratorExit))
+        self.span.end()
+
+    def done(self, response):
+        self._release(response)
+        self._end()
+        return response
+
+    def failed(self, e: BaseException) -> float:
+        """Give back the attempt's slot; returns the backoff before the next attempt, or raises `e` if there is none."""
+        self._release(None)
+        if not isinstance(e, Exception) or self.attempt == self.gateway.max_retries or not _retryable(e):
+            if isinstance(e, Exception):
+                self.gateway._failed()
+            self._end(e)
+            raise e
+        return self.gateway._backoff(self.attempt, e)
+
+    def stream(self, chunks):
+        last, error = None, None
+        try:
+            for chunk in chunks:
+                last = chunk
+                yield chunk
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            getattr(chunks, "close", lambda: None)()
+            self._release(last)  # the final chunk carries usage when the request asked for it
+            self._end(error)
+
+    async def astream(self, chunks):
+        last, error = None, None
+        try:
+            async for chunk in chunks:
+                last = chunk
+                yield chunk
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            closed = getattr(chunks, "close", lambda: None)()
+            if inspect.isawaitable(closed):
+                await closed
+            self._release(last)
+            self._end(error)
+
+@lru_cache(maxsize=None)
+def default_gateway() -> Gateway:
+    if BACKEND == "stub":
+        from src.agents.llm_stub import stub_async_client, stub_client
+        return Gateway(client=stub_client(), aclient=stub_async_client())
+    return Gateway()
@@ -0,0 +1,189 @@
+"""Deterministic stand-in for the OpenAI chat-completions API.
+
+Given a user turn and a tool list it calls the tools the keyword router would pick for
+that message; given tool results it writes a short answer from them; without tools it
+echoes a canned reply. Same request, same response, so completion caching and the agents
+can be load-tested with no network and no API key.
+
+    python -m scripts.llm_stub_server                         # http://127.0.0.1:8400/v1
+    OPENAI_BASE_URL=http://127.0.0.1:8400/v1 OPENAI_API_KEY=stub streamlit run streamlit_app.py
+
+or in-process, without a server: `stub_client()` / `stub_async_client()`, or LLM_BACKEND=stub
+to have the LLM gateway use them.
+    LLM_STUB_LATENCY_MS=0   added delay per completion, to mimic a real model
+    LLM_STUB_TOKEN_MS=0     added delay per streamed chunk
+"""
+import asyncio, hashlib, json, os, time
+from src.agents.router import route
+
+LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", "0"))
+TOKEN_MS = float(os.getenv("LLM_STUB_TOKEN_MS", "0"))
+# tools the stub calls per routed intent, in order; only those the request offers are used
+INTENT_TOOLS = {
+    "marketing": ["recommend_bundle", "create_lead"],
+    "sales": ["price_quote", "book_meeting"],
+    "support": ["lookup_order"],
+    "kb": ["kb_answer"],
+}
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def _arguments(schema: dict, message: str) -> dict:
+    args = {}
+    for name, prop in schema.get("parameters", {}).get("properties", {}).items():
+        if prop.get("type") == "number":
+            args[name] = 20
+        elif prop.get("type") == "string":
+            args[name] = message
+    return args
+
+def _text(content) -> str:
+    if isinstance(content, list):  # content parts
+        return " ".join(p.get("text", "") for p in content if isinstance(p, dict))
+    return content or ""
+
+def _summarize(result: str) -> str:
+    try:
+        data = json.loads(result)
+    except ValueError:
+        return result[:200]
+    if isinstance(data, dict):
+        for key in ("summary", "text", "when", "order_id", "id", "amount"):
+            if key in data:
+                return f"{key}: {data[key]}"
+    if isinstance(data, list) and data and isinstance(data[0], dict) and "name" in data[0]:
+        return ", ".join(d["name"] for d in data)
+    return json.dumps(data)[:200]
+
+def reply(request: dict) -> dict:
+    """Assistant message for a chat-completions request body."""
+    messages = request.get("messages", [])
+    last = messages[-1] if messages else {}
+    tools = {t["function"]["name"]: t["function"] for t in request.get("tools") or [] if t.get("type") == "function"}
+    if last.get("role") == "tool":
+        results = []
+        for m in reversed(messages):
+            if m.get("role") != "tool":
+                break
+            results.append(_summarize(_text(m.get("content"))))
+        return {"role": "assistant", "content": "Here's what I found: " + "; ".join(reversed(results)) + "."}
+    user = next((_text(m.get("content")) for m in reversed(messages) if m.get("role") == "user"), "")
+    calls = [n for n in INTENT_TOOLS[route(user).intent] if n in tools] if request.get("tool_choice") != "none" else []
+    if not calls:
+        return {"role": "assistant", "content": f"Thanks for reaching out about: {user[:120]}"}
+    seed = hashlib.sha1(json.dumps(messages, sort_keys=True, default=str).encode()).hexdigest()
+    return {"role": "assistant", "content": None, "tool_calls": [
+        {"id": f"call_{seed[:8]}{i}", "type": "function",
+         "function": {"name": n, "arguments": json.dumps(_arguments(tools[n], user))}}
+        for i, n in enumerate(calls)]}
+
+def complete(request: dict, delay: bool = True) -> dict:
+    """Full chat.completion response body for `request`."""
+    if delay and LATENCY_MS:
+        time.sleep(LATENCY_MS / 1000)
+    message = reply(request)
+    prompt = sum(_tokens(json.dumps(m, default=str)) for m in request.get("messages", []))
+    completion = _tokens(json.dumps(message))
+    return {
+        "id": "chatcmpl-stub-" + hashlib.sha1(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()[:16],
+        "object": "chat.completion", "created": int(time.time()), "model": request.get("model", "stub"),
+        "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if message.get("tool_calls") else "stop"}],
+        "usage": {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion},
+    }
+
+def stream(request: dict, delay: bool = True):
+    """chat.completion.chunk bodies for a `stream: true` request: the text word by word, or the tool calls at once."""
+    body = complete(request, delay)
+    message = body["choices"][0]["message"]
+    base = {"id": body["id"], "object": "chat.completion.chunk", "created": body["created"], "model": body["model"]}
+
+    def chunk(delta: dict, finish=None):
+        return {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+
+    yield chunk({"role": "assistant", "content": ""})
+    if message.get("tool_calls"):
+        yield chunk({"tool_calls": [{"index": i, **tc} for i, tc in enumerate(message["tool_calls"])]})
+    else:
+        words = message["content"].split(" ")
+        for i, word in enumerate(words):
+            if delay and TOKEN_MS:
+                time.sleep(TOKEN_MS / 1000)
+            yield chunk({"content": word if i == len(words) - 1 else word + " "})
+    yield chunk({}, body["choices"][0]["finish_reason"])
+
+def sse(request: dict):
+    for c in stream(request):
+        yield f"data: {json.dumps(c)}\n\n".encode()
+    yield b"data: [DONE]\n\n"
+
+def create_app():
+    from fastapi import FastAPI, Request
+    from fastapi.responses import StreamingResponse
+
+    app = FastAPI(title="OpenAI chat-completions stub")
+
+    async def asse(body: dict):
+        # latency is simulated with asyncio.sleep so concurrent requests overlap like they would against the API
+        if LATENCY_MS:
+            await asyncio.sleep(LATENCY_MS / 1000)
+        for c in stream(body, delay=False):
+            if TOKEN_MS:
+                await asyncio.sleep(TOKEN_MS / 1000)
+            yield f"data: {json.dumps(c)}\n\n".encode()
+        yield b"data: [DONE]\n\n"
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if body.get("stream"):
+            return StreamingResponse(asse(body), media_type="text/event-stream")
+        if LATENCY_MS:
+            await asyncio.sleep(LATENCY_MS / 1000)
+        return complete(body, delay=False)
+
+    @app.get("/v1/models")
+    def models():
+        return {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "stub"}]}
+
+    return app
+
+def stub_client():
+    """OpenAI client whose requests are answered in-process by the stub."""
+    import httpx
+    from openai import OpenAI
+
+    def handle(req: httpx.Request) -> httpx.Response:
+        if req.url.path.endswith("/chat/completions"):
+            body = json.loads(req.content)
+            if body.get("stream"):
+                return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=sse(body))
+            return httpx.Response(200, json=complete(body))
+        return httpx.Response(404, json={"error": {"message": f"stub: no route {req.url.path}"}})
+
+    return OpenAI(api_key="stub", base_url="http://llm-stub/v1", http_client=httpx.Client(transport=httpx.MockTransport(handle)))
+
+def stub_async_client():
+    """AsyncOpenAI client answered in-process by the stub; latency is simulated without blocking the loop."""
+    import httpx
+    from openai import AsyncOpenAI
+
+    async def asse(body: dict):
+        for c in stream(body, delay=False):
+            if TOKEN_MS:
+                await asyncio.sleep(TOKEN_MS / 1000)
+            yield f"data: {json.dumps(c)}\n\n".encode()
+        yield b"data: [DONE]\n\n"
+
+    async def handle(req: httpx.Request) -> httpx.Response:
+        if not req.url.path.endswith("/chat/completions"):
+            return httpx.Response(404, json={"error": {"message": f"stub: no route {req.url.path}"}})
+        body = json.loads(req.content)
+        if LATENCY_MS:
+            await asyncio.sleep(LATENCY_MS / 1000)
+        if body.get("stream"):
+            return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=asse(body))
+        return httpx.Response(200, json=complete(body, delay=False))
+
+    return AsyncOpenAI(api_key="stub", base_url="http://llm-stub/v1",
+                       http_client=httpx.AsyncClient(transport=httpx.MockTransport(handle)))
@@ -1,8 +1,19 @@
-import os, json
+import asyncio, os, json, hashlib, re, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import Callable, Dict, List, Tuple, Any
-from openai import OpenAI
+from src.agents import completion_cache
+from src.agents.llm_gateway import default_gateway
+from src.tools import answer_cache
+from src.tools.embeddings import default_embedder
+from src.observability.tracing import propagate, span
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Tool calls from one assistant turn run concurrently on this pool, which runs nothing else.
+# Each call's clock starts when it starts executing, so time spent queued behind other
+# conversations' calls doesn't count; a call still running TOOL_TIMEOUT seconds after it
+# started is reported to the model as timed out (the thread can't be stopped; its result
+# is dropped). Calls that never got to start are cancelled.
+TOOL_TIMEOUT = float(os.getenv("LLM_TOOL_TIMEOUT", "10"))
+_tool_pool = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_TOOL_WORKERS", "8")), thread_name_prefix="llm-tool")
 
 def _schemas_for_domain(domain: str) -> List[Dict[str, Any]]:
     """Tool schemas exposed to the LLM for a given domain."""
@@ -76,55 +87,237 @@ def build_registry(*, user_id: str, traits: dict, tools: dict) -> Dict[str, Call
         "kb_answer": lambda question: tools["kb"].answer(question),
     }
 
+# Turns that called tools, and only these, have no side effects, so their answers can be replayed
+CACHEABLE_TOOLS = {"kb_answer"}
+# Numbers, quantities and ids in a message; a cached answer is only replayed for the same ones
+_NUMBERS = re.compile(r"\d+(?:[.,]\d+)*")
+# Outcome tag recorded when a tool call succeeds
+TOOL_TAGS = {
+    "recommend_bundle": "high_intent_engagement", "create_lead": "lead_created",
+    "create_opportunity": "opportunity_created", "book_meeting": "meeting_booked",
+    "issue_goodwill": "goodwill_credit", "create_case": "case_with_context", "kb_answer": "kb_response",
+}
+
 SYSTEM_BASE = """You are a helpful assistant operating inside a specific business domain.
 You can choose and call functions to achieve the user's goal. Prefer taking real actions over generic text.
 Respond concisely. After calling tools, synthesize a human-friendly final answer."""
 
-def llm_toolstep(
-    *, domain: str, user_message: str, traits: dict, registry: Dict[str, Callable[..., Any]],
-    extra_system: str = ""
-) -> Tuple[str, List[Tuple[str, Any]]]:
-    """
-    Calls OpenAI with domain-scoped tools; executes tool calls; returns (final_text, call_log).
-    call_log is [(tool_name, result), ...] for the node to derive tags / memory updates.
-    """
-    tools = _schemas_for_domain(domain)
-    messages = [
-        {"role":"system","content": SYSTEM_BASE + ("\n" + extra_system if extra_system else "")},
-        {"role":"user","content": user_message}
-    ]
-    resp = client.chat.completions.create(
+def _call_tool(registry: Dict[str, Callable[..., Any]], name: str, arguments: str):
+    with span("llm.tool_call", {"tool": name, "arguments": arguments}) as s:
+        if name not in registry:
+            result = {"error": "unknown_tool"}
+        else:
+            try:
+                result = registry[name](**json.loads(arguments or "{}"))
+            except Exception as e:  # the model gets the error back instead of the turn failing
+                result = {"error": f"{type(e).__name__}: {e}"}
+        if _failed(result):
+            s.fail(result["error"])
+        return result
+
+def _started_call(started: dict, i: int, registry: Dict[str, Callable[..., Any]], name: str, arguments: str):
+    started[i] = time.monotonic()
+    return _call_tool(registry, name, arguments)
+
+def _next_check(pending: dict, started: dict, timeout: float, now: float) -> float:
+    """Seconds until the earliest running call times out; short while some are still queued, to see them start."""
+    left = [started[i] + timeout - now for i in pending.values() if i in started]
+    return max(0.0, min(left + ([0.05] if len(left) < len(pending) else [])))
+
+def _expired(pending: dict, started: dict, timeout: float, now: float) -> list:
+    return [fut for fut, i in pending.items() if i in started and now - started[i] >= timeout and not fut.done()]
+
+def iter_tool_calls(tool_calls, registry: Dict[str, Callable[..., Any]], timeout: float | None = None):
+    """Run one turn's tool calls concurrently, yielding (index, name, result) as each finishes."""
+    timeout = TOOL_TIMEOUT if timeout is None else timeout
+    started: dict[int, float] = {}
+    pending = {_tool_pool.submit(propagate(_started_call), started, i, registry, tc.function.name, tc.function.arguments): i
+               for i, tc in enumerate(tool_calls)}
+    try:
+        while pending:
+            for fut in _expired(pending, started, timeout, time.monotonic()):
+                i = pending.pop(fut)
+                yield i, tool_calls[i].function.name, {"error": "timeout"}
+            done, _ = wait(pending, timeout=_next_check(pending, started, timeout, time.monotonic()), return_when=FIRST_COMPLETED)
+            for fut in done:
+                i = pending.pop(fut)
+                yield i, tool_calls[i].function.name, fut.result()
+    finally:
+        for fut in pending:
+            fut.cancel()  # only stops calls that haven't started
+
+async def aiter_tool_calls(tool_calls, registry: Dict[str, Callable[..., Any]], timeout: float | None = None):
+    """iter_tool_calls for async callers: the same bounded pool, awaited instead of blocked on."""
+    timeout = TOOL_TIMEOUT if timeout is None else timeout
+    loop = asyncio.get_running_loop()
+    started: dict[int, float] = {}
+    pending = {loop.run_in_executor(_tool_pool, propagate(_started_call), started, i, registry, tc.function.name,
+                                    tc.function.arguments): i
+               for i, tc in enumerate(tool_calls)}
+    try:
+        while pending:
+            for fut in _expired(pending, started, timeout, time.monotonic()):
+                i = pending.pop(fut)
+                fut.cancel()
+                yield i, tool_calls[i].function.name, {"error": "timeout"}
+            if not pending:
+                break
+            done, _ = await asyncio.wait(pending, timeout=_next_check(pending, started, timeout, time.monotonic()),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            for fut in done:
+                i = pending.pop(fut)
+                yield i, tool_calls[i].function.name, fut.result()
+    finally:
+        for fut in pending:
+            fut.cancel()
+
+def run_tool_calls(tool_calls, registry: Dict[str, Callable[..., Any]], timeout: float | None = None) -> List[Tuple[str, Any]]:
+    """Run one turn's tool calls concurrently; results come back in the order the model asked for them."""
+    results = [None] * len(tool_calls)
+    for i, name, result in iter_tool_calls(tool_calls, registry, timeout):
+        results[i] = (name, result)
+    return results
+
+def _cached_turn(domain: str, user_message: str, extra_system: str, use_cache: bool):
+    """(cache, vec, hit): the semantic cache for this domain/prompt and any stored answer for the message.
+
+    Messages differing only in numbers or ids embed almost identically, so a stored answer
+    counts as a hit only when its message had the same ones."""
+    if not use_cache:
+        return None, None, None
+    vec = default_embedder().embed([user_message])[0]
+    scope = hashlib.sha1(extra_system.encode()).hexdigest()[:12]
+    cache = answer_cache.get_cache(f"llm:{domain}:{scope}", len(vec))
+    hit = cache.lookup(vec) if cache else None
+    return cache, vec, hit if hit and hit.get("numbers") == _NUMBERS.findall(user_message) else None
+
+def _first_request(domain: str, user_message: str, extra_system: str) -> dict:
+    return dict(
         model=os.getenv("OPENAI_MODEL","gpt-4o-mini"),
-        messages=messages,
-        tools=tools,
+        messages=[
+            {"role":"system","content": SYSTEM_BASE + ("\n" + extra_system if extra_system else "")},
+            {"role":"user","content": user_message}
+        ],
+        tools=_schemas_for_domain(domain),
         tool_choice="auto",
         temperature=0.2,
     )
-    msg = resp.choices[0].message
+
+def _final_request(first: dict, msg, call_log: List[Tuple[str, Any]]) -> dict:
+    """Follow-up request: one assistant message carrying every tool call, then each result in order."""
+    messages = first["messages"] + [{"role":"assistant", "content": msg.content, "tool_calls":[
+        {"id": tc.id, "type": "function", "function":{"name": tc.function.name, "arguments": tc.function.arguments}}
+        for tc in msg.tool_calls]}]
+    for tc, (_, result) in zip(msg.tool_calls, call_log):
+        messages.append({"role":"tool", "tool_call_id": tc.id, "content": json.dumps(result, default=str)})
+    return dict(model=first["model"], messages=messages, temperature=0.2)
+
+def _failed(result) -> bool:
+    return isinstance(result, dict) and "error" in result
+
+def _remember(cache, vec, user_message: str, text: str, call_log: List[Tuple[str, Any]]):
+    # A turn without tool calls is the model answering from the message alone; replaying it
+    # for a similar message from someone else is a guess, so only tool-backed answers are kept
+    if cache and call_log and not any(_failed(r) for _, r in call_log) and all(name in CACHEABLE_TOOLS for name, _ in call_log):
+        cache.store(vec, {"text": text, "calls": call_log, "numbers": _NUMBERS.findall(user_message)})
+
+def _ms(t0: float, t: float | None = None) -> float:
+    return round(((t if t is not None else time.perf_counter()) - t0) * 1000, 1)
+
+def llm_toolstream(
+    *, domain: str, user_message: str, traits: dict, registry: Dict[str, Callable[..., Any]],
+    extra_system: str = "", use_cache: bool = True
+):
+    """
+    Streaming form of llm_toolstep. Yields events as the turn progresses:
+      {"event": "tool_call", "name", "arguments"}   the model asked for a tool
+      {"event": "tool_result", "name", "ok"}        that tool finished (or failed / timed out)
+      {"event": "token", "text"}                    a piece of the final answer
+      {"event": "done", "text", "calls", "ttft_ms", "cached"}
+    ttft_ms is the time from the call to the first token of the answer.
+    """
+    t0 = time.perf_counter()
+    cache, vec, hit = _cached_turn(domain, user_message, extra_system, use_cache)
+    if hit:
+        yield {"event": "token", "text": hit["text"]}
+        yield {"event": "done", "text": hit["text"], "calls": [tuple(c) for c in hit["calls"]], "ttft_ms": _ms(t0), "cached": True}
+        return
+
+    first, llm = _first_request(domain, user_message, extra_system), default_gateway().client(domain)
+    msg = completion_cache.create(llm, domain=domain, **first).choices[0].message
+    call_log: List[Tuple[str, Any]] = []
+    ttft = None
+
+    # Execute tool calls concurrently, then stream the final answer written from their results
+    if getattr(msg, "tool_calls", None):
+        for tc in msg.tool_calls:
+            yield {"event": "tool_call", "name": tc.function.name, "arguments": tc.function.arguments}
+        call_log = [None] * len(msg.tool_calls)
+        for i, name, result in iter_tool_calls(msg.tool_calls, registry):
+            call_log[i] = (name, result)
+            yield {"event": "tool_result", "name": name, "ok": not _failed(result)}
+        parts = []
+        for piece in completion_cache.stream_text(llm, domain=domain, **_final_request(first, msg, call_log)):
+            ttft = ttft or time.perf_counter()
+            parts.append(piece)
+            yield {"event": "token", "text": piece}
+        text = "".join(parts)
+    else:
+        # No tool call; the first reply is the answer
+        text, ttft = msg.content or "", time.perf_counter()
+        yield {"event": "token", "text": text}
+
+    _remember(cache, vec, user_message, text, call_log)
+    yield {"event": "done", "text": text, "calls": call_log, "ttft_ms": _ms(t0, ttft), "cached": False}
+
+async def allm_toolstream(
+    *, domain: str, user_message: str, traits: dict, registry: Dict[str, Callable[..., Any]],
+    extra_system: str = "", use_cache: bool = True
+):
+    """llm_toolstream on the event loop: async completions through the gateway, tools and embeddings on worker threads."""
+    t0 = time.perf_counter()
+    cache, vec, hit = await asyncio.to_thread(_cached_turn, domain, user_message, extra_system, use_cache)
+    if hit:
+        yield {"event": "token", "text": hit["text"]}
+        yield {"event": "done", "text": hit["text"], "calls": [tuple(c) for c in hit["calls"]], "ttft_ms": _ms(t0), "cached": True}
+        return
+
+    first, llm = _first_request(domain, user_message, extra_system), default_gateway().aclient(domain)
+    msg = (await completion_cache.acreate(llm, domain=domain, **first)).choices[0].message
     call_log: List[Tuple[str, Any]] = []
+    ttft = None
 
-    # Execute tool calls (single step or chain)
     if getattr(msg, "tool_calls", None):
         for tc in msg.tool_calls:
-            name = tc.function.name
-            args = json.loads(tc.function.arguments or "{}")
-            if name not in registry:
-                call_log.append((name, {"error":"unknown_tool"}))
-                continue
-            # Call tool
-            result = registry[name](**{k: v for k, v in args.items()})
-            call_log.append((name, result))
-            # Feed tool result back to model
-            messages.append({"role":"assistant", "tool_calls":[{"id": tc.id, "function":{"name":name, "arguments": tc.function.arguments}}]})
-            messages.append({"role":"tool", "tool_call_id": tc.id, "content": json.dumps(result)})
-
-        # Ask model for final user-facing answer
-        final = client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL","gpt-4o-mini"),
-            messages=messages,
-            temperature=0.2,
-        )
-        return final.choices[0].message.content, call_log
-
-    # No tool call; just return text
-    return (msg.content or ""), call_log
\ No newline at end of file
+            yield {"event": "tool_call", "name": tc.function.name, "arguments": tc.function.arguments}
+        call_log = [None] * len(msg.tool_calls)
+        async for i, name, result in aiter_tool_calls(msg.tool_calls, registry):
+            call_log[i] = (name, result)
+            yield {"event": "tool_result", "name": name, "ok": not _failed(result)}
+        parts = []
+        async for piece in completion_cache.astream_text(llm, domain=domain, **_final_request(first, msg, call_log)):
+            ttft = ttft or time.perf_counter()
+            parts.append(piece)
+            yield {"event": "token", "text": piece}
+        text = "".join(parts)
+    else:
+        text, ttft = msg.content or "", time.perf_counter()
+        yield {"event": "token", "text": text}
+
+    _remember(cache, vec, user_message, text, call_log)
+    yield {"event": "done", "text": text, "calls": call_log, "ttft_ms": _ms(t0, ttft), "cached": False}
+
+def llm_toolstep(
+    *, domain: str, user_message: str, traits: dict, registry: Dict[str, Callable[..., Any]],
+    extra_system: str = "", use_cache: bool = True
+) -> Tuple[str, List[Tuple[str, Any]]]:
+    """
+    Calls OpenAI with domain-scoped tools; executes tool calls; returns (final_text, call_log).
+    call_log is [(tool_name, result), ...] for the node to derive tags / memory updates.
+    Turns that only read the KB are cached on the message embedding (and its numbers), so
+    near-duplicate questions skip both completion calls.
+    """
+    for event in llm_toolstream(domain=domain, user_message=user_message, traits=traits, registry=registry,
+                                extra_system=extra_system, use_cache=use_cache):
+        if event["event"] == "done":
+            return event["text"], event["calls"]
@@ -1,8 +1,7 @@
 from typing import Any, Dict, List
 import os
-from openai import OpenAI
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from src.agents import completion_cache
+from src.agents.llm_gateway import default_gateway
 
 def get_tool_schemas() -> List[Dict[str, Any]]:
     return [
@@ -56,8 +55,9 @@ def get_tool_schemas() -> List[Dict[str, Any]]:
         },
     ]
 
-def chat_with_tools(system_prompt: str, messages: List[Dict[str, str]]):
-    resp = client.chat.completions.create(
+def chat_with_tools(system_prompt: str, messages: List[Dict[str, str]], domain: str = "chat"):
+    resp = completion_cache.create(
+        default_gateway().client(domain), domain=domain,
         model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
         messages=[{"role":"system","content":system_prompt}] + messages,
         tools=get_tool_schemas(),
@@ -1,59 +1,162 @@
-import json
-from typing import Tuple, List
-from src.tools.catalog import CatalogTool
-from src.tools.orders import OrderTool
-from src.tools.crm import CRMTool
-from src.tools.helpdesk import HelpdeskTool
-from src.tools.kb import KBTool
-from src.tools.calendar import CalendarTool
-from src.memory.store import MemoryStore
+import asyncio, json, os, time
+from typing import AsyncIterator, Iterator, Tuple, List
+from src.agents import resources
+from src.agents.router import classify
+from src.tools.helpdesk import credit_note, open_cases_note
+from src.observability.metrics import timed
 try:
     from src.observability.phoenix_tracing import traced
 except ImportError:
     from src.observability.phoenix_tracing_mock import traced
 
+USE_LLM_TOOLCALLING = os.getenv("USE_LLM_TOOLCALLING", "false").lower() == "true"
+# memory intent recorded for an LLM or planner-graph turn in each routed domain
+LLM_INTENTS = {"marketing": "marketing_consult", "sales": "sales_assist", "support": "cs_resolution", "kb": "kb_answer"}
+
 class Orchestrator:
-    def __init__(self):
-        self.catalog = CatalogTool()
-        self.order = OrderTool()
-        self.crm = CRMTool()
-        self.helpdesk = HelpdeskTool()
-        self.kb = KBTool()
-        self.calendar = CalendarTool()
-        self.memory = MemoryStore()
+    """Tools, the memory store and the planner graph are process-wide (src.agents.resources) and
+    each is loaded on first use, so constructing an Orchestrator is cheap and a turn only pays
+    for the tools it touches. With use_graph the non-LLM path runs the LangGraph planner
+    instead of the keyword handlers."""
+    def __init__(self, use_llm: bool = USE_LLM_TOOLCALLING, use_graph: bool = False):
+        self.use_llm = use_llm
+        self.use_graph = use_graph
+        self.tools = resources.tools
+
+    memory = property(lambda self: resources.memory())
+    # every tool method call shows up as a child span of the turn
+    catalog = property(lambda self: self.tools["catalog"])
+    order = property(lambda self: self.tools["orders"])
+    crm = property(lambda self: self.tools["crm"])
+    helpdesk = property(lambda self: self.tools["helpdesk"])
+    kb = property(lambda self: self.tools["kb"])
+    calendar = property(lambda self: self.tools["calendar"])
 
     def handle_message(self, user_id: str, message: str, channel: str = "web") -> Tuple[str, List[str], str]:
+        if self.use_llm:
+            for event in self.handle_message_stream(user_id, message, channel):
+                if event["event"] == "done":
+                    return event["reply"], event["tags"], event["trace_id"]
+        return self._handle_local(user_id, message, channel)
+
+    def handle_message_stream(self, user_id: str, message: str, channel: str = "web") -> Iterator[dict]:
+        """Yield tool progress and reply tokens as they happen, ending with
+        {"event": "done", "reply", "tags", "trace_id", "ttft_ms"}. The keyword path has no
+        model to stream from, so its whole reply arrives as one token."""
+        if not self.use_llm:
+            t0 = time.perf_counter()
+            reply, tags, trace_id = self._handle_local(user_id, message, channel)
+            ttft_ms = round((time.perf_counter() - t0) * 1000, 1)
+            yield {"event": "token", "text": reply}
+            yield {"event": "done", "reply": reply, "tags": tags, "trace_id": trace_id, "ttft_ms": ttft_ms}
+            return
+        from src.agents.llm_toolcaller import build_registry, llm_toolstream
+        with traced("orchestrator", {"user_id": user_id, "message": message, "mode": "llm"}) as span, timed("orchestrator.turn", mode="llm"):
+            with timed("route"):
+                domain = classify(message)
+            traits = self.memory.get_profile(user_id, last_n=0)["traits"]
+            registry = build_registry(user_id=user_id, traits=traits, tools=self.tools)
+            for event in llm_toolstream(domain=domain, user_message=message, traits=traits, registry=registry):
+                if event["event"] != "done":
+                    yield event
+                    continue
+                yield self._finish_llm(span, user_id, message, channel, domain, event)
+
+    async def handle_message_async(self, user_id: str, message: str, channel: str = "web") -> Tuple[str, List[str], str]:
+        """handle_message for the event loop: the LLM path awaits AsyncOpenAI and runs tools and
+        memory writes on worker threads; the keyword path (local tools only) runs on one thread."""
+        if not self.use_llm:
+            return await asyncio.to_thread(self._handle_local, user_id, message, channel)
+        async for event in self.handle_message_stream_async(user_id, message, channel):
+            done = event  # run the stream to the end so its span closes inside the caller's
+        return done["reply"], done["tags"], done["trace_id"]
+
+    async def handle_message_stream_async(self, user_id: str, message: str, channel: str = "web") -> AsyncIterator[dict]:
+        """handle_message_stream for the event loop."""
+        if not self.use_llm:
+            for event in await asyncio.to_thread(lambda: list(self.handle_message_stream(user_id, message, channel))):
+                yield event
+            return
+        from src.agents.llm_toolcaller import allm_toolstream, build_registry
+        with traced("orchestrator", {"user_id": user_id, "message": message, "mode": "llm"}) as span, timed("orchestrator.turn", mode="llm"):
+            with timed("route"):
+                domain = classify(message)
+            profile = await asyncio.to_thread(self.memory.get_profile, user_id, last_n=0)
+            registry = build_registry(user_id=user_id, traits=profile["traits"], tools=self.tools)
+            async for event in allm_toolstream(domain=domain, user_message=message, traits=profile["traits"], registry=registry):
+                if event["event"] != "done":
+                    yield event
+                    continue
+                yield await asyncio.to_thread(self._finish_llm, span, user_id, message, channel, domain, event)
+
+    def _finish_llm(self, span, user_id: str, message: str, channel: str, domain: str, event: dict) -> dict:
+        """Record an LLM turn in memory and turn the tool-caller's done event into the orchestrator's."""
+        from src.agents.llm_toolcaller import TOOL_TAGS
+        calls = event["calls"]
+        tags = [TOOL_TAGS[name] for name, result in calls
+                if name in TOOL_TAGS and not (isinstance(result, dict) and "error" in result)
+                and not (name == "issue_goodwill" and result.get("amount") == 0)]  # nothing granted: no credit tag
+        span.attributes["ttft_ms"] = event["ttft_ms"]
+        self.memory.add_interaction(user_id, {"intent": LLM_INTENTS[domain], "channel": channel, "tags": tags,
+                                              "q": message, "tools": [name for name, _ in calls],
+                                              "ttft_ms": event["ttft_ms"]})
+        return {"event": "done", "reply": event["text"], "tags": tags, "trace_id": span.trace_id, "ttft_ms": event["ttft_ms"]}
+
+    def _handle_local(self, user_id: str, message: str, channel: str = "web") -> Tuple[str, List[str], str]:
+        return (self._handle_graph if self.use_graph else self._handle_keywords)(user_id, message, channel)
+
+    def _handle_graph(self, user_id: str, message: str, channel: str = "web") -> Tuple[str, List[str], str]:
+        with traced("orchestrator", {"user_id": user_id, "message": message, "mode": "graph"}) as span, timed("orchestrator.turn", mode="graph"):
+            state = resources.graph().invoke({"message": message, "user_id": user_id})
+            reply, tags = state["result"]
+            intent = "kb_handoff" if state["intent"] == "kb" and "human_handoff" in tags else LLM_INTENTS[state["intent"]]
+            self.memory.add_interaction(user_id, {"intent": intent, "channel": channel, "tags": list(tags), "q": message})
+            return reply, list(tags), span.trace_id
+
+    def _handle_keywords(self, user_id: str, message: str, channel: str = "web") -> Tuple[str, List[str], str]:
         tags: List[str] = []
-        with traced("orchestrator", {"user_id": user_id, "message": message}) as span:
+        with traced("orchestrator", {"user_id": user_id, "message": message}) as span, timed("orchestrator.turn", mode="keywords"):
             m = message.lower()
-            if "lounge" in m or "recommend" in m or "bundle" in m:
+            with timed("route"):
+                intent = classify(message)
+            if intent == "marketing":
                 items = self.catalog.recommend_bundle(m)
-                lead_id = self.crm.create_lead(user_id, context={"message": message, "bundle": items})
-                self.memory.add_interaction(user_id, {"intent": "marketing_consult", "bundle": items, "lead_id": lead_id})
+                lead_id = self.crm.create_lead(user_id, context={"message": message, "bundle": items}, source=message)
                 tags += ["high_intent_engagement", "lead_created"]
+                self.memory.add_interaction(user_id, {"intent": "marketing_consult", "channel": channel, "tags": tags,
+                                                      "bundle": items, "lead_id": lead_id})
                 reply = f"Bundle rec: {', '.join([i['name'] for i in items])}. Created Lead {lead_id}. Schedule a call?"
                 return reply, tags, span.trace_id
-            if "price" in m or "quote" in m or "units" in m:
+            if intent == "sales":
                 quote = self.catalog.price_quote(message)
-                evt = self.crm.create_opportunity(user_id, quote)
+                evt = self.crm.create_opportunity(user_id, quote, source=message)
                 meeting = self.calendar.book_meeting(user_id, duration_min=30)
-                self.memory.add_interaction(user_id, {"intent": "sales_assist", "quote": quote, "meeting": meeting})
                 tags += ["opportunity_created", "meeting_booked"]
+                self.memory.add_interaction(user_id, {"intent": "sales_assist", "channel": channel, "tags": tags,
+                                                      "quote": quote, "meeting": meeting})
                 reply = f"Quote ready: {quote['summary']}. Booked 30 min: {meeting['when']} ({meeting['link']})."
                 return reply, tags, span.trace_id
-            if "order" in m or "delayed" in m or "cancel" in m or "return" in m:
+            if intent == "support":
                 status = self.order.lookup(message)
                 if status.get("delayed"):
                     credit = self.helpdesk.issue_goodwill(user_id, amount=20)
                     case = self.helpdesk.create_case(user_id, summary=f"Delay on {status['order_id']}", details=status)
-                    self.memory.add_interaction(user_id, {"intent": "cs_resolution", "order": status, "credit": credit, "case": case})
-                    tags += ["resolved_autonomously", "goodwill_credit", "case_with_context"]
-                    reply = f"Order {status['order_id']} delayed; expedited + ${credit['amount']} credit. Case {case['id']} opened."
+                    tags += ["resolved_autonomously", *(["goodwill_credit"] if credit["amount"] else []), "case_with_context"]
+                    self.memory.add_interaction(user_id, {"intent": "cs_resolution", "channel": channel, "tags": tags,
+                                                          "order": status, "credit": credit, "case": case})
+                    reply = f"Order {status['order_id']} delayed; expedited{credit_note(credit)}. Case {case['id']} {'updated' if case['repeat'] else 'opened'}."
                     return reply, tags, span.trace_id
                 else:
-                    reply = f"Order {status.get('order_id','N/A')} on track. Anything else?"
+                    reply = f"Order {status.get('order_id','N/A')} on track.{open_cases_note(self.helpdesk.list_open_cases(user_id))} Anything else?"
                     return reply, tags, span.trace_id
-            answer = self.kb.answer(message)
-            self.memory.add_interaction(user_id, {"intent": "kb_answer", "q": message, "a": answer})
+            from src.tools.kb import KB_MIN_SCORE, format_hit  # faiss and the index load on the first KB turn
+            hits = self.kb.answer_many([message], k=1, min_score=KB_MIN_SCORE)[0]
+            if not hits:
+                tags += ["human_handoff"]
+                self.memory.add_interaction(user_id, {"intent": "kb_handoff", "channel": channel, "tags": tags, "q": message})
+                return "I don't have a confident answer for that. I've passed it to a teammate who will follow up.", tags, span.trace_id
+            answer = format_hit(hits[0])
             tags += ["kb_response"]
+            self.memory.add_interaction(user_id, {"intent": "kb_answer", "channel": channel, "tags": tags,
+                                                  "q": message, "a": answer, "score": hits[0]["score"]})
             return answer, tags, span.trace_id
@@ -1,53 +1,166 @@
-from typing import Dict, Any
+import os, time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import TypedDict
 from langgraph.graph import StateGraph, END
+from src.agents.router import route
+from src.tools.helpdesk import credit_note, open_cases_note
+from src.observability.tracing import propagate
 
-class State(dict):
+# Independent tool calls inside a node run on this pool; a node gives up on whatever has
+# not finished NODE_TIMEOUT seconds after it started and hands the conversation off.
+# Writes (credits, cases, CRM records, meetings) can't be taken back once they start, so a
+# timed-out node cancels the calls that haven't started, gives writes already running up to
+# SETTLE_SECS more, and tells the customer which went through and which are still pending.
+NODE_TIMEOUT = float(os.getenv("PLANNER_NODE_TIMEOUT", "10"))
+SETTLE_SECS = float(os.getenv("PLANNER_SETTLE_SECS", "2"))
+_pool = ThreadPoolExecutor(max_workers=int(os.getenv("PLANNER_TOOL_WORKERS", "16")), thread_name_prefix="planner-tool")
+TIMEOUT_RESULT = ("That's taking longer than expected on our side. A teammate will pick this up and follow up shortly.",
+                  ["tool_timeout", "human_handoff"])
+
+class NodeTimeout(Exception):
     pass
 
+class Deadline:
+    """Submits tool calls to the shared pool and waits for them within one node's time budget."""
+    def __init__(self, seconds: float | None = None):
+        self.at = time.monotonic() + (NODE_TIMEOUT if seconds is None else seconds)
+        self._futures, self._writes = [], []
+
+    def submit(self, fn, *args, **kwargs):
+        future = _pool.submit(propagate(fn), *args, **kwargs)
+        self._futures.append(future)
+        return future
+
+    def write(self, what: str, describe, fn, *args, **kwargs):
+        """Submit a call with side effects. For the timeout reply, `describe(result)` gives (note, tag) or None,
+        and `what` names the write if it is still running."""
+        future = self.submit(fn, *args, **kwargs)
+        self._writes.append((future, what, describe))
+        return future
+
+    def result(self, future):
+        try:
+            return future.result(timeout=max(0.0, self.at - time.monotonic()))
+        except FutureTimeout:
+            raise NodeTimeout from None
+
+    def settle(self, grace: float | None = None) -> tuple[list[tuple[str, str]], list[str]]:
+        """After a timeout: cancel calls that haven't started and give running writes up to `grace` seconds.
+        Returns (note, tag) for the writes that landed and the names of those still running."""
+        for future in self._futures:
+            future.cancel()
+        until = time.monotonic() + (SETTLE_SECS if grace is None else grace)
+        done, pending = [], []
+        for future, what, describe in self._writes:
+            if future.cancelled():
+                continue
+            try:
+                if future.exception(timeout=max(0.0, until - time.monotonic())) is not None:
+                    continue
+            except FutureTimeout:
+                pending.append(what)
+                continue
+            effect = describe(future.result())
+            if effect:
+                done.append(effect)
+        return done, pending
+
+def _with_deadline(node):
+    def run(state: State, tools) -> State:
+        deadline = Deadline()
+        try:
+            return node(state, tools, deadline)
+        except NodeTimeout:
+            done, pending = deadline.settle()
+            text, tags = TIMEOUT_RESULT
+            if done:
+                text += f" Already done: {'; '.join(note for note, _ in done)}."
+            if pending:
+                text += f" Still in progress: {', '.join(pending)}."
+            state['result'] = (text, [tag for _, tag in done] + (["write_pending"] if pending else []) + tags)
+            return state
+    return run
+
+def _lead(lead_id):
+    return f"created lead {lead_id}", "lead_created"
+
+def _opportunity(evt):
+    return f"opened opportunity {evt['id']}", "opportunity_created"
+
+def _meeting(meeting):
+    return f"booked a 30 min call for {meeting['when']}", "meeting_booked"
+
+def _credit(credit):
+    return (f"issued a ${credit['amount']:g} credit", "goodwill_credit") if credit['amount'] else None
+
+def _case(case):
+    return f"{'updated' if case['repeat'] else 'opened'} case {case['id']}", "case_with_context"
+
+class State(TypedDict, total=False):  # langgraph builds one channel per declared key
+    message: str
+    user_id: str
+    intent: str
+    route_evidence: dict
+    result: tuple
+
 def classify_intent(state: State) -> State:
-    m = state['message'].lower()
-    if any(k in m for k in ["lounge","recommend","bundle"]):
-        state['intent'] = 'marketing'
-    elif any(k in m for k in ["price","quote","units","by end of"]):
-        state['intent'] = 'sales'
-    elif any(k in m for k in ["order","delayed","cancel","return"]):
-        state['intent'] = 'support'
-    else:
-        state['intent'] = 'kb'
+    r = route(state['message'])
+    state['intent'] = r.intent
+    state['route_evidence'] = r.evidence
     return state
 
-def marketing_node(state: State, tools) -> State:
-    items = tools['catalog'].recommend_bundle(state['message'])
-    lead_id = tools['crm'].create_lead(state['user_id'], {"bundle": items})
+@_with_deadline
+def marketing_node(state: State, tools, deadline: Deadline) -> State:
+    # the lead carries the bundle, so these two stay in sequence
+    items = deadline.result(deadline.submit(tools['catalog'].recommend_bundle, state['message']))
+    lead_id = deadline.result(deadline.write("your lead", _lead, tools['crm'].create_lead, state['user_id'],
+                                             {"bundle": items}, source=state['message']))
     state['result'] = (f"Bundle rec: {', '.join([i['name'] for i in items])}. Created Lead {lead_id}. Schedule a call?",
                        ["high_intent_engagement","lead_created"])
     return state
 
-def sales_node(state: State, tools) -> State:
-    quote = tools['catalog'].price_quote(state['message'])
-    evt = tools['crm'].create_opportunity(state['user_id'], quote)
-    meeting = tools['calendar'].book_meeting(state['user_id'])
+@_with_deadline
+def sales_node(state: State, tools, deadline: Deadline) -> State:
+    # booking the meeting does not need the quote: run it alongside quote -> opportunity
+    booked = deadline.write("your meeting booking", _meeting, tools['calendar'].book_meeting, state['user_id'])
+    quote = deadline.result(deadline.submit(tools['catalog'].price_quote, state['message']))
+    evt = deadline.result(deadline.write("your opportunity", _opportunity, tools['crm'].create_opportunity,
+                                         state['user_id'], quote, source=state['message']))
+    meeting = deadline.result(booked)
     state['result'] = (f"Quote ready: {quote['summary']}. Booked 30 min: {meeting['when']} ({meeting['link']}).",
                        ["opportunity_created","meeting_booked"])
     return state
 
-def support_node(state: State, tools) -> State:
-    status = tools['orders'].lookup(state['message'])
+@_with_deadline
+def support_node(state: State, tools, deadline: Deadline) -> State:
+    # the user's open cases are read alongside the order lookup; only the on-track reply needs them
+    listed = deadline.submit(tools['helpdesk'].list_open_cases, state['user_id'])
+    status = deadline.result(deadline.submit(tools['orders'].lookup, state['message']))
     if status.get('delayed'):
-        credit = tools['helpdesk'].issue_goodwill(state['user_id'], 20)
-        case = tools['helpdesk'].create_case(state['user_id'], f"Delay on {status['order_id']}", status)
-        state['result'] = (f"Order {status['order_id']} delayed; expedited + ${credit['amount']} credit. Case {case['id']} opened.",
-                           ["resolved_autonomously","goodwill_credit","case_with_context"])
+        credited = deadline.write("your goodwill credit", _credit, tools['helpdesk'].issue_goodwill, state['user_id'], 20)
+        opened = deadline.write("your case", _case, tools['helpdesk'].create_case, state['user_id'],
+                                f"Delay on {status['order_id']}", status)
+        credit, case = deadline.result(credited), deadline.result(opened)
+        state['result'] = (f"Order {status['order_id']} delayed; expedited{credit_note(credit)}. "
+                           f"Case {case['id']} {'updated' if case['repeat'] else 'opened'}.",
+                           ["resolved_autonomously", *(["goodwill_credit"] if credit['amount'] else []), "case_with_context"])
     else:
-        state['result'] = (f"Order {status.get('order_id','N/A')} on track. Anything else?", [])
+        state['result'] = (f"Order {status.get('order_id','N/A')} on track.{open_cases_note(deadline.result(listed))} Anything else?", [])
     return state
 
-def kb_node(state: State, tools) -> State:
-    answer = tools['kb'].answer(state['message'])
-    state['result'] = (answer, ["kb_response"])
+@_with_deadline
+def kb_node(state: State, tools, deadline: Deadline) -> State:
+    from src.tools.kb import KB_MIN_SCORE, format_hit
+    hits = deadline.result(deadline.submit(tools['kb'].answer_many, [state['message']], k=1, min_score=KB_MIN_SCORE))[0]
+    if hits:
+        state['result'] = (format_hit(hits[0]), ["kb_response"])
+    else:
+        state['result'] = ("I don't have a confident answer for that. I've passed it to a teammate who will follow up.",
+                           ["human_handoff"])
     return state
 
 def build_graph(tools):
+    """Compile a fresh graph over `tools`; resources.graph() holds the one compiled over the shared tools."""
     g = StateGraph(State)
     g.add_node("classify", classify_intent)
     g.add_node("marketing", lambda s: marketing_node(s, tools))
@@ -0,0 +1,70 @@
+"""Process-wide tools, memory store and planner graph, each built the first time it is asked for.
+
+Every Orchestrator, Streamlit session and rerun in a process shares these, so the catalog
+snapshot, the KB index and the compiled planner graph are loaded once. Nothing heavy is
+imported here: a tool's module (and NumPy/faiss behind the catalog and KB) is imported when
+that tool is first used, so a sales-only turn never loads the KB index.
+"""
+import importlib, threading
+from collections.abc import Mapping
+from functools import lru_cache
+from src.observability.tracing import instrument
+
+TOOLS = {
+    "catalog": ("src.tools.catalog", "CatalogTool"),
+    "orders": ("src.tools.orders", "OrderTool"),
+    "crm": ("src.tools.crm", "CRMTool"),
+    "helpdesk": ("src.tools.helpdesk", "HelpdeskTool"),
+    "kb": ("src.tools.kb", "KBTool"),
+    "calendar": ("src.tools.calendar", "CalendarTool"),
+}
+_built: dict = {}
+_locks = {name: threading.Lock() for name in TOOLS}  # one slow build (the KB index) doesn't hold up the others
+
+def tool(name: str):
+    """The shared, instrumented instance of tool `name`."""
+    t = _built.get(name)
+    if t is None:
+        with _locks[name]:
+            t = _built.get(name)
+            if t is None:
+                module, cls = TOOLS[name]
+                t = _built[name] = instrument(getattr(importlib.import_module(module), cls)(), name)
+    return t
+
+def loaded() -> list[str]:
+    return [name for name in TOOLS if name in _built]
+
+class Tools(Mapping):
+    """Read-only mapping over the shared tools; an entry is built on first lookup."""
+    def __getitem__(self, name: str):
+        if name not in TOOLS:
+            raise KeyError(name)
+        return tool(name)
+
+    def __iter__(self):
+        return iter(TOOLS)
+
+    def __len__(self):
+        return len(TOOLS)
+
+tools = Tools()
+
+@lru_cache(maxsize=None)
+def memory():
+    from src.memory.store import MemoryStore
+    import src.evals.analytics  # registers its checkpoint as a compaction hook
+    return MemoryStore()
+
+@lru_cache(maxsize=None)
+def graph():
+    """The planner graph compiled over the shared tools (LangGraph is imported here, on first use)."""
+    from src.agents.planner_graph import build_graph
+    return build_graph(tools)
+
+def preload(names=("catalog", "kb")):
+    """Build `names` now rather than on first use (the prefork master does this before forking workers)."""
+    for name in names:
+        tool(name)
+    if "catalog" in names:
+        tool("catalog").index  # maps the catalog snapshot
@@ -0,0 +1,67 @@
+"""Keyword intent routing shared by the Orchestrator and the LangGraph planner.
+
+Every intent's keywords are compiled into one alternation, so a message is lowered once
+and scanned once however many keywords there are. Each search resumes one character after
+the previous hit, so overlapping keywords are all found. Keywords match as substrings, like
+the `in` checks they replace. When several intents match, the one listed first in INTENTS
+wins; the rest are kept in `ranked`.
+"""
+import re
+from bisect import bisect_right
+from dataclasses import dataclass, field
+
+INTENTS = [  # priority order
+    ("marketing", ("lounge", "recommend", "bundle")),
+    ("sales", ("price", "quote", "units", "by end of")),
+    ("support", ("order", "delayed", "cancel", "return")),
+]
+DEFAULT = "kb"
+_PRIORITY = {name: i for i, (name, _) in enumerate(INTENTS)}
+_INTENT_OF = {k: name for name, kws in reversed(INTENTS) for k in kws}
+# no capture groups: a bare literal alternation is what sre scans fastest. Where keywords
+# start at the same position, the higher-priority intent's is tried first.
+_PATTERN = re.compile("|".join(re.escape(k) for k in sorted(_INTENT_OF, key=lambda k: (_PRIORITY[_INTENT_OF[k]], -len(k)))))
+
+@dataclass
+class Route:
+    intent: str
+    ranked: list[str] = field(default_factory=list)  # every matched intent, best first
+    evidence: dict[str, list[str]] = field(default_factory=dict)  # intent -> keywords matched, in message order
+
+def _route(evidence: dict[str, list[str]]) -> Route:
+    ranked = sorted(evidence, key=_PRIORITY.__getitem__)
+    return Route(ranked[0] if ranked else DEFAULT, ranked, evidence)
+
+def _hits(text: str):
+    search = _PATTERN.search
+    m = search(text)
+    while m:
+        yield m.start(), m.group()
+        m = search(text, m.start() + 1)
+
+def route(message: str) -> Route:
+    evidence: dict[str, list[str]] = {}
+    for _, kw in _hits(message.lower()):
+        evidence.setdefault(_INTENT_OF[kw], []).append(kw)
+    return _route(evidence)
+
+def route_many(messages: list[str]) -> list[Route]:
+    """Route a batch with a single scan over all messages joined by a separator no keyword contains."""
+    lowered = [msg.lower() for msg in messages]  # lower first: lowering can change a string's length
+    starts, pos = [], 0
+    for msg in lowered:
+        starts.append(pos)
+        pos += len(msg) + 1
+    evidence: list[dict[str, list[str]]] = [{} for _ in messages]
+    for pos, kw in _hits("\0".join(lowered)):
+        evidence[bisect_right(starts, pos) - 1].setdefault(_INTENT_OF[kw], []).append(kw)
+    return [_route(e) for e in evidence]
+
+def classify(message: str) -> str:
+    """Just the winning intent: stops at the first hit of the top-priority intent."""
+    best = len(INTENTS)
+    for _, kw in _hits(message.lower()):
+        best = min(best, _PRIORITY[_INTENT_OF[kw]])
+        if best == 0:
+            break
+    return INTENTS[best][0] if best < len(INTENTS) else DEFAULT
@@ -0,0 +1,211 @@
+"""Streaming analytics over the interaction log.
+
+Every log segment is cut into byte ranges that end on line boundaries; a process pool
+parses the ranges and returns partial aggregates that are summed in the parent. The
+offsets reached are checkpointed together with the running totals, so a nightly run only
+parses what was appended since the last one. Snapshots only re-copy events, so once a
+checkpoint exists they are skipped. A run without one reads the gzip copies of compacted raw
+segments that compaction archives instead of the snapshot, which only keeps each user's last
+events; if any are gone (MEMORY_ARCHIVE off, or older than MEMORY_ARCHIVE_DAYS) it falls back to
+the snapshot and lists them in the report as `missing_segments`. Importing this module registers `checkpoint_before_compaction`
+as a memory compaction hook, so lines in the raw segments it removes are counted before they go.
+
+Aggregates are two counters, events and contained, keyed by (dimension, value):
+
+    ("total", "")  ("intent", "kb_answer")  ("tag", "lead_created")
+    ("user", "jamie")  ("channel", "web")  ("window", "2026-10-18")
+"""
+import csv, gzip, io, json, os, time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from src.memory.store import LOG_DIR, MEM_PATH, before_compaction, list_segments, segment_path
+
+CONTAINED_INTENTS = ("marketing_consult", "sales_assist", "cs_resolution")
+CHECKPOINT_PATH = Path(os.getenv("EVALS_CHECKPOINT", Path(__file__).parent / "checkpoint.json"))
+RANGE_BYTES = int(os.getenv("EVALS_RANGE_BYTES", str(16 * 1024 * 1024)))
+WINDOWS = {"hour": "%Y-%m-%dT%H:00", "day": "%Y-%m-%d", "month": "%Y-%m"}
+DIMENSIONS = ("total", "intent", "tag", "channel", "user", "window")
+
+def _window(ts, window: str) -> str:
+    if ts is None:
+        return "unknown"
+    return datetime.fromtimestamp(ts, timezone.utc).strftime(WINDOWS[window])
+
+def _complete_end(path: Path) -> int:
+    """Offset just past the last full line; a line still being written is left for next time."""
+    size = path.stat().st_size
+    with open(path, "rb") as f:
+        pos = size
+        while pos > 0:
+            step = min(pos, 64 * 1024)
+            f.seek(pos - step)
+            i = f.read(step).rfind(b"\n")
+            if i >= 0:
+                return pos - step + i + 1
+            pos -= step
+    return 0
+
+def plan_ranges(path: Path, start: int, end: int, range_bytes: int = RANGE_BYTES) -> list[tuple[str, int, int]]:
+    return [(str(path), lo, min(lo + range_bytes, end)) for lo in range(start, end, range_bytes)]
+
+def archived_segments(log_dir: Path, upto: int) -> tuple[list[Path], list[int]]:
+    """Archived copies of raw segments 1..upto (all folded into snapshot -upto), and the numbers with none."""
+    paths = [Path(log_dir) / "archive" / f"{seg:08d}.jsonl.gz" for seg in range(1, upto + 1)]
+    return [p for p in paths if p.exists()], [seg for seg, p in enumerate(paths, 1) if not p.exists()]
+
+def aggregate_range(task: tuple[str, int, int], window: str = "day") -> tuple[Counter, Counter, int]:
+    """Aggregate the lines that start in [lo, hi); a line straddling hi belongs to this range.
+    A gzip archive is always one range, read to the end."""
+    path, lo, hi = task
+    events, contained, bad = Counter(), Counter(), 0
+    windows = {}  # hour -> window label; every supported window is a whole number of UTC hours
+    whole = path.endswith(".gz")
+    with (gzip.open if whole else open)(path, "rb") as f:
+        if lo:
+            f.seek(lo - 1)
+            if f.read(1) != b"\n":
+                f.readline()  # finish the line the previous range owns
+        pos = f.tell()
+        while whole or pos < hi:
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                break
+            pos += len(line)
+            try:
+                ev = json.loads(line)
+            except ValueError:
+                bad += 1
+                continue
+            keys = [("total", ""), ("intent", ev.get("intent") or "unknown"), ("channel", ev.get("channel") or "unknown"),
+                    ("user", ev.get("user_id") or "unknown")]
+            ts = ev.get("ts")
+            hour = None if ts is None else int(ts // 3600)
+            if hour not in windows:
+                windows[hour] = ("window", _window(None if ts is None else hour * 3600, window))
+            keys.append(windows[hour])
+            keys += [("tag", t) for t in ev.get("tags") or ()]
+            events.update(keys)
+            if ev.get("intent") in CONTAINED_INTENTS:
+                contained.update(keys)
+    return events, contained, bad
+
+class Analytics:
+    """Running aggregates plus the per-segment offsets they cover."""
+    def __init__(self, window: str = "day"):
+        if window not in WINDOWS:
+            raise ValueError(f"window must be one of {sorted(WINDOWS)}, got {window!r}")
+        self.window = window
+        self.events, self.contained = Counter(), Counter()
+        self.offsets: dict[int, int] = {}  # raw segment -> bytes processed
+        self.bad_lines = 0
+        self.log_dir: str | None = None  # the log the offsets refer to
+        self.missing: list[int] = []  # compacted raw segments counted from a snapshot, for want of an archive
+
+    @classmethod
+    def load(cls, path: Path = CHECKPOINT_PATH, window: str = "day") -> "Analytics":
+        """Resume from a checkpoint written with the same window; otherwise start from scratch."""
+        state = cls(window)
+        if path.exists():
+            with open(path) as f:
+                d = json.load(f)
+            if d.get("window") == window:
+                state.offsets = {int(k): v for k, v in d["offsets"].items()}
+                state.events = Counter({tuple(k): n for k, n in d["events"]})
+                state.contained = Counter({tuple(k): n for k, n in d["contained"]})
+                state.bad_lines = d.get("bad_lines", 0)
+                state.log_dir = d.get("log_dir")
+                state.missing = d.get("missing", [])
+        return state
+
+    def save(self, path: Path = CHECKPOINT_PATH):
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"window": self.window, "log_dir": self.log_dir, "offsets": self.offsets, "bad_lines": self.bad_lines,
+                       "missing": self.missing,
+                       "events": [[list(k), n] for k, n in self.events.items()],
+                       "contained": [[list(k), n] for k, n in self.contained.items()]}, f)
+        os.replace(tmp, path)
+
+    def _pending(self, log_dir: Path, legacy_path: Path | None, range_bytes: int):
+        """Byte ranges not yet aggregated, and the offsets reached once they are."""
+        tasks, reached = [], {}
+        for seg in list_segments(log_dir, legacy_path):
+            path = segment_path(seg, log_dir, legacy_path)
+            if seg < 0 and self.offsets:
+                continue  # snapshots re-copy events from raw segments; only a first run counts them
+            if seg < 0:
+                archives, missing = archived_segments(log_dir, -seg)
+                if not missing:
+                    tasks += [(str(p), 0, p.stat().st_size) for p in archives]
+                    continue
+                self.missing = sorted(set(self.missing) | set(missing))
+            start = 0 if seg < 0 else self.offsets.get(seg, 0)
+            end = _complete_end(path)
+            tasks += plan_ranges(path, start, end, range_bytes)
+            if seg >= 0:
+                reached[seg] = end
+        return tasks, reached
+
+    def update(self, log_dir: Path = LOG_DIR, legacy_path: Path | None = MEM_PATH, workers: int | None = None,
+               range_bytes: int = RANGE_BYTES) -> dict:
+        """Fold everything appended since the last update into the aggregates; returns run stats."""
+        t0 = time.perf_counter()
+        tasks, reached = self._pending(Path(log_dir), legacy_path, range_bytes)
+        workers = workers or os.cpu_count() or 1
+        if len(tasks) > 1 and workers > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                parts = list(pool.map(aggregate_range, tasks, [self.window] * len(tasks)))
+        else:
+            parts = [aggregate_range(t, self.window) for t in tasks]
+        for events, contained, bad in parts:
+            self.events.update(events)
+            self.contained.update(contained)
+            self.bad_lines += bad
+        self.offsets.update(reached)
+        self.log_dir = str(Path(log_dir).resolve())
+        nbytes = sum(hi - lo for _, lo, hi in tasks)
+        return {"ranges": len(tasks), "bytes": nbytes, "events": sum(p[0][("total", "")] for p in parts),
+                "seconds": round(time.perf_counter() - t0, 3)}
+
+    def rows(self, dimensions=DIMENSIONS):
+        for dim in dimensions:
+            keys = sorted((k for k in self.events if k[0] == dim), key=lambda k: (-self.events[k], k[1]))
+            for k in keys:
+                n, c = self.events[k], self.contained[k]
+                yield {"dimension": dim, "key": k[1], "events": n, "contained": c,
+                       "containment_rate": round(c / n, 3) if n else 0.0}
+
+    def report(self, dimensions=DIMENSIONS) -> dict:
+        total, contained = self.events[("total", "")], self.contained[("total", "")]
+        out = {"sessions": total, "contained": contained,
+               "containment_rate": round(contained / total, 3) if total else 0.0, "window": self.window}
+        if self.missing:
+            out["missing_segments"] = self.missing
+        for row in self.rows([d for d in dimensions if d != "total"]):
+            out.setdefault(f"by_{row['dimension']}", {})[row["key"]] = \
+                {k: row[k] for k in ("events", "contained", "containment_rate")}
+        return out
+
+    def to_csv(self, dimensions=DIMENSIONS) -> str:
+        buf = io.StringIO()
+        w = csv.DictWriter(buf, fieldnames=["dimension", "key", "events", "contained", "containment_rate"])
+        w.writeheader()
+        w.writerows(self.rows(dimensions))
+        return buf.getvalue()
+
+@before_compaction
+def checkpoint_before_compaction(log_dir: Path, legacy_path: Path | None, path: Path = CHECKPOINT_PATH) -> dict | None:
+    """Bring an existing checkpoint for this log up to date; MemoryStore.compact calls it
+    before removing raw segments. Runs in-process, no pool."""
+    if not path.exists():
+        return None
+    with open(path) as f:
+        window = json.load(f).get("window", "day")
+    state = Analytics.load(path, window)
+    if Path(state.log_dir or LOG_DIR).resolve() != Path(log_dir).resolve():
+        return None  # the checkpoint follows another log
+    stats = state.update(log_dir, legacy_path, workers=1)
+    state.save(path)
+    return stats
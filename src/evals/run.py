@@ -1,15 +1,32 @@
+import argparse, json, sys
 from pathlib import Path
-import json
-def run():
-    mem = Path(__file__).parent.parent / "memory" / "interactions.jsonl"
-    total = 0; contained = 0
-    if mem.exists():
-        for line in open(mem):
-            total += 1
-            ev = json.loads(line)
-            if ev.get("intent") in ("marketing_consult","sales_assist","cs_resolution"):
-                contained += 1
-    rate = (contained / total) if total else 0.0
-    print({"sessions": total, "contained": contained, "containment_rate": round(rate,3)})
+from src.evals.analytics import CHECKPOINT_PATH, DIMENSIONS, WINDOWS, Analytics
+
+def run(full: bool = False, window: str = "day", fmt: str = "json", out: str | None = None,
+        workers: int | None = None, checkpoint: Path = CHECKPOINT_PATH, dimensions=DIMENSIONS) -> dict:
+    state = Analytics(window) if full else Analytics.load(checkpoint, window)
+    stats = state.update(workers=workers)
+    state.save(checkpoint)
+    report = state.report(dimensions)
+    text = state.to_csv(dimensions) if fmt == "csv" else json.dumps(report, indent=2)
+    if out:
+        Path(out).write_text(text)
+    else:
+        sys.stdout.write(text + ("" if text.endswith("\n") else "\n"))
+    print(f"processed {stats}", file=sys.stderr)
+    if state.missing:
+        print(f"WARNING: raw segments {state.missing} were compacted and their archives are gone; their events were "
+              f"counted from the snapshot, which keeps only each user's last events, so these totals are low",
+              file=sys.stderr)
+    return report
+
 if __name__ == "__main__":
-    run()
+    ap = argparse.ArgumentParser(description="Containment, intent and tag metrics over the interaction log.")
+    ap.add_argument("--full", action="store_true", help="ignore the checkpoint and re-read every segment")
+    ap.add_argument("--window", choices=sorted(WINDOWS), default="day")
+    ap.add_argument("--format", choices=["json", "csv"], default="json")
+    ap.add_argument("--out", help="write the report here instead of stdout")
+    ap.add_argument("--workers", type=int, help="parser processes (default: one per CPU)")
+    ap.add_argument("--by", default=",".join(DIMENSIONS), help="dimensions to report, comma separated")
+    args = ap.parse_args()
+    run(args.full, args.window, args.format, args.out, args.workers, dimensions=args.by.split(","))
@@ -1,8 +1,507 @@
-import json
+import atexit, contextlib, gzip, json, os, re, sqlite3, threading, time
+from collections import Counter
 from pathlib import Path
-MEM_PATH = Path(__file__).parent / "interactions.jsonl"
+from src.observability.metrics import timed
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+MEM_DIR = Path(__file__).parent
+MEM_PATH = MEM_DIR / "interactions.jsonl"  # pre-segmentation log, read as segment 0
+LOG_DIR = Path(os.getenv("MEMORY_LOG_DIR", MEM_DIR / "log"))
+INDEX_PATH = Path(os.getenv("MEMORY_INDEX_PATH", MEM_DIR / "memory.db"))
+PROFILES_PATH = MEM_DIR / "profiles.json"
+HISTORY_N = int(os.getenv("MEMORY_HISTORY_N", "20"))
+# Appends are queued and written by a background thread in batches (group commit).
+BUFFERED = os.getenv("MEMORY_BUFFERED", "true").lower() == "true"
+BATCH_SIZE = int(os.getenv("MEMORY_BATCH_SIZE", "256"))
+FLUSH_MS = float(os.getenv("MEMORY_FLUSH_MS", "50"))
+# none:  batch handed to the OS, index commits unsynced (synchronous=OFF)
+# flush: batch handed to the OS, index WAL synced at checkpoints (synchronous=NORMAL)
+# fsync: log fsync'd and index synced (synchronous=FULL) before the batch counts as written
+DURABILITY = os.getenv("MEMORY_DURABILITY", "flush")
+_SYNCHRONOUS = {"none": "OFF", "flush": "NORMAL", "fsync": "FULL"}
+# The log is a directory of segments; the highest-numbered one takes appends and is sealed
+# once it passes SEGMENT_BYTES or SEGMENT_SECS. Compaction folds sealed segments into a
+# snapshot holding each live user's last COMPACT_KEEP events and, with ARCHIVE on (the
+# default), keeps a gzip copy of the raw segments (minus cleared users) for ARCHIVE_DAYS.
+# The pre-segmentation interactions.jsonl is read-only: it is never compacted or removed.
+SEGMENT_BYTES = int(os.getenv("MEMORY_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+SEGMENT_SECS = float(os.getenv("MEMORY_SEGMENT_SECS", "86400"))
+COMPACT_SEGMENTS = int(os.getenv("MEMORY_COMPACT_SEGMENTS", "4"))
+COMPACT_KEEP = int(os.getenv("MEMORY_COMPACT_KEEP", "100"))
+ARCHIVE = os.getenv("MEMORY_ARCHIVE", "true").lower() == "true"
+ARCHIVE_DAYS = float(os.getenv("MEMORY_ARCHIVE_DAYS", "90"))
+_SEGMENT_RE = re.compile(r"(\d{8})(\.snapshot)?\.jsonl")
+_compaction_hooks: list = []  # see before_compaction()
+
+# The segments stay the source of truth; memory.db indexes them by user so profile reads
+# touch only that user's last N lines instead of scanning the log. events.seg is the
+# segment number, negated for snapshot segments.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (seq INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL,
+                                   offset INTEGER NOT NULL, length INTEGER NOT NULL, seg INTEGER NOT NULL DEFAULT 0);
+CREATE INDEX IF NOT EXISTS events_by_user ON events (user_id, seq);
+CREATE TABLE IF NOT EXISTS counts (user_id TEXT PRIMARY KEY, n INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS traits (user_id TEXT PRIMARY KEY, traits TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS cleared (user_id TEXT PRIMARY KEY, upto INTEGER NOT NULL, seg INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+MIGRATIONS = [  # index rows and clear watermarks written before segmentation refer to segment 0
+    "ALTER TABLE events ADD COLUMN seg INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE cleared ADD COLUMN seg INTEGER NOT NULL DEFAULT 0",
+]
+
+def list_segments(log_dir: Path = LOG_DIR, legacy_path: Path | None = MEM_PATH) -> list[int]:
+    """Segment numbers on disk, oldest first (snapshots negated, sorted before the raw segment they end at)."""
+    segs = [0] if legacy_path and Path(legacy_path).exists() else []
+    for name in os.listdir(log_dir) if Path(log_dir).is_dir() else ():
+        m = _SEGMENT_RE.fullmatch(name)
+        if m:
+            segs.append(-int(m[1]) if m[2] else int(m[1]))
+    return sorted(segs, key=lambda s: (abs(s), s >= 0))
+
+def segment_path(seg: int, log_dir: Path = LOG_DIR, legacy_path: Path | None = MEM_PATH) -> Path:
+    if seg == 0 and legacy_path:
+        return Path(legacy_path)
+    return Path(log_dir) / (f"{-seg:08d}.snapshot.jsonl" if seg < 0 else f"{seg:08d}.jsonl")
+
+def before_compaction(fn):
+    """Register fn(log_dir, legacy_path) to run before each compaction removes raw segments; returns fn."""
+    if fn not in _compaction_hooks:
+        _compaction_hooks.append(fn)
+    return fn
+
+def log_paths(log_dir: Path = LOG_DIR, legacy_path: Path | None = MEM_PATH) -> list[Path]:
+    """Every segment of the interaction log, oldest first."""
+    return [segment_path(s, log_dir, legacy_path) for s in list_segments(log_dir, legacy_path)]
+
 class MemoryStore:
+    def __init__(self, log_dir: Path = LOG_DIR, index_path: Path = INDEX_PATH, *, legacy_path: Path | None = MEM_PATH,
+                 buffered: bool = BUFFERED, durability: str = DURABILITY, batch_size: int = BATCH_SIZE,
+                 flush_ms: float = FLUSH_MS, segment_bytes: int = SEGMENT_BYTES, segment_secs: float = SEGMENT_SECS):
+        if durability not in _SYNCHRONOUS:
+            raise ValueError(f"durability must be one of {sorted(_SYNCHRONOUS)}, got {durability!r}")
+        self.log_dir = Path(log_dir)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.legacy_path = Path(legacy_path) if legacy_path else None
+        self.buffered, self.durability = buffered, durability
+        self.batch_size, self.flush_interval = batch_size, flush_ms / 1000
+        self.segment_bytes, self.segment_secs = segment_bytes, segment_secs
+        self.index_path = index_path
+        self._connect()
+        self._db.executescript(SCHEMA)
+        self._migrate()
+        with self._lock, self._log_lock():
+            self._import_profiles()
+            self._catch_up()
+        atexit.register(self.close)
+
+    # --- segments ----------------------------------------------------------------
+
+    def _seg_path(self, seg: int) -> Path:
+        return segment_path(seg, self.log_dir, self.legacy_path)
+
+    def segments(self) -> list[int]:
+        return list_segments(self.log_dir, self.legacy_path)
+
+    def _active(self) -> int:
+        segs = self.segments()
+        raw = [s for s in segs if s > 0]
+        return raw[-1] if raw else max((-s for s in segs if s < 0), default=0) + 1
+
+    def _live(self, cleared: dict, user_id: str, seg: int, offset: int) -> bool:
+        """False for lines written before `user_id` was last cleared."""
+        mark = cleared.get(user_id)
+        if mark is None:
+            return True
+        if seg < 0:  # snapshot -N was compacted after raw segment N was sealed, i.e. after any clear inside it
+            return mark[0] <= -seg
+        return (seg, offset) >= mark
+
+    def _cleared(self) -> dict:
+        return {u: (seg, upto) for u, upto, seg in self._db.execute("SELECT user_id, upto, seg FROM cleared")}
+
+    def _segment_started(self, seg: int) -> float | None:
+        if seg not in self._started:
+            with open(self._seg_path(seg), "rb") as f:
+                first = f.readline()
+            if not first.endswith(b"\n"):
+                return None
+            self._started[seg] = json.loads(first).get("ts") or os.stat(self._seg_path(seg)).st_mtime
+        return self._started[seg]
+
+    def _append_target(self, incoming: int) -> int:
+        """Active segment for the next write, rotating to a fresh one when it is full or old."""
+        seg = self._active()
+        path = self._seg_path(seg)
+        size = path.stat().st_size if path.exists() else 0
+        started = self._segment_started(seg) if size else None
+        if size and (size + incoming > self.segment_bytes or (started and time.time() - started > self.segment_secs)):
+            seg += 1
+        if self._log_seg != seg:
+            if self._log_f is not None:
+                self._log_f.close()
+            self._log_f, self._log_seg = open(self._seg_path(seg), "ab", buffering=0), seg
+        return seg
+
+    # --- log + index plumbing ------------------------------------------------
+
+    @contextlib.contextmanager
+    def _log_lock(self):
+        """Exclusive cross-process lock on the log while appending, indexing or compacting."""
+        with open(self.log_dir / ".lock", "w") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield  # closing the file releases the flock
+
+    def _meta(self, key: str, default=None):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, **values):
+        self._db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [(k, str(v)) for k, v in values.items()])
+
+    def _migrate(self):
+        cols = {r[1] for r in self._db.execute("PRAGMA table_info(events)")}
+        if "seg" not in cols:
+            with self._db:
+                for stmt in MIGRATIONS:
+                    self._db.execute(stmt)
+                self._db.execute("DELETE FROM meta WHERE key = 'log_inode'")
+                self._set_meta(indexed_seg=0)
+        self._db.execute("CREATE INDEX IF NOT EXISTS events_by_seg ON events (seg)")
+
+    def _import_profiles(self):
+        """Seed traits once from the hand-maintained profiles.json."""
+        if self._meta("profiles_imported") or not PROFILES_PATH.exists():
+            return
+        with open(PROFILES_PATH) as f:
+            profiles = json.load(f)
+        with self._db:
+            self._db.executemany("INSERT OR IGNORE INTO traits VALUES (?, ?)",
+                                 [(u, json.dumps(p.get("traits", {}))) for u, p in profiles.items()])
+            self._set_meta(profiles_imported=1)
+
+    def _catch_up(self):
+        """Index lines appended since the last indexed position (by us, another process or an old writer)."""
+        fresh = self._meta("indexed_seg") is None  # new index: snapshots need indexing too
+        pos = (int(self._meta("indexed_seg", 0)), int(self._meta("indexed_offset", 0)))
+        cleared = self._cleared()
+        rows, end = [], pos
+        for seg in self.segments():
+            if seg < 0 and not fresh or 0 <= seg < pos[0]:
+                continue
+            offset = pos[1] if seg == pos[0] else 0
+            with open(self._seg_path(seg), "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # partial write in progress; pick it up next time
+                    user_id = json.loads(line).get("user_id")
+                    if user_id is not None and self._live(cleared, user_id, seg, offset):
+                        rows.append((user_id, seg, offset, len(line)))
+                    offset += len(line)
+            if seg >= 0:
+                end = (seg, offset)
+        if rows or end != pos or fresh:
+            with self._db:
+                self._index(rows, end)
+
+    def _index(self, rows: list, end: tuple[int, int]):
+        self._db.executemany("INSERT INTO events (user_id, seg, offset, length) VALUES (?, ?, ?, ?)", rows)
+        self._db.executemany("INSERT INTO counts VALUES (?, ?) ON CONFLICT(user_id) DO UPDATE SET n = n + excluded.n",
+                             Counter(r[0] for r in rows).items())
+        self._set_meta(indexed_seg=end[0], indexed_offset=end[1])
+
+    def _refresh(self):
+        if self._meta("compactions", "0") != self._compactions:  # another process swapped segments out
+            self._compactions = self._meta("compactions", "0")
+            self._forget_fds()
+        seg = [s for s in self.segments() if s >= 0][-1:] or [self._active()]
+        path = self._seg_path(seg[0])
+        size = path.stat().st_size if path.exists() else 0
+        if (seg[0], size) != (int(self._meta("indexed_seg", 0)), int(self._meta("indexed_offset", 0))):
+            with self._log_lock():
+                self._catch_up()
+
+    def _fd(self, seg: int) -> int:
+        if seg not in self._fds:
+            self._fds[seg] = os.open(self._seg_path(seg), os.O_RDONLY)
+        return self._fds[seg]
+
+    def _read(self, seg: int, offset: int, length: int) -> dict:
+        return json.loads(os.pread(self._fd(seg), length, offset))
+
+    def _forget_fds(self):
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+
+    # --- group-commit writer -----------------------------------------------------
+
+    def _connect(self):
+        """(Re)open per-process state: the index connection, file handles and the writer queue."""
+        self._db = sqlite3.connect(self.index_path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(f"PRAGMA synchronous={_SYNCHRONOUS[self.durability]}")
+        self._lock = threading.RLock()
+        self._fds: dict[int, int] = {}
+        self._compactions = None
+        self._started: dict[int, float] = {}
+        self._log_f, self._log_seg = None, None
+        self._pid = os.getpid()
+        self._pending: list[tuple[str, bytes]] = []
+        self._cond = threading.Condition()
+        self._writer: threading.Thread | None = None
+        self._compactor: threading.Thread | None = None
+        self._closed = False
+        self._next_compact_check = 0.0
+        self.batches = self.written = 0
+
+    def _write_batch(self, batch: list[tuple[str, bytes]]):
+        """Append a batch with one write (and at most one fsync), then index it in one transaction."""
+        data = b"".join(line for _, line in batch)
+        with self._lock, self._log_lock():
+            self._catch_up()
+            seg = self._append_target(len(data))
+            offset = self._log_f.seek(0, os.SEEK_END)
+            rows = []
+            for user_id, line in batch:
+                rows.append((user_id, seg, offset, len(line)))
+                offset += len(line)
+            self._log_f.write(data)
+            if self.durability == "fsync":
+                os.fsync(self._log_f.fileno())
+            with self._db:
+                self._index(rows, (seg, offset))
+            self.batches += 1
+            self.written += len(batch)
+
+    def _run_writer(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.batch_size and not self._closed:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        break
+                    self._cond.wait(left)  # let a partial batch fill up
+                if self._closed and not self._pending:
+                    return
+            self.flush()
+            if time.monotonic() >= self._next_compact_check:  # off the request path, and off this thread
+                self._next_compact_check = time.monotonic() + 60
+                if self._compactor is None or not self._compactor.is_alive():
+                    self._compactor = threading.Thread(target=self.compact, kwargs={"min_segments": COMPACT_SEGMENTS},
+                                                       name="memory-compact", daemon=True)
+                    self._compactor.start()
+
+    def _check_fork(self):
+        if os.getpid() != self._pid:  # a forked child must not reuse the parent's connection or queue
+            self._connect()
+
+    def flush(self):
+        """Write everything queued so far, on the calling thread."""
+        self._check_fork()
+        with self._lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+                self._cond.notify_all()
+            if batch:
+                self._write_batch(batch)
+
+    def close(self):
+        """Drain the queue and stop the writer; called automatically at interpreter exit."""
+        if os.getpid() != self._pid:
+            return
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._writer is not None and self._writer.is_alive():
+            self._writer.join()
+        if self._compactor is not None and self._compactor.is_alive():
+            self._compactor.join()
+        self.flush()
+        if self._log_f is not None:
+            self._log_f.close()
+            self._log_f, self._log_seg = None, None
+        self._forget_fds()
+
+    # --- compaction ----------------------------------------------------------------
+
+    @contextlib.contextmanager
+    def _compact_lock(self):
+        """Exclusive cross-process lock held for a whole compaction; appends only need the log lock."""
+        with open(self.log_dir / ".compact.lock", "w") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    @timed("memory.compact")
+    def compact(self, min_segments: int = 1, keep: int = COMPACT_KEEP, archive: bool = ARCHIVE) -> dict | None:
+        """Fold sealed segments into one snapshot of each live user's last `keep` events.
+
+        Cleared users are already gone from the index, so they are left out of the snapshot
+        (and of the archive). The legacy segment 0 is left as it is. Returns stats, or None
+        when fewer than `min_segments` are sealed or a profile was cleared meanwhile.
+
+        Sealed segments don't change, so the snapshot and archive are written without the
+        log lock; it is only taken to pick the rows and to swap the files in, and appends
+        go on in between.
+        """
+        self._check_fork()
+        with self._compact_lock():
+            with self._lock, self._log_lock():
+                self._catch_up()
+                active = self._active()
+                sealed = [s for s in self.segments() if s < active and s != 0]
+                if len([s for s in sealed if s > 0]) < min_segments or not sealed:
+                    return None
+                cleared = self._cleared()
+                before = sum(self._seg_path(s).stat().st_size for s in sealed)
+                rows = self._db.execute(
+                    """SELECT seq, seg, offset, length FROM (
+                           SELECT seq, seg, offset, length,
+                                  ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY seq DESC) AS rn
+                           FROM events WHERE seg < ? AND seg != 0)
+                       WHERE rn <= ? ORDER BY seq""", (active, keep)).fetchall()
+            t0 = time.perf_counter()
+            for hook in _compaction_hooks:  # e.g. incremental analytics, which skip snapshots
+                hook(self.log_dir, self.legacy_path)
+            target = -max(abs(s) for s in sealed)
+            staged = [(self._seg_path(target).with_suffix(".tmp"), self._seg_path(target))]
+            moved, offset = [], 0
+            fds = {seg: os.open(self._seg_path(seg), os.O_RDONLY) for seg in sealed}
+            try:
+                with open(staged[0][0], "wb") as out:
+                    for seq, seg, off, n in rows:
+                        out.write(os.pread(fds[seg], n, off))
+                        moved.append((target, offset, seq))
+                        offset += n
+                    out.flush()
+                    os.fsync(out.fileno())
+            finally:
+                for fd in fds.values():
+                    os.close(fd)
+            if archive:
+                staged += self._archive([s for s in sealed if s > 0], cleared)
+            with self._lock, self._log_lock():
+                if self._cleared() != cleared:  # the snapshot may hold lines of a user cleared since; retry later
+                    for tmp, _ in staged:
+                        tmp.unlink(missing_ok=True)
+                    return None
+                for tmp, dst in staged:
+                    os.replace(tmp, dst)
+                with self._db:
+                    self._db.executemany("UPDATE events SET seg = ?, offset = ? WHERE seq = ?", moved)
+                    gone = self._db.execute("SELECT user_id, COUNT(*) FROM events WHERE seg < ? AND seg NOT IN (?, 0) GROUP BY user_id",
+                                            (active, target)).fetchall()
+                    self._db.executemany("UPDATE counts SET n = n - ? WHERE user_id = ?", [(n, u) for u, n in gone])
+                    self._db.execute("DELETE FROM events WHERE seg < ? AND seg NOT IN (?, 0)", (active, target))
+                    self._set_meta(compactions=int(self._meta("compactions", 0)) + 1)
+                self._compactions = self._meta("compactions")
+                self._forget_fds()
+                for seg in sealed:
+                    if seg != target:
+                        self._seg_path(seg).unlink(missing_ok=True)
+            self._prune_archive()
+            return {"segments": len(sealed), "kept": len(moved), "dropped": sum(n for _, n in gone),
+                    "bytes_before": before, "bytes_after": offset, "seconds": round(time.perf_counter() - t0, 3)}
+
+    def _archive(self, raw: list[int], cleared: dict) -> list[tuple[Path, Path]]:
+        """gzip copies of `raw` minus cleared users' lines, as (temp path, final path) pairs to move into place."""
+        (self.log_dir / "archive").mkdir(exist_ok=True)
+        staged = []
+        for seg in raw:
+            dst = self.log_dir / "archive" / f"{seg:08d}.jsonl.gz"
+            with open(self._seg_path(seg), "rb") as src, gzip.open(dst.with_suffix(".tmp"), "wb") as out:
+                offset = 0
+                for line in src:
+                    user_id = json.loads(line).get("user_id")
+                    if self._live(cleared, user_id, seg, offset):
+                        out.write(line)
+                    offset += len(line)
+            staged.append((dst.with_suffix(".tmp"), dst))
+        return staged
+
+    def _prune_archive(self):
+        cutoff = time.time() - ARCHIVE_DAYS * 86400
+        for path in (self.log_dir / "archive").glob("*.jsonl.gz"):
+            if path.stat().st_mtime < cutoff:
+                path.unlink(missing_ok=True)
+
+    # --- public API ------------------------------------------------------------
+
+    @timed("memory.add_interaction")
     def add_interaction(self, user_id: str, event: dict):
-        rec = {"user_id": user_id, **event}
-        with open(MEM_PATH, "a") as f:
-            f.write(json.dumps(rec) + "\n")
+        rec = {"user_id": user_id, "ts": round(time.time(), 3), **event}
+        line = (json.dumps(rec) + "\n").encode()
+        self._check_fork()
+        if not self.buffered:
+            self._write_batch([(user_id, line)])
+            return
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MemoryStore is closed")
+            self._pending.append((user_id, line))
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run_writer, name="memory-writer", daemon=True)
+                self._writer.start()
+            backlog = len(self._pending)
+            if backlog == 1 or backlog >= self.batch_size:
+                self._cond.notify_all()
+        if backlog >= 8 * self.batch_size:  # writer is falling behind: apply backpressure
+            self.flush()
+
+    @timed("memory.history")
+    def history(self, user_id: str, limit: int = HISTORY_N, before: int | None = None) -> dict:
+        """One page of a user's events, newest last; pass the returned `before` to get the previous page."""
+        with self._lock:
+            self.flush()  # read-your-writes
+            for attempt in range(2):
+                self._refresh()
+                rows = self._db.execute(
+                    "SELECT seq, seg, offset, length FROM events WHERE user_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+                    (user_id, before if before is not None else 2**63 - 1, limit)).fetchall()
+                try:
+                    events = [self._read(seg, off, n) for _, seg, off, n in reversed(rows)]
+                    break
+                except FileNotFoundError:  # another process compacted between the query and the read
+                    if attempt:
+                        raise
+        return {"events": events, "before": rows[-1][0] if rows and len(rows) == limit else None}
+
+    @timed("memory.get_profile")
+    def get_profile(self, user_id: str, last_n: int = HISTORY_N) -> dict:
+        self._check_fork()
+        with self._lock:
+            row = self._db.execute("SELECT traits FROM traits WHERE user_id = ?", (user_id,)).fetchone()
+            page = self.history(user_id, limit=last_n)
+            total = self._db.execute("SELECT n FROM counts WHERE user_id = ?", (user_id,)).fetchone()
+        return {"traits": json.loads(row[0]) if row else {}, "history": page["events"], "history_total": total[0] if total else 0}
+
+    @timed("memory.update_traits")
+    def update_traits(self, user_id: str, traits: dict):
+        self._check_fork()
+        with self._lock, self._db:
+            row = self._db.execute("SELECT traits FROM traits WHERE user_id = ?", (user_id,)).fetchone()
+            merged = {**(json.loads(row[0]) if row else {}), **traits}
+            self._db.execute("INSERT OR REPLACE INTO traits VALUES (?, ?)", (user_id, json.dumps(merged)))
+
+    @timed("memory.clear_profile")
+    def clear_profile(self, user_id: str):
+        """Forget a user's traits and history; their old log lines are never re-indexed and compaction drops them."""
+        self.flush()
+        with self._lock, self._log_lock():
+            self._catch_up()
+            seg = self._active()
+            path = self._seg_path(seg)
+            with self._db:
+                self._db.execute("DELETE FROM traits WHERE user_id = ?", (user_id,))
+                self._db.execute("DELETE FROM events WHERE user_id = ?", (user_id,))
+                self._db.execute("DELETE FROM counts WHERE user_id = ?", (user_id,))
+                self._db.execute("INSERT OR REPLACE INTO cleared (user_id, upto, seg) VALUES (?, ?, ?)",
+                                 (user_id, path.stat().st_size if path.exists() else 0, seg))
@@ -0,0 +1,163 @@
+"""Per-operation latency histograms and counters, rendered in Prometheus text format.
+
+    with timed("route"): ...            # or @timed("memory.add_interaction")
+
+records `nestwell_operation_seconds{op="route"}` (a fixed-bucket histogram) and, when the
+block raises, `nestwell_operation_errors_total{op="route"}`. An observation is a
+perf_counter pair and a few list increments under one lock, cheap enough to leave on.
+
+Inside `profiled()` every timed operation is also appended to a per-request profile
+(the FastAPI app turns this on for requests carrying an `X-Profile` header).
+
+Counts are per process; under several workers each serves its own /metrics.
+    METRICS=false    turn recording off
+"""
+import bisect, contextlib, contextvars, functools, os, threading, time
+
+ENABLED = os.getenv("METRICS", "true").lower() == "true"
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_profile: contextvars.ContextVar = contextvars.ContextVar("profile", default=None)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels: tuple) -> str:
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+
+def _series(name: str, labels: str) -> str:
+    return f"{name}{{{labels}}}" if labels else name
+
+class Registry:
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self._hist: dict[tuple, list] = {}     # (name, labels) -> [bucket counts..., sum, count]
+        self._counters: dict[tuple, float] = {}
+        self._help: dict[str, tuple[str, str]] = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, kind: str, text: str):
+        self._help[name] = (kind, text)
+
+    def observe(self, name: str, seconds: float, **labels):
+        self.observe_key((name, tuple(sorted(labels.items()))), seconds)
+
+    def observe_key(self, key: tuple, seconds: float):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            h = self._hist.get(key)
+            if h is None:
+                h = self._hist[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                h[i] += 1
+            h[-2] += seconds
+            h[-1] += 1
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def collector(self, fn):
+        """Register `fn() -> [(name, labels dict or None, value), ...]`, sampled as gauges on every render."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        with self._lock:
+            hist = {k: list(v) for k, v in self._hist.items()}
+            counters = dict(self._counters)
+        out, seen = [], set()
+
+        def header(name, kind):
+            if name not in seen:
+                seen.add(name)
+                out.append(f"# HELP {name} {self._help.get(name, (kind, name))[1]}")
+                out.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), h in sorted(hist.items()):
+            header(name, "histogram")
+            lbl, cum = _labels(labels), 0
+            for le, n in zip(self.buckets, h):
+                cum += n
+                out.append(f'{name}_bucket{{{lbl}{"," if lbl else ""}le="{le}"}} {cum}')
+            out.append(f'{name}_bucket{{{lbl}{"," if lbl else ""}le="+Inf"}} {h[-1]}')
+            out.append(f"{_series(name + '_sum', lbl)} {h[-2]:.6f}")
+            out.append(f"{_series(name + '_count', lbl)} {h[-1]}")
+        for (name, labels), v in sorted(counters.items()):
+            header(name, "counter")
+            out.append(f"{_series(name, _labels(labels))} {v:g}")
+        for fn in self._collectors:
+            try:
+                samples = fn()
+            except Exception:
+                continue
+            for name, labels, v in sorted(samples, key=lambda sample: (sample[0], str(sample[1]))):
+                if v is None:
+                    continue
+                header(name, "gauge")
+                out.append(f"{_series(name, _labels(tuple(sorted((labels or {}).items()))))} {v:g}")
+        return "\n".join(out) + "\n"
+
+registry = Registry()
+registry.describe("nestwell_operation_seconds", "histogram", "Latency of instrumented operations")
+registry.describe("nestwell_operation_errors_total", "counter", "Instrumented operations that raised")
+
+class timed:
+    """Time a block or function into nestwell_operation_seconds{op=..., **labels}."""
+    def __init__(self, op: str, **labels):
+        self.op = op
+        self.key = ("nestwell_operation_seconds", tuple(sorted({"op": op, **labels}.items())))
+
+    def record(self, took: float, failed: bool):
+        if not ENABLED:
+            return
+        registry.observe_key(self.key, took)
+        if failed:
+            registry.inc("nestwell_operation_errors_total", **dict(self.key[1]))
+        profile = _profile.get()
+        if profile is not None:
+            profile.append((self.op, took))
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.record(time.perf_counter() - self._t0, exc_type is not None)
+        return False
+
+    def __call__(self, fn):
+        # the start time lives in the call frame: one decorated function can run on many threads at once
+        @functools.wraps(fn)
+        def call(*args, **kwargs):
+            t0, failed = time.perf_counter(), True
+            try:
+                result = fn(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                self.record(time.perf_counter() - t0, failed)
+        return call
+
+@contextlib.contextmanager
+def profiled():
+    """Collect every timed operation in this context; yields the list of (op, seconds)."""
+    profile: list = []
+    token = _profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _profile.reset(token)
+
+def summarize(profile: list) -> list[dict]:
+    """Per-op count and total/max milliseconds, slowest total first."""
+    by_op: dict[str, list] = {}
+    for op, took in profile:
+        agg = by_op.setdefault(op, [0, 0.0, 0.0])
+        agg[0] += 1
+        agg[1] += took
+        agg[2] = max(agg[2], took)
+    return [{"op": op, "calls": n, "total_ms": round(total * 1000, 3), "max_ms": round(peak * 1000, 3)}
+            for op, (n, total, peak) in sorted(by_op.items(), key=lambda kv: -kv[1][1])]
@@ -1,18 +1,14 @@
-import os, contextlib, uuid
+import os
 from arize_phoenix import Client
+from src.observability import tracing
 PHOENIX_ENDPOINT = os.getenv("PHOENIX_COLLECTOR_ENDPOINT", "http://localhost:6006/v1/traces")
 PHOENIX_PROJECT = os.getenv("PHOENIX_PROJECT_NAME", "nestwell_demo")
 _client = Client(endpoint=PHOENIX_ENDPOINT, project_name=PHOENIX_PROJECT)
+if tracing.EXPORTER == "client":
+    tracing.tracer.exporter = tracing.ClientExporter(_client)
 
-@contextlib.contextmanager
-def traced(name: str, attributes: dict | None = None):
-    trace_id = str(uuid.uuid4())
-    span = _client.span(name=name, attributes=attributes or {}, trace_id=trace_id)
-    try:
-        yield span
-    finally:
-        span.end()
+# Spans are recorded in-process and exported in sampled batches by a background thread (see tracing.py)
+traced = tracing.span  # nests under the current span; only an outermost block starts a trace
 
 def child_span(parent_span, name: str, attributes: dict | None = None):
-    span = _client.span(name=name, attributes=attributes or {}, trace_id=parent_span.trace_id, parent_id=parent_span.span_id)
-    return span
+    return tracing.tracer.start_span(name, attributes, parent=parent_span)
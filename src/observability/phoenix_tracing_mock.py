@@ -1,4 +1,5 @@
-import os, contextlib, uuid
+import os, uuid
+from src.observability import tracing
 
 # Mock implementation for Phoenix tracing when the library is not available
 class MockSpan:
@@ -16,16 +17,11 @@ class MockClient:
         return MockSpan(name, attributes, trace_id)
 
 _client = MockClient()
+if tracing.EXPORTER == "client":
+    tracing.tracer.exporter = tracing.ClientExporter(_client)
 
-@contextlib.contextmanager
-def traced(name: str, attributes: dict | None = None):
-    trace_id = str(uuid.uuid4())
-    span = _client.span(name=name, attributes=attributes or {}, trace_id=trace_id)
-    try:
-        yield span
-    finally:
-        span.end()
+# Same recording, sampling and batching as the real client; only the export target differs
+traced = tracing.span  # nests under the current span; only an outermost block starts a trace
 
 def child_span(parent_span, name: str, attributes: dict | None = None):
-    span = _client.span(name=name, attributes=attributes or {}, trace_id=parent_span.trace_id, parent_id=parent_span.span_id)
-    return span
\ No newline at end of file
+    return tracing.tracer.start_span(name, attributes, parent=parent_span)
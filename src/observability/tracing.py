@@ -0,0 +1,273 @@
+"""Span recording with batched, sampled export off the request path.
+
+A `traced()` block opened with no span around it starts a trace; blocks opened inside it
+(on the same thread, in the same task, or in pool work submitted with `propagate()`) are
+its children. Unlike the original client wrapper, which started a new trace on every call,
+this nests: a request's `chat_session` span is the root and the orchestrator turn, tool and
+LLM spans are its descendants, all under one trace_id. Ending a span only appends it to the
+trace being assembled; a trace whose root hasn't ended TRACE_OPEN_SECS after its first span
+finished is dropped (counted as spans_evicted). When the root span ends the trace is kept or
+dropped in one decision:
+
+  head sampling   a fraction TRACE_SAMPLE_RATE of traces is picked when the root starts
+  tail sampling   any trace with an error, or whose root took TRACE_SLOW_MS or longer, is
+                  kept regardless (TRACE_TAIL=false: unpicked traces aren't recorded at all)
+
+Kept spans go into a bounded ring buffer (TRACE_BUFFER spans; the oldest are dropped and
+counted when export falls behind) that a background thread exports in batches of up to
+TRACE_BATCH every TRACE_EXPORT_MS.
+
+    TRACE_EXPORTER=client   replay spans through the Phoenix client (or the mock without it)
+    TRACE_EXPORTER=otlp     POST OTLP/JSON batches to PHOENIX_COLLECTOR_ENDPOINT
+                            (python -m scripts.trace_collector is a local stand-in)
+    TRACE_EXPORTER=none     record and sample, export nothing
+"""
+import atexit, contextlib, contextvars, functools, os, random, threading, time, uuid
+from collections import OrderedDict, deque
+from src.observability.metrics import timed
+
+SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TAIL = os.getenv("TRACE_TAIL", "true").lower() == "true"
+SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "2000"))
+BUFFER = int(os.getenv("TRACE_BUFFER", "8192"))
+BATCH = int(os.getenv("TRACE_BATCH", "512"))
+EXPORT_MS = float(os.getenv("TRACE_EXPORT_MS", "1000"))
+OPEN_SECS = float(os.getenv("TRACE_OPEN_SECS", "600"))
+EXPORTER = os.getenv("TRACE_EXPORTER", "client")
+ENDPOINT = os.getenv("PHOENIX_COLLECTOR_ENDPOINT", "http://localhost:6006/v1/traces")
+PROJECT = os.getenv("PHOENIX_PROJECT_NAME", "nestwell_demo")
+
+_current: contextvars.ContextVar = contextvars.ContextVar("span", default=None)
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start_ns", "end_ns", "status", "error",
+                 "sampled", "_tracer")
+
+    def __init__(self, tracer, name: str, attributes: dict | None, trace_id: str, parent_id: str | None, sampled: bool):
+        self.name, self.attributes = name, dict(attributes or {})
+        self.trace_id, self.span_id, self.parent_id = trace_id, os.urandom(8).hex(), parent_id
+        self.start_ns, self.end_ns = time.time_ns(), None
+        self.status, self.error, self.sampled = "ok", None, sampled
+        self._tracer = tracer
+
+    @property
+    def duration_ms(self) -> float | None:
+        return (self.end_ns - self.start_ns) / 1e6 if self.end_ns else None
+
+    def fail(self, error):
+        self.status, self.error = "error", error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self._tracer._finish(self)
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+                "start_ns": self.start_ns, "end_ns": self.end_ns, "status": self.status, "error": self.error,
+                "attributes": self.attributes}
+
+class ClientExporter:
+    """Replays finished spans through a client with Phoenix's `span(name, attributes, trace_id, parent_id)` API."""
+    def __init__(self, client):
+        self.client = client
+
+    def export(self, spans: list[Span]):
+        for s in spans:
+            attributes = {**s.attributes, "start_ns": s.start_ns, "end_ns": s.end_ns, "duration_ms": s.duration_ms,
+                          "status": s.status, **({"error": s.error} if s.error else {})}
+            self.client.span(name=s.name, attributes=attributes, trace_id=s.trace_id, parent_id=s.parent_id).end()
+
+def _otlp_value(v) -> dict:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": v if isinstance(v, str) else repr(v)}
+
+class OTLPExporter:
+    """OTLP/HTTP JSON to a collector endpoint (…/v1/traces)."""
+    def __init__(self, endpoint: str = ENDPOINT, service: str = PROJECT, timeout: float = 5.0):
+        import httpx
+        self.endpoint, self.service = endpoint, service
+        self._http = httpx.Client(timeout=timeout)
+
+    def export(self, spans: list[Span]):
+        body = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service}}]},
+            "scopeSpans": [{"scope": {"name": "nestwell"}, "spans": [{
+                "traceId": s.trace_id, "spanId": s.span_id, **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                "name": s.name, "kind": 1, "startTimeUnixNano": str(s.start_ns), "endTimeUnixNano": str(s.end_ns),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+                "status": {"code": 2, "message": s.error} if s.status == "error" else {"code": 1}}
+                for s in spans]}]}]}
+        self._http.post(self.endpoint, json=body).raise_for_status()
+
+class NullExporter:
+    def export(self, spans: list[Span]):
+        pass
+
+class Tracer:
+    def __init__(self, exporter=None, sample_rate: float = SAMPLE_RATE, tail: bool = TAIL, slow_ms: float = SLOW_MS,
+                 buffer: int = BUFFER, batch: int = BATCH, export_ms: float = EXPORT_MS, open_secs: float = OPEN_SECS):
+        self.exporter = exporter
+        self.sample_rate, self.tail, self.slow_ms = sample_rate, tail, slow_ms
+        self.batch, self.export_ms, self.open_secs = batch, export_ms, open_secs
+        self._ring: deque = deque(maxlen=buffer)
+        self._open: OrderedDict = OrderedDict()           # trace_id -> (first finished at, finished spans), oldest first
+        self._decided: OrderedDict = OrderedDict()        # trace_id -> kept?, for spans that end after their root
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.stats_ = {"spans": 0, "traces_kept": 0, "traces_dropped": 0, "spans_overflowed": 0,
+                       "spans_exported": 0, "export_errors": 0, "spans_evicted": 0}
+
+    def start_span(self, name: str, attributes: dict | None = None, parent: Span | None = None) -> Span:
+        parent = parent if parent is not None else _current.get()
+        if parent is None:
+            sampled = random.random() < self.sample_rate
+            return Span(self, name, attributes, uuid.uuid4().hex, None, sampled)
+        return Span(self, name, attributes, parent.trace_id, parent.span_id, parent.sampled)
+
+    @contextlib.contextmanager
+    def span(self, name: str, attributes: dict | None = None, parent: Span | None = None):
+        s = self.start_span(name, attributes, parent)
+        token = _current.set(s)
+        try:
+            yield s
+        except BaseException as e:
+            if not isinstance(e, GeneratorExit):
+                s.fail(e)
+            raise
+        finally:
+            try:
+                _current.reset(token)
+            except ValueError:  # a generator resumed in another context (e.g. a threadpool step)
+                _current.set(None if token.old_value is contextvars.Token.MISSING else token.old_value)
+            s.end()
+
+    def _finish(self, span: Span):
+        if not span.sampled and not self.tail:
+            return
+        with self._lock:
+            self.stats_["spans"] += 1
+            if span.trace_id in self._decided:  # a child outliving its root (a timed-out tool call)
+                if self._decided[span.trace_id]:
+                    self._keep([span])
+                return
+            if span.trace_id not in self._open:
+                self._evict(time.monotonic() - self.open_secs)
+                self._open[span.trace_id] = (time.monotonic(), [])
+            self._open[span.trace_id][1].append(span)
+            if span.parent_id is not None:
+                return
+            spans = self._open.pop(span.trace_id)[1]
+            keep = span.sampled or any(s.status == "error" for s in spans) or span.duration_ms >= self.slow_ms
+            self._decided[span.trace_id] = keep
+            if len(self._decided) > 4096:
+                self._decided.popitem(last=False)
+            if keep:
+                self.stats_["traces_kept"] += 1
+                self._keep(spans)
+            else:
+                self.stats_["traces_dropped"] += 1
+        if keep and len(self._ring) >= self.batch:
+            self._wake.set()
+
+    def _evict(self, cutoff: float):
+        """Drop traces whose root is still open long after their first span finished (a root never ended)."""
+        while self._open and next(iter(self._open.values()))[0] < cutoff:
+            _, (_, spans) = self._open.popitem(last=False)
+            self.stats_["spans_evicted"] += len(spans)
+
+    def _keep(self, spans: list[Span]):
+        overflow = len(self._ring) + len(spans) - self._ring.maxlen
+        if overflow > 0:
+            self.stats_["spans_overflowed"] += overflow
+        self._ring.extend(spans)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+            self._thread.start()
+
+    def _drain(self) -> list[Span]:
+        with self._lock:
+            n = min(self.batch, len(self._ring))
+            return [self._ring.popleft() for _ in range(n)]
+
+    def flush(self):
+        """Export everything buffered now, on the calling thread."""
+        while batch := self._drain():
+            self._export(batch)
+
+    def _export(self, batch: list[Span]):
+        if self.exporter is None:
+            self.exporter = default_exporter()
+        try:
+            self.exporter.export(batch)
+            self.stats_["spans_exported"] += len(batch)
+        except Exception:
+            self.stats_["export_errors"] += 1  # tracing never fails a request; the batch is dropped
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.export_ms / 1000)
+            self._wake.clear()
+            self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.stats_, "buffered": len(self._ring), "open_traces": len(self._open)}
+
+def default_exporter():
+    if EXPORTER == "none":
+        return NullExporter()
+    if EXPORTER == "otlp":
+        return OTLPExporter()
+    try:
+        from arize_phoenix import Client
+        return ClientExporter(Client(endpoint=ENDPOINT, project_name=PROJECT))
+    except ImportError:
+        from src.observability.phoenix_tracing_mock import MockClient
+        return ClientExporter(MockClient())
+
+tracer = Tracer()
+atexit.register(tracer.flush)
+
+def span(name: str, attributes: dict | None = None, parent: Span | None = None):
+    """Context manager: a child of the current span, or of `parent`, or a new trace."""
+    return tracer.span(name, attributes, parent)
+
+def current_span() -> Span | None:
+    return _current.get()
+
+def propagate(fn):
+    """Bind `fn` to the caller's span context, for work handed to a thread pool."""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+class _Instrumented:
+    __slots__ = ("_target", "_kind")
+
+    def __init__(self, target, kind: str):
+        self._target, self._kind = target, kind
+
+    @property
+    def __wrapped__(self):
+        return self._target
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            op = f"tool.{self._kind}.{name}"
+            with span(op, {"tool": self._kind, "method": name}), timed(op):
+                return attr(*args, **kwargs)
+        return call
+
+def instrument(tool, kind: str):
+    """`tool` with every public method call recorded as a child span and a latency sample, `tool.<kind>.<method>`."""
+    return _Instrumented(tool, kind)
@@ -1,11 +1,17 @@
-from fastapi import FastAPI
+import asyncio, json, os, sys, time
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from src.agents.orchestrator import Orchestrator
+from src.observability import metrics, tracing
+from src.server import prefork
 try:
     from src.observability.phoenix_tracing import traced
 except ImportError:
     from src.observability.phoenix_tracing_mock import traced
 
+BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "16"))
+
 app = FastAPI(title="NestWell Agentic GTM Demo")
 orc = Orchestrator()
 
@@ -18,13 +24,95 @@ class ChatResponse(BaseModel):
     reply: str
     trace_id: str
     outcome_tags: list[str] = []
+    error: str | None = None
+
+class BatchRequest(BaseModel):
+    items: list[ChatRequest]
+    concurrency: int | None = None  # default CHAT_BATCH_CONCURRENCY
+
+class BatchResponse(BaseModel):
+    results: list[ChatResponse]
 
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    if prefork.follower is None:
+        return {"status": "ok"}
+    return {"status": "ok", "pid": os.getpid(), "reload_epoch": prefork.follower.epoch, **prefork.current_versions()}
+
+@app.middleware("http")
+async def measure(request: Request, call_next):
+    """Request latency by route; with an `X-Profile` header, the request's timed operations come back as
+    `Server-Timing` and a JSON `X-Profile` summary (not for streamed responses, whose headers go out first)."""
+    t0 = time.perf_counter()
+    await prefork.poll()  # under the prefork server, switch KB/catalog versions together with the other workers
+    with metrics.profiled() as profile:
+        response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.registry.observe("nestwell_http_request_seconds", time.perf_counter() - t0, method=request.method,
+                             path=getattr(route, "path", "unmatched"), status=response.status_code)
+    if "x-profile" in request.headers and not response.headers.get("content-type", "").startswith("text/event-stream"):
+        ops = metrics.summarize(profile)
+        response.headers["Server-Timing"] = ", ".join(
+            f'{o["op"]};dur={o["total_ms"]};desc="{o["calls"]}x"' for o in ops)
+        response.headers["X-Profile"] = json.dumps({"total_ms": round((time.perf_counter() - t0) * 1000, 3), "ops": ops},
+                                                   separators=(",", ":"))
+    return response
+
+@metrics.registry.collector
+def _gauges():
+    out = [(f"nestwell_trace_{k}", None, v) for k, v in tracing.tracer.stats().items()]
+    gateway = sys.modules.get("src.agents.llm_gateway")
+    if gateway and gateway.default_gateway.cache_info().currsize:  # only once something has used the LLM
+        stats = gateway.default_gateway().stats()
+        out += [(f"nestwell_llm_{k}", None, v) for k, v in stats.items() if isinstance(v, (int, float))]
+        out += [("nestwell_llm_queued", {"domain": d}, n) for d, n in stats["queued_by_domain"].items()]
+    outbox = sys.modules.get("src.tools.crm_outbox")
+    if outbox and outbox.default_outbox.cache_info().currsize:
+        out += [(f"nestwell_crm_outbox_{k}", None, v) for k, v in outbox.default_outbox().stats().items()]
+    if prefork.follower is not None:
+        out += [(f"nestwell_reload_{k}", None, int(v)) for k, v in prefork.follower.stats().items()]
+    return out
+
+metrics.registry.describe("nestwell_http_request_seconds", "histogram", "HTTP request latency by route")
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus text exposition of this worker's latency histograms, counters and gauges."""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/llm/stats")
+def llm_stats():
+    """LLM gateway queue depth, scheduler wait times, retries and bucket levels."""
+    from src.agents.llm_gateway import default_gateway
+    return default_gateway().stats()
 
 @app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
-    with traced("chat_session", attributes={"channel": req.channel, "user_id": req.user_id}) as span:
-        reply, tags, trace_id = orc.handle_message(req.user_id, req.message, channel=req.channel)
+async def chat(req: ChatRequest):
+    with traced("chat_session", attributes={"channel": req.channel, "user_id": req.user_id}):
+        reply, tags, trace_id = await orc.handle_message_async(req.user_id, req.message, channel=req.channel)
         return ChatResponse(reply=reply, outcome_tags=tags, trace_id=trace_id)
+
+@app.post("/chat/batch", response_model=BatchResponse)
+async def chat_batch(req: BatchRequest):
+    """Handle many conversations at once, at most `concurrency` in flight; results keep the request order.
+    A failed item gets an `error` instead of failing the batch."""
+    limit = asyncio.Semaphore(max(1, req.concurrency or BATCH_CONCURRENCY))
+
+    async def one(item: ChatRequest) -> ChatResponse:
+        async with limit:
+            with traced("chat_session", attributes={"channel": item.channel, "user_id": item.user_id, "batch": True}) as span:
+                try:
+                    reply, tags, trace_id = await orc.handle_message_async(item.user_id, item.message, channel=item.channel)
+                except Exception as e:
+                    return ChatResponse(reply="", trace_id=span.trace_id, error=f"{type(e).__name__}: {e}")
+                return ChatResponse(reply=reply, outcome_tags=tags, trace_id=trace_id)
+
+    return BatchResponse(results=await asyncio.gather(*(one(item) for item in req.items)))
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """Server-sent events: tool_call / tool_result progress, token pieces of the reply, then done."""
+    async def events():
+        async for event in orc.handle_message_stream_async(req.user_id, req.message, channel=req.channel):
+            yield f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
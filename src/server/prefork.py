@@ -0,0 +1,246 @@
+"""Preforking server: load the KB index and catalog once, share them with every worker, reload them together.
+
+    python -m src.server.prefork --workers 4 --port 8000
+
+The master imports the app and builds the catalog and KB tools before forking, so workers
+start warm and share those pages copy-on-write instead of each reading its own copy
+(`gc.freeze()` keeps the collector from touching, and so copying, the inherited objects).
+uvicorn's own --workers spawns fresh interpreters and can't share them this way.
+
+Reloads are coordinated. Every PREFORK_RELOAD_SECS (or on SIGHUP) the master looks for a
+new KB generation (demo_data/kb/index/CURRENT) and a changed catalog.json, recompiling the
+catalog snapshot if needed. It publishes a plan (versions and a wall-clock `switch_at`,
+PREFORK_SWITCH_GRACE seconds ahead) in a shared memory page. Workers open the new versions
+in the background, and every worker starts serving them at `switch_at`. A request
+arriving after that waits for preparation to finish, so no worker keeps answering from
+the old index. The master switches too, so workers it respawns later inherit the new
+versions. A worker that switches in place maps the catalog snapshot and IVF/HNSW index
+files, but holds its own copy of a flat index.
+"""
+import argparse, asyncio, gc, json, mmap, os, signal, sys, threading, time
+from src.agents import resources
+
+RELOAD_SECS = float(os.getenv("PREFORK_RELOAD_SECS", "2"))
+SWITCH_GRACE = float(os.getenv("PREFORK_SWITCH_GRACE", "3"))
+
+class ReloadState:
+    """One page of MAP_SHARED anonymous memory, inherited by forked workers: a sequence number and a JSON plan.
+
+    Only the master writes (seqlock: the sequence is odd while a write is in progress)."""
+    def __init__(self, size: int = mmap.PAGESIZE):
+        self._mm = mmap.mmap(-1, size)
+
+    def seq(self) -> int:
+        return int.from_bytes(self._mm[0:8], "little")
+
+    def publish(self, plan: dict):
+        body = json.dumps(plan).encode()
+        seq = self.seq()
+        self._mm[0:8] = (seq + 1).to_bytes(8, "little")
+        self._mm[8:16] = len(body).to_bytes(8, "little")
+        self._mm[16:16 + len(body)] = body
+        self._mm[0:8] = (seq + 2).to_bytes(8, "little")
+
+    def read(self) -> tuple[int, dict | None]:
+        while True:
+            seq = self.seq()
+            if seq & 1:
+                time.sleep(0)
+                continue
+            n = int.from_bytes(self._mm[8:16], "little")
+            body = bytes(self._mm[16:16 + n])
+            if self.seq() == seq:
+                return seq, json.loads(body) if n else None
+
+def _snapshots():
+    from src.tools.catalog_index import shared_snapshot
+    return shared_snapshot()
+
+def current_versions() -> dict:
+    """Versions this process is serving: the KB generation directory and the catalog snapshot inode."""
+    return {"kb": resources.tool("kb").gen_dir if "kb" in resources.loaded() else None,
+            "catalog": _snapshots().get().inode}
+
+class Follower:
+    """Applies published plans in this process: prepares the new versions, then switches at `switch_at`."""
+    def __init__(self, state: ReloadState, epoch: int = 0, background: bool = True):
+        self.state, self.epoch, self.background = state, epoch, background
+        self.seen = None
+        self.switches = self.errors = 0
+        self.last_error = None
+        self._staged: dict | None = None
+        self._lock = threading.Lock()
+
+    def _due(self) -> dict | None:
+        """Stage a newly published plan; returns the staged plan once its switch time has come."""
+        seq = self.state.seq()
+        if seq != self.seen:
+            with self._lock:
+                self.seen, plan = self.state.read()
+                if plan and plan["epoch"] != self.epoch and (self._staged is None or self._staged["plan"]["epoch"] != plan["epoch"]):
+                    self._stage(plan)
+        staged = self._staged
+        return staged if staged is not None and time.time() >= staged["plan"]["switch_at"] else None
+
+    def poll(self):
+        staged = self._due()
+        if staged is not None:
+            self._switch(staged)
+
+    async def apoll(self):
+        """poll() for the event loop: waiting for a slow preparation happens on a thread, not the loop."""
+        staged = self._due()
+        if staged is None:
+            return
+        if not staged["ready"].is_set():
+            if staged.get("waiter") is None:  # one waiting thread, however many requests arrive meanwhile
+                staged["waiter"] = asyncio.ensure_future(asyncio.to_thread(staged["ready"].wait))
+            await asyncio.shield(staged["waiter"])
+        self._switch(staged)
+
+    def _stage(self, plan: dict):
+        staged = self._staged = {"plan": plan, "ready": threading.Event(), "prepared": None}
+        if self.background:
+            threading.Thread(target=self._prepare, args=(staged,), name="reload-prepare", daemon=True).start()
+        else:
+            self._prepare(staged)
+
+    def _prepare(self, staged: dict):
+        from src.tools.kb import open_generation
+        plan, have = staged["plan"], current_versions()
+        try:
+            staged["prepared"] = {
+                "kb": open_generation(plan["kb"]) if have["kb"] is not None and plan["kb"] != have["kb"] else None,
+                "catalog": _snapshots().prepare(rebuild=False) if plan["catalog"] != have["catalog"] else None}
+        except Exception as e:  # keep serving what we have; the next plan tries again
+            self.errors += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+        staged["ready"].set()
+
+    def _switch(self, staged: dict):
+        staged["ready"].wait()
+        with self._lock:
+            if self._staged is not staged:
+                return
+            self._staged = None
+            prepared = staged["prepared"]
+            if prepared is None:
+                return
+            if prepared["kb"] is not None:
+                resources.tool("kb").__wrapped__.use(prepared["kb"])  # not a traced tool call: the master must stay thread-free
+            if prepared["catalog"] is not None:
+                _snapshots().use(prepared["catalog"])
+            self.epoch = staged["plan"]["epoch"]
+            self.switches += 1
+
+    def stats(self) -> dict:
+        return {"epoch": self.epoch, "switches": self.switches, "errors": self.errors,
+                "pending": self._staged is not None}
+
+follower: Follower | None = None  # set in prefork workers
+
+async def poll():
+    """Switch to newly published versions when due; a no-op outside the prefork server."""
+    if follower is not None:
+        await follower.apoll()
+
+class Coordinator:
+    """Master side: notices new KB generations and catalog changes and publishes switch plans."""
+    def __init__(self, state: ReloadState, reload_secs: float = RELOAD_SECS, grace: float = SWITCH_GRACE):
+        self.state, self.reload_secs, self.grace = state, reload_secs, grace
+        self.follower = Follower(state, background=False)
+        self.plan = {"epoch": 0, "switch_at": 0.0, **current_versions()}
+        self._checked = time.monotonic()
+        self.state.publish(self.plan)
+
+    def check(self):
+        from src.tools.kb_index import current_dir
+        self._checked = time.monotonic()
+        latest = {"kb": current_dir() if self.plan["kb"] is not None else None,
+                  "catalog": _snapshots().latest_inode()}  # recompiles the snapshot if catalog.json changed
+        if any(latest[k] != self.plan[k] for k in latest):
+            self.plan = {"epoch": self.plan["epoch"] + 1, "switch_at": time.time() + self.grace, **latest}
+            self.state.publish(self.plan)
+            print(f"prefork: reload {self.plan['epoch']} at +{self.grace:g}s: {latest}", file=sys.stderr)
+
+    def tick(self):
+        if time.monotonic() - self._checked >= self.reload_secs:
+            try:
+                self.check()
+            except Exception as e:
+                print(f"prefork: reload check failed: {type(e).__name__}: {e}", file=sys.stderr)
+        self.follower.poll()
+
+def serve(app: str = "src.server.app:app", host: str = "127.0.0.1", port: int = 8000, workers: int = 2,
+          log_level: str = "info"):
+    import uvicorn
+    from uvicorn.importer import import_from_string
+
+    asgi = import_from_string(app)
+    resources.preload()
+    _snapshots().pinned = True  # catalog and KB swaps come from the coordinator, not per-worker polling
+    resources.tool("kb").__wrapped__.pinned = True
+    from src.tools.embeddings import default_embedder
+    default_embedder.cache_clear()  # an ingest may have opened the SQLite embedding cache; workers open their own
+    state = ReloadState()
+    coordinator = Coordinator(state)
+    config = uvicorn.Config(asgi, host=host, port=port, log_level=log_level)
+    sock = config.bind_socket()
+    children: dict[int, int] = {}
+    stopping = False
+
+    def spawn(slot: int):
+        gc.collect()
+        gc.freeze()
+        pid = os.fork()
+        if pid:
+            children[pid] = slot
+            return
+        global follower
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        follower = Follower(state, epoch=coordinator.follower.epoch)
+        uvicorn.Server(config).run(sockets=[sock])
+        os._exit(0)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def reload_now(signum, frame):
+        coordinator._checked = float("-inf")
+
+    for slot in range(workers):
+        spawn(slot)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGHUP, reload_now)
+    print(f"prefork: {workers} workers on http://{host}:{port} (master {os.getpid()}, preloaded {resources.loaded()})",
+          file=sys.stderr)
+    while children:
+        time.sleep(0.2)
+        while children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if not pid:
+                break
+            slot = children.pop(pid, None)
+            if slot is not None and not stopping:
+                print(f"prefork: worker {pid} exited ({status}); respawning", file=sys.stderr)
+                spawn(slot)
+        if not stopping:
+            coordinator.tick()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Serve the app from preforked workers sharing one preloaded KB index and catalog.")
+    ap.add_argument("--app", default="src.server.app:app")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    ap.add_argument("--log-level", default="info")
+    args = ap.parse_args()
+    from src.server import prefork  # run as the module the app imports, so workers see the same `follower`
+    prefork.serve(args.app, args.host, args.port, args.workers, args.log_level)
@@ -0,0 +1,124 @@
+"""Semantic answer cache keyed on query embeddings.
+
+A lookup is a nearest-neighbour search over the embeddings of previously answered
+questions; anything at or above the similarity threshold returns the stored answer.
+Entries expire after a TTL, the least recently used go first once the byte budget is
+spent, and `invalidate_all()` drops everything when the KB index is republished.
+
+    ANSWER_CACHE=false              disable
+    ANSWER_CACHE_THRESHOLD=0.9      cosine similarity needed for a hit
+    ANSWER_CACHE_TTL=3600           seconds an answer stays valid
+    ANSWER_CACHE_MAX_BYTES=16777216 budget per cache (vectors + answers)
+"""
+import json, os, threading, time
+from collections import OrderedDict
+import numpy as np
+
+ENABLED = os.getenv("ANSWER_CACHE", "true").lower() == "true"
+THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.9"))
+TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+MAX_BYTES = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+class SemanticCache:
+    def __init__(self, dim: int, threshold: float = THRESHOLD, ttl: float = TTL, max_bytes: int = MAX_BYTES):
+        self.dim, self.threshold, self.ttl, self.max_bytes = dim, threshold, ttl, max_bytes
+        self._keys = np.zeros((64, dim), dtype="float32")
+        self._live = np.zeros(64, dtype=bool)
+        self._stored = np.zeros(64)  # time.time() each slot was written
+        self._entries: OrderedDict[int, tuple] = OrderedDict()  # slot -> (value, stored_at, nbytes), LRU order
+        self._free: list[int] = list(range(63, -1, -1))
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def _drop(self, slot: int):
+        _, _, nbytes = self._entries.pop(slot)
+        self._live[slot] = False
+        self._free.append(slot)
+        self.bytes -= nbytes
+
+    def _slot(self) -> int:
+        if not self._free:
+            n = len(self._keys)
+            self._keys = np.vstack([self._keys, np.zeros((n, self.dim), dtype="float32")])
+            self._live = np.concatenate([self._live, np.zeros(n, dtype=bool)])
+            self._stored = np.concatenate([self._stored, np.zeros(n)])
+            self._free = list(range(2 * n - 1, n - 1, -1))
+        return self._free.pop()
+
+    def lookup_many(self, vecs: np.ndarray) -> list:
+        """Cached value for each query vector, or None on a miss."""
+        out = [None] * len(vecs)
+        with self._lock:
+            expired = self._live & (time.time() - self._stored > self.ttl)
+            for slot in np.flatnonzero(expired).tolist():  # purged first, so they can't shadow a live match
+                self._drop(slot)
+            if self._entries:
+                sims = vecs @ self._keys.T
+                sims[:, ~self._live] = -np.inf
+                best = sims.argmax(axis=1)
+                for i, slot in enumerate(best.tolist()):
+                    if sims[i, slot] < self.threshold or slot not in self._entries:
+                        continue
+                    value, _, _ = self._entries[slot]
+                    self._entries.move_to_end(slot)
+                    out[i] = value
+            hits = sum(v is not None for v in out)
+            self.hits += hits
+            self.misses += len(out) - hits
+        return out
+
+    def lookup(self, vec: np.ndarray):
+        return self.lookup_many(vec.reshape(1, -1))[0]
+
+    def store(self, vec: np.ndarray, value):
+        nbytes = self.dim * 4 + len(json.dumps(value, default=str))
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            while self.bytes + nbytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+            slot = self._slot()
+            self._keys[slot] = vec
+            self._live[slot] = True
+            self._stored[slot] = now = time.time()
+            self._entries[slot] = (value, now, nbytes)
+            self.bytes += nbytes
+
+    def clear(self):
+        with self._lock:
+            for slot in list(self._entries):
+                self._drop(slot)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"entries": len(self._entries), "bytes": self.bytes, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": round(self.hits / total, 3) if total else None}
+
+_caches: dict[str, SemanticCache] = {}
+_version = None
+_registry_lock = threading.Lock()
+
+def get_cache(name: str, dim: int) -> SemanticCache | None:
+    """Process-wide cache for `name` (e.g. "kb", "llm:support"), or None when disabled."""
+    if not ENABLED:
+        return None
+    with _registry_lock:
+        if name not in _caches:
+            _caches[name] = SemanticCache(dim)
+        return _caches[name]
+
+def invalidate_all(version: str):
+    """Clear every cache when the KB index `version` changes; answers may cite the old content."""
+    global _version
+    with _registry_lock:
+        if version == _version:
+            return
+        _version = version
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.clear()
+
+def stats() -> dict:
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,144 @@
+"""Persistent helpdesk cases, indexed by case id, user and order.
+
+Case ids come from SQLite's AUTOINCREMENT sequence (`C0000042`), so they are stable across
+processes and never reused. A partial unique index allows each user at most one open
+case per order, so the user's repeat complaint about the same order finds that case with
+one index probe and bumps its `repeats` count instead of opening another. Order ids come
+from the message, so another user naming the same order gets a case of their own. Cases without an order are
+deduplicated on (user, summary) among the user's open cases. Opening runs in a
+BEGIN IMMEDIATE transaction, so concurrent workers can't both open a case for one order;
+closing does too. Every call holds the store's lock while it uses the shared connection.
+
+    HELPDESK_DB_PATH=...    defaults to demo_data/helpdesk.sqlite
+"""
+import contextlib, json, os, sqlite3, threading, time
+from functools import lru_cache
+from src.observability.metrics import timed
+
+DB_PATH = os.getenv("HELPDESK_DB_PATH", os.path.join(os.path.dirname(__file__), "../../demo_data/helpdesk.sqlite"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cases (seq INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, order_id TEXT,
+                                  summary TEXT NOT NULL, details TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'open',
+                                  repeats INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, updated_at REAL NOT NULL);
+CREATE UNIQUE INDEX IF NOT EXISTS cases_open_by_user_order ON cases (user_id, order_id) WHERE status = 'open' AND order_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS cases_by_user ON cases (user_id, status, seq);
+"""
+MIGRATIONS = [  # applied once each, in order; PRAGMA user_version (owned by this store in the shared file) counts them
+    "DROP INDEX IF EXISTS cases_open_by_order",  # one open case per order across all users; now per (user, order)
+]
+_COLUMNS = "seq, user_id, order_id, summary, details, status, repeats, created_at, updated_at"
+
+def case_id(seq: int) -> str:
+    return f"C{seq:07d}"
+
+def case_seq(cid: str) -> int | None:
+    return int(cid[1:]) if cid[:1] == "C" and cid[1:].isdigit() else None
+
+def _case(row) -> dict:
+    seq, user_id, order_id, summary, details, status, repeats, created_at, updated_at = row
+    return {"id": case_id(seq), "user_id": user_id, "order_id": order_id, "summary": summary,
+            "details": json.loads(details), "status": status, "repeats": repeats,
+            "created_at": created_at, "updated_at": updated_at}
+
+class CaseStore:
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        self._connect()
+        self._db.executescript(SCHEMA)
+        self._migrate()
+
+    def _connect(self):
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        if os.getpid() != self._pid:  # a forked child must not reuse the parent's connection
+            self._connect()
+
+    def _migrate(self):
+        with self._transaction():
+            version = self._db.execute("PRAGMA user_version").fetchone()[0]
+            for stmt in MIGRATIONS[version:]:
+                self._db.execute(stmt)
+            if version < len(MIGRATIONS):
+                self._db.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """A BEGIN IMMEDIATE transaction on the shared connection, committed unless the block raises."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    @timed("helpdesk.open_case")
+    def open_case(self, user_id: str, summary: str, details: dict | None = None, order_id: str | None = None) -> dict:
+        """Open a case, or return the user's open case already covering this order (or this summary) with
+        `repeats` incremented. The result's `repeat` says which happened."""
+        self._check_fork()
+        now = time.time()
+        with self._transaction():
+            if order_id is not None:
+                row = self._db.execute(f"SELECT {_COLUMNS} FROM cases WHERE user_id = ? AND order_id = ? AND status = 'open'",
+                                       (user_id, order_id)).fetchone()
+            else:
+                row = self._db.execute(f"SELECT {_COLUMNS} FROM cases WHERE user_id = ? AND status = 'open' AND summary = ? "
+                                       "AND order_id IS NULL", (user_id, summary)).fetchone()
+            if row:
+                self._db.execute("UPDATE cases SET repeats = repeats + 1, updated_at = ? WHERE seq = ?", (now, row[0]))
+                case = {**_case(row), "repeats": row[6] + 1, "updated_at": now, "repeat": True}
+            else:
+                cur = self._db.execute("INSERT INTO cases (user_id, order_id, summary, details, created_at, updated_at) "
+                                       "VALUES (?, ?, ?, ?, ?, ?)",
+                                       (user_id, order_id, summary, json.dumps(details or {}, default=str), now, now))
+                case = {"id": case_id(cur.lastrowid), "user_id": user_id, "order_id": order_id, "summary": summary,
+                        "details": details or {}, "status": "open", "repeats": 0, "created_at": now, "updated_at": now,
+                        "repeat": False}
+        return case
+
+    def get(self, cid: str) -> dict | None:
+        seq = case_seq(cid)
+        if seq is None:
+            return None
+        self._check_fork()
+        with self._lock:
+            row = self._db.execute(f"SELECT {_COLUMNS} FROM cases WHERE seq = ?", (seq,)).fetchone()
+        return _case(row) if row else None
+
+    def open_for_order(self, user_id: str, order_id: str) -> dict | None:
+        self._check_fork()
+        with self._lock:
+            row = self._db.execute(f"SELECT {_COLUMNS} FROM cases WHERE user_id = ? AND order_id = ? AND status = 'open'",
+                                   (user_id, order_id)).fetchone()
+        return _case(row) if row else None
+
+    @timed("helpdesk.list_open")
+    def list_open(self, user_id: str, limit: int = 50) -> list[dict]:
+        """The user's open cases, newest first."""
+        self._check_fork()
+        with self._lock:
+            rows = self._db.execute(f"SELECT {_COLUMNS} FROM cases WHERE user_id = ? AND status = 'open' ORDER BY seq DESC LIMIT ?",
+                                    (user_id, limit)).fetchall()
+        return [_case(r) for r in rows]
+
+    def close(self, cid: str) -> bool:
+        seq = case_seq(cid)
+        if seq is None:
+            return False
+        self._check_fork()
+        with self._transaction():
+            cur = self._db.execute("UPDATE cases SET status = 'closed', updated_at = ? WHERE seq = ? AND status = 'open'",
+                                   (time.time(), seq))
+        return cur.rowcount == 1
+
+@lru_cache(maxsize=None)
+def default_case_store() -> CaseStore:
+    return CaseStore()
@@ -1,22 +1,54 @@
 import json, os, random
-DATA = os.path.join(os.path.dirname(__file__), "../../demo_data/catalog/catalog.json")
+from src.tools.catalog_index import B2B, B2C, DATA, CatalogIndex, current_snapshot
+BUNDLE_TAGS = ["chair","desk","sofa","pillow","lamp"]
+USE_SNAPSHOT = os.getenv("CATALOG_SNAPSHOT", "true").lower() == "true"
+
+def _segment_of(traits: dict | None) -> int | None:
+    seg = str((traits or {}).get("segment", "")).lower()
+    return {"b2c": B2C, "b2b": B2B}.get(seg)
 
 class CatalogTool:
-    def __init__(self):
-        with open(DATA) as f:
-            self.catalog = json.load(f)
+    def __init__(self, catalog: list | None = None):
+        # An explicit catalog gets a private in-memory index; otherwise every tool in the
+        # process reads the shared, memory-mapped snapshot of catalog.json.
+        if catalog is None and not USE_SNAPSHOT:
+            with open(DATA) as f:
+                catalog = json.load(f)
+        self._index = CatalogIndex(catalog) if catalog is not None else None
+
+    @property
+    def index(self) -> CatalogIndex:
+        return self._index if self._index is not None else current_snapshot()
+
+    @property
+    def catalog(self):
+        return self.index.catalog
+
+    def _pick(self, index: CatalogIndex, ids):
+        return index.catalog[int(ids[random.randrange(len(ids))])]
 
-    def recommend_bundle(self, message: str):
+    def recommend_bundle(self, message: str, traits: dict | None = None):
+        index = self.index
+        segment = _segment_of(traits)
+        budget = (traits or {}).get("budget_per_room")
+        remaining = float(budget) if budget else None
         items = []
-        for k in ["chair","desk","sofa","pillow","lamp"]:
-            candidates = [p for p in self.catalog if k in p["tags"]]
-            if candidates:
-                items.append(random.choice(candidates))
-        return items[:3]
+        for k in BUNDLE_TAGS:
+            candidates = index.find((k,), segment=segment, max_price=remaining)
+            if len(candidates):
+                item = self._pick(index, candidates)
+                items.append(item)
+                if remaining is not None:
+                    remaining -= item["price"]
+                if len(items) == 3:
+                    break
+        return items
 
-    def price_quote(self, message: str):
+    def price_quote(self, message: str, traits: dict | None = None):
+        index = self.index
         qty = 10 if "10" in message else 5
-        pick = random.choice(self.catalog)
+        candidates = index.find(segment=_segment_of(traits))
+        pick = self._pick(index, candidates) if len(candidates) else random.choice(index.catalog)
         unit = pick["price"]
         total = unit * qty * (0.9 if qty >= 10 else 1.0)
         return {"items":[{"sku": pick["sku"], "qty": qty, "unit": unit}], "total": total, "summary": f"{qty}x {pick['name']} @ ${unit} → total ${total:,.2f}"}
@@ -0,0 +1,227 @@
+"""Catalog index structures.
+
+`CatalogIndex` is built in memory from a list of products. `CatalogSnapshot` serves the
+same columns from a compiled binary file that is memory-mapped, so every worker process
+and Streamlit session on a host shares one copy of the pages. `current_snapshot()` hands
+out the process-wide snapshot and hot-swaps it when catalog.json changes.
+"""
+import hashlib, json, mmap, os, threading, time
+import numpy as np
+try:
+    import fcntl
+except ImportError:  # Windows: os.replace is still atomic, rebuilds just aren't serialized
+    fcntl = None
+
+DATA = os.path.join(os.path.dirname(__file__), "../../demo_data/catalog/catalog.json")
+B2C, B2B = 1, 2
+MAGIC = b"NWCAT01\n"
+RELOAD_SECS = float(os.getenv("CATALOG_RELOAD_SECS", "2"))
+_EMPTY = np.empty(0, dtype=np.int32)
+
+def _segment_bits(tags) -> int:
+    bits = (B2C if "b2c" in tags else 0) | (B2B if "b2b" in tags else 0)
+    return bits or (B2C | B2B)  # untagged SKUs are sold to everyone
+
+class CatalogIndex:
+    """Columnar view of the catalog.
+
+    Posting lists map a tag (optionally narrowed to a segment) to row ids sorted by
+    price, so a budget cap is a binary search and picking a candidate is O(1).
+    """
+    def __init__(self, catalog: list):
+        self.catalog = catalog
+        self.prices = np.fromiter((p["price"] for p in catalog), dtype=np.float64, count=len(catalog))
+        self.segments = np.fromiter((_segment_bits(p["tags"]) for p in catalog), dtype=np.uint8, count=len(catalog))
+        by_price = np.argsort(self.prices, kind="stable").astype(np.int32)
+        postings: dict[str, list[int]] = {}
+        for i in by_price.tolist():
+            for t in catalog[i]["tags"]:
+                postings.setdefault(t, []).append(i)
+        self.lists = {None: by_price}
+        for t, ids in postings.items():
+            ids = np.asarray(ids, dtype=np.int32)
+            self.lists[t] = ids
+            for seg in (B2C, B2B):
+                self.lists[(t, seg)] = ids[(self.segments[ids] & seg) != 0]
+        for seg in (B2C, B2B):
+            self.lists[(None, seg)] = by_price[(self.segments[by_price] & seg) != 0]
+        self.list_prices = {k: self.prices[ids] for k, ids in self.lists.items()}
+
+    def __len__(self):
+        return len(self.catalog)
+
+    def postings(self, tag: str) -> np.ndarray:
+        return self.lists.get(tag, _EMPTY)
+
+    def find(self, tags=(), segment: int | None = None, max_price: float | None = None) -> np.ndarray:
+        """Row ids carrying every tag in `tags`, sold to `segment` and priced within `max_price`."""
+        if len(tags) > 1:
+            ids = self.postings(tags[0])
+            for t in tags[1:]:
+                ids = np.intersect1d(ids, self.postings(t), assume_unique=True)
+            if segment is not None:
+                ids = ids[(self.segments[ids] & segment) != 0]
+            return ids if max_price is None else ids[self.prices[ids] <= max_price]
+        key = tags[0] if tags else None
+        if segment is not None:
+            key = (key, segment)
+        ids = self.lists.get(key, _EMPTY)
+        if max_price is None or not len(ids):
+            return ids
+        return ids[:np.searchsorted(self.list_prices[key], max_price, side="right")]
+
+# --- compiled snapshot -------------------------------------------------------
+
+def snapshot_path(src: str = DATA) -> str:
+    return os.path.splitext(src)[0] + ".snap"
+
+def _source_sig(src: str) -> dict:
+    st = os.stat(src)
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+def compile_snapshot(src: str = DATA, dst: str | None = None) -> str:
+    """Compile `src` (catalog.json) into a snapshot file, replacing `dst` atomically."""
+    dst = dst or snapshot_path(src)
+    sig = _source_sig(src)
+    with open(src, "rb") as f:
+        raw = f.read()
+    catalog = json.loads(raw)
+    index = CatalogIndex(catalog)
+    records = [json.dumps(p, separators=(",", ":")).encode() for p in catalog]
+    rec_offsets = np.zeros(len(records) + 1, dtype=np.int64)
+    np.cumsum([len(r) for r in records], out=rec_offsets[1:])
+    arrays = {"prices": index.prices, "segments": index.segments, "rec_offsets": rec_offsets,
+              "records": np.frombuffer(b"".join(records), dtype=np.uint8)}
+    lists = []
+    for n, (key, ids) in enumerate(index.lists.items()):
+        arrays[f"l{n}"], arrays[f"p{n}"] = ids, index.list_prices[key]
+        lists.append([list(key) if isinstance(key, tuple) else key, f"l{n}", f"p{n}"])
+    sections, offset = {}, 0
+    for name, arr in arrays.items():
+        offset = (offset + 7) & ~7  # keep every column 8-byte aligned
+        sections[name] = [offset, arr.dtype.str, int(arr.size)]
+        offset += arr.nbytes
+    header = json.dumps({"n": len(catalog), "source": {**sig, "sha1": hashlib.sha1(raw).hexdigest()},
+                         "sections": sections, "lists": lists}).encode()
+    base = (len(MAGIC) + 8 + len(header) + 7) & ~7
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + len(header).to_bytes(8, "little") + header)
+        for name, arr in arrays.items():
+            f.seek(base + sections[name][0])
+            f.write(arr.tobytes())
+        f.truncate(base + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, dst)
+    return dst
+
+class SnapshotRecords:
+    """Read-only sequence of products decoded lazily from the snapshot blob."""
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob, self.offsets = blob, offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> dict:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return json.loads(self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes())
+
+class CatalogSnapshot(CatalogIndex):
+    """`CatalogIndex` whose columns are views into a memory-mapped snapshot file."""
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.inode = os.fstat(f.fileno()).st_ino
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}: not a catalog snapshot")
+        hlen = int.from_bytes(self._mm[len(MAGIC):len(MAGIC) + 8], "little")
+        self.header = json.loads(self._mm[len(MAGIC) + 8:len(MAGIC) + 8 + hlen])
+        base = (len(MAGIC) + 8 + hlen + 7) & ~7
+        col = {name: np.frombuffer(self._mm, dtype=dt, count=n, offset=base + off)
+               for name, (off, dt, n) in self.header["sections"].items()}
+        self.prices, self.segments = col["prices"], col["segments"]
+        self.catalog = SnapshotRecords(col["records"], col["rec_offsets"])
+        self.lists, self.list_prices = {}, {}
+        for key, ids, prices in self.header["lists"]:
+            key = tuple(key) if isinstance(key, list) else key
+            self.lists[key], self.list_prices[key] = col[ids], col[prices]
+
+    def is_stale(self, src: str) -> bool:
+        src_sig = _source_sig(src)
+        return any(self.header["source"][k] != v for k, v in src_sig.items())
+
+class SharedSnapshot:
+    """Process-wide handle that re-checks the source every RELOAD_SECS and swaps atomically.
+
+    Rebuilds are serialized across processes with a lock file; a worker that loses the race
+    just maps the file its peer wrote. Callers holding the previous snapshot keep a valid
+    mapping of the old inode until they drop it.
+    """
+    def __init__(self, src: str = DATA):
+        self.src, self.path = src, snapshot_path(src)
+        self._snap: CatalogSnapshot | None = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.pinned = False  # set by the prefork coordinator: the snapshot only changes through use()
+
+    def _rebuild_if_stale(self):
+        with open(self.path + ".lock", "w") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if not os.path.exists(self.path) or CatalogSnapshot(self.path).is_stale(self.src):
+                    compile_snapshot(self.src, self.path)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        snap = self._snap
+        if snap is None or snap.is_stale(self.src) or not os.path.exists(self.path):
+            self._rebuild_if_stale()
+        elif os.stat(self.path).st_ino == snap.inode:
+            return
+        self._snap = CatalogSnapshot(self.path)
+
+    def prepare(self, rebuild: bool = True) -> CatalogSnapshot:
+        """Map the current snapshot (recompiling it first if catalog.json changed) without switching to it."""
+        if rebuild:
+            self._rebuild_if_stale()
+        return CatalogSnapshot(self.path)
+
+    def latest_inode(self) -> int:
+        """Inode of the current snapshot file, recompiling it first if catalog.json changed; maps nothing."""
+        snap = self.get()
+        if snap.is_stale(self.src) or not os.path.exists(self.path):
+            self._rebuild_if_stale()
+        return os.stat(self.path).st_ino
+
+    def use(self, snap: CatalogSnapshot):
+        with self._lock:
+            self._snap, self._checked = snap, time.monotonic()
+
+    def get(self) -> CatalogSnapshot:
+        now = time.monotonic()
+        if self._snap is None or (not self.pinned and now - self._checked >= RELOAD_SECS):
+            with self._lock:
+                if self._snap is None or (not self.pinned and now - self._checked >= RELOAD_SECS):
+                    self._refresh()
+                    self._checked = now
+        return self._snap
+
+_shared: dict[str, SharedSnapshot] = {}
+
+def shared_snapshot(src: str = DATA) -> SharedSnapshot:
+    src = os.path.abspath(src)
+    if src not in _shared:
+        _shared.setdefault(src, SharedSnapshot(src))
+    return _shared[src]
+
+def current_snapshot(src: str = DATA) -> CatalogSnapshot:
+    return shared_snapshot(src).get()
@@ -1,6 +1,18 @@
-import random, string
+from src.tools.crm_outbox import default_outbox, idempotency_key, record_id
 class CRMTool:
-    def create_lead(self, user_id: str, context: dict):
-        return "L" + "".join(random.choices(string.ascii_uppercase + string.digits, k=7))
-    def create_opportunity(self, user_id: str, quote: dict):
-        return {"id": "O" + "".join(random.choices("0123456789", k=7)), "amount": quote["total"]}
+    """Leads and opportunities go to the durable outbox (src.tools.crm_outbox) and reach the CRM in the background.
+
+    The idempotency key covers the user, the kind of record and `source` (the message that
+    asked for it) when given, else the record's content: retrying a message returns the
+    record it already created."""
+    def __init__(self, outbox=None):
+        self.outbox = outbox or default_outbox()
+    def create_lead(self, user_id: str, context: dict, traits: dict | None = None, source: str | None = None):
+        key = idempotency_key(user_id, "lead", source if source is not None else context)
+        return self.outbox.enqueue("lead", user_id, key, record_id("L", key),
+                                   {"context": context, "segment": (traits or {}).get("segment")})
+    def create_opportunity(self, user_id: str, quote: dict, traits: dict | None = None, source: str | None = None):
+        key = idempotency_key(user_id, "opportunity", source if source is not None else quote)
+        rid = self.outbox.enqueue("opportunity", user_id, key, record_id("O", key),
+                                  {"quote": quote, "amount": quote.get("total"), "segment": (traits or {}).get("segment")})
+        return {"id": rid, "amount": quote.get("total")}
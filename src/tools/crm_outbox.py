@@ -0,0 +1,249 @@
+"""Durable outbox for CRM writes.
+
+`CRMTool` records each lead or opportunity in a local SQLite outbox and returns right away.
+A background flusher sends pending records to the CRM backend in bulk upserts of up to
+CRM_BATCH, retrying failures with jittered exponential backoff.
+
+Every record carries an idempotency key: a SHA-256 of the user, the kind of write and its
+content. A retried message therefore lands on the row it already wrote (and gets back the
+same record id) instead of adding a second one. The backend upserts by the same key, so a
+batch that is sent twice, e.g. because a worker died before marking it sent, updates
+records rather than duplicating them. Flushers in several processes claim disjoint
+batches with a lease (CRM_LEASE_SECS).
+
+    CRM_BACKEND=fake          local SQLite table standing in for the CRM (CRM_FAKE_PATH), or
+    CRM_BACKEND=http          POST {"records": [...]} to CRM_URL
+    CRM_OUTBOX_PATH=...       defaults to demo_data/crm_outbox.sqlite
+    CRM_FLUSH_MS=200          how long the flusher waits to fill a batch
+    CRM_MAX_ATTEMPTS=10       after this many failed sends a record is parked as "dead"
+    CRM_KEEP_SECS=604800      sent records (and so the dedupe window) are kept this long
+"""
+import atexit, hashlib, json, os, random, sqlite3, threading, time
+from functools import lru_cache
+from src.observability.metrics import timed
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "../../demo_data")
+OUTBOX_PATH = os.getenv("CRM_OUTBOX_PATH", os.path.join(DATA_DIR, "crm_outbox.sqlite"))
+FAKE_PATH = os.getenv("CRM_FAKE_PATH", os.path.join(DATA_DIR, "crm_fake.sqlite"))
+BACKEND = os.getenv("CRM_BACKEND", "fake")
+BATCH = int(os.getenv("CRM_BATCH", "100"))
+FLUSH_MS = float(os.getenv("CRM_FLUSH_MS", "200"))
+LEASE_SECS = float(os.getenv("CRM_LEASE_SECS", "30"))
+MAX_ATTEMPTS = int(os.getenv("CRM_MAX_ATTEMPTS", "10"))
+BACKOFF_BASE = float(os.getenv("CRM_BACKOFF_BASE", "0.5"))
+BACKOFF_CAP = float(os.getenv("CRM_BACKOFF_CAP", "60"))
+KEEP_SECS = float(os.getenv("CRM_KEEP_SECS", str(7 * 86400)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (key TEXT PRIMARY KEY, kind TEXT NOT NULL, record_id TEXT NOT NULL,
+                                   user_id TEXT NOT NULL, payload TEXT NOT NULL, created_at REAL NOT NULL,
+                                   status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0,
+                                   next_at REAL NOT NULL DEFAULT 0, sent_at REAL, error TEXT);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (next_at) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS outbox_sent ON outbox (sent_at) WHERE status = 'sent';
+"""
+_ID_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+def _canon(obj) -> str:
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+def idempotency_key(user_id: str, kind: str, content) -> str:
+    return hashlib.sha256(_canon([user_id, kind, content]).encode()).hexdigest()
+
+def record_id(prefix: str, key: str, length: int = 13) -> str:
+    """A short CRM-facing id derived from the idempotency key: 13 base36 characters carry
+    67 bits, so ids stay collision-free far beyond any realistic number of records."""
+    n = int(key[:32], 16)
+    out = []
+    for _ in range(length):
+        n, r = divmod(n, len(_ID_ALPHABET))
+        out.append(_ID_ALPHABET[r])
+    return prefix + "".join(out)
+
+# --- backends ------------------------------------------------------------------
+
+class FakeCRM:
+    """Stands in for the CRM: upserts by idempotency key and counts how often each record was sent."""
+    def __init__(self, path: str = FAKE_PATH, fail_rate: float = float(os.getenv("CRM_FAKE_FAIL_RATE", "0")),
+                 latency_ms: float = float(os.getenv("CRM_FAKE_LATENCY_MS", "0"))):
+        self.fail_rate, self.latency_ms = fail_rate, latency_ms
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS records (key TEXT PRIMARY KEY, kind TEXT NOT NULL, id TEXT NOT NULL,
+                            user_id TEXT NOT NULL, payload TEXT NOT NULL, upserts INTEGER NOT NULL, updated_at REAL NOT NULL)""")
+        self._lock = threading.Lock()
+
+    def upsert(self, records: list[dict]):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if self.fail_rate and random.random() < self.fail_rate:
+            raise ConnectionError("fake CRM unavailable")
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany(
+                """INSERT INTO records VALUES (:key, :kind, :id, :user_id, :payload, 1, :now)
+                   ON CONFLICT(key) DO UPDATE SET payload = excluded.payload, upserts = upserts + 1, updated_at = excluded.updated_at""",
+                [{**r, "payload": _canon(r["payload"]), "now": now} for r in records])
+
+    def stats(self) -> dict:
+        with self._lock:
+            records, upserts = self._db.execute("SELECT COUNT(*), COALESCE(SUM(upserts), 0) FROM records").fetchone()
+        return {"records": records, "upserts": upserts}
+
+class HTTPCRM:
+    """POSTs each batch as {"records": [...]} to a bulk upsert endpoint keyed by `key`.
+
+    Retried records back off independently, so a retry batch rarely matches an earlier one:
+    the Idempotency-Key header covers the whole batch (its sorted keys), never one record."""
+    def __init__(self, url: str | None = None, timeout: float = 10.0):
+        import httpx
+        self.url = url or os.environ["CRM_URL"]
+        self._http = httpx.Client(timeout=timeout)
+
+    def upsert(self, records: list[dict]):
+        batch_key = hashlib.sha256("\n".join(sorted(r["key"] for r in records)).encode()).hexdigest()
+        self._http.post(self.url, json={"records": records}, headers={"Idempotency-Key": batch_key}).raise_for_status()
+
+def make_backend(kind: str = BACKEND):
+    return HTTPCRM() if kind == "http" else FakeCRM()
+
+# --- outbox --------------------------------------------------------------------
+
+class Outbox:
+    def __init__(self, path: str = OUTBOX_PATH, backend=None, batch: int = BATCH, flush_ms: float = FLUSH_MS):
+        self.path, self.batch, self.flush_interval = path, batch, flush_ms / 1000
+        self._backend = backend
+        self._connect()
+        with self._db:
+            self._db.executescript(SCHEMA)
+        atexit.register(self.close)
+
+    def _connect(self):
+        """(Re)open per-process state: a forked child gets its own connection and flusher."""
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        self._wake = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._closed = False
+        self._pid = os.getpid()
+        self.sent = self.failed = self.batches = 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = make_backend()
+        return self._backend
+
+    def _check_fork(self):
+        if os.getpid() != self._pid:
+            self._connect()
+
+    @timed("crm.enqueue")
+    def enqueue(self, kind: str, user_id: str, key: str, rid: str, payload: dict) -> str:
+        """Record a write; returns the id of the record for `key`, which may have been written earlier."""
+        self._check_fork()
+        with self._lock:
+            cur = self._db.execute("INSERT INTO outbox (key, kind, record_id, user_id, payload, created_at) VALUES (?, ?, ?, ?, ?, ?) "
+                                   "ON CONFLICT(key) DO NOTHING", (key, kind, rid, user_id, _canon(payload), time.time()))
+            if cur.rowcount == 0:  # written earlier, possibly under an older id scheme
+                rid = self._db.execute("SELECT record_id FROM outbox WHERE key = ?", (key,)).fetchone()[0]
+        with self._wake:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="crm-outbox", daemon=True)
+                self._thread.start()
+            self._wake.notify()
+        return rid
+
+    def _claim(self, now: float) -> list[dict]:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    "UPDATE outbox SET next_at = ? WHERE key IN (SELECT key FROM outbox WHERE status = 'pending' AND next_at <= ? "
+                    "ORDER BY created_at LIMIT ?) RETURNING key, kind, record_id, user_id, payload, attempts",
+                    (now + LEASE_SECS, now, self.batch)).fetchall()
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return [{"key": k, "kind": kind, "id": rid, "user_id": u, "payload": json.loads(p), "attempts": n}
+                for k, kind, rid, u, p, n in rows]
+
+    def flush_once(self) -> int:
+        """Send one batch of due records; returns how many were claimed."""
+        self._check_fork()
+        now = time.time()
+        claimed = self._claim(now)
+        if not claimed:
+            return 0
+        records = [{k: r[k] for k in ("key", "kind", "id", "user_id", "payload")} for r in claimed]
+        try:
+            with timed("crm.upsert"):
+                self.backend.upsert(records)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            rows = [("dead" if r["attempts"] + 1 >= MAX_ATTEMPTS else "pending",
+                     now + random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** r["attempts"])), error, r["key"])
+                    for r in claimed]
+            with self._lock:
+                self._db.execute("BEGIN")
+                self._db.executemany("UPDATE outbox SET status = ?, attempts = attempts + 1, next_at = ?, error = ? WHERE key = ?", rows)
+                self._db.execute("COMMIT")
+            self.failed += len(claimed)
+            return len(claimed)
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("UPDATE outbox SET status = 'sent', sent_at = ?, attempts = attempts + 1, error = NULL WHERE key = ?",
+                                 [(now, r["key"]) for r in claimed])
+            self._db.execute("DELETE FROM outbox WHERE status = 'sent' AND sent_at < ?", (now - KEEP_SECS,))
+            self._db.execute("COMMIT")
+        self.sent += len(claimed)
+        self.batches += 1
+        return len(claimed)
+
+    def _run(self):
+        while not self._closed:
+            with self._wake:
+                self._wake.wait(self.flush_interval)
+            try:
+                while self.flush_once() >= self.batch:  # a full batch: more may be waiting
+                    pass
+            except sqlite3.Error:
+                time.sleep(self.flush_interval)
+
+    def flush(self, timeout: float = 10.0) -> int:
+        """Send due records on the calling thread until none are left or `timeout` passes; returns how many stay pending."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and self.flush_once():
+            pass
+        return self.pending()
+
+    def pending(self) -> int:
+        self._check_fork()
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+
+    def close(self):
+        """Stop the flusher after one last attempt at what is due; anything left is sent by the next process."""
+        if os.getpid() != self._pid or self._closed:
+            return
+        self._closed = True
+        with self._wake:
+            self._wake.notify_all()
+        try:
+            self.flush(timeout=2.0)
+        except sqlite3.Error:
+            pass
+
+    def stats(self) -> dict:
+        self._check_fork()
+        with self._lock:
+            by_status = dict(self._db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+        return {"pending": by_status.get("pending", 0), "sent": by_status.get("sent", 0), "dead": by_status.get("dead", 0),
+                "sent_here": self.sent, "failed_here": self.failed, "batches_here": self.batches}
+
+@lru_cache(maxsize=None)
+def default_outbox() -> Outbox:
+    return Outbox()
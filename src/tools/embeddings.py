@@ -0,0 +1,114 @@
+"""Embedding backends for the KB.
+
+Every backend embeds a whole batch in one call and is deterministic across processes.
+`Embedder` keys each text by a content hash and keeps vectors in an on-disk cache, so
+re-seeding the KB or re-asking a known question never embeds the same text twice.
+
+    EMBED_BACKEND=hashing                 offline char n-gram hashing stand-in (default)
+    EMBED_BACKEND=sentence-transformers   local model, EMBED_MODEL=<path or name>
+    EMBED_CACHE=false                     disable the on-disk cache
+"""
+import hashlib, os, sqlite3, threading, time
+from functools import lru_cache
+import numpy as np
+
+KB_DIR = os.path.join(os.path.dirname(__file__), "../../demo_data/kb")
+CACHE_FILE = os.path.join(KB_DIR, "embeddings.sqlite")
+DIM = 384
+
+def content_key(model: str, text: str) -> str:
+    return hashlib.sha1(f"{model}\0{text}".encode()).hexdigest()
+
+class HashingEmbedder:
+    """Stateless character n-gram feature hashing: no model download, same vector in every process."""
+    def __init__(self, dim: int = DIM):
+        from sklearn.feature_extraction.text import HashingVectorizer
+        self.dim = dim
+        self.name = f"hashing-char3-5-{dim}"
+        self._vec = HashingVectorizer(n_features=dim, analyzer="char_wb", ngram_range=(3, 5),
+                                      alternate_sign=False, norm="l2")
+
+    def __call__(self, texts: list[str]) -> np.ndarray:
+        return self._vec.transform(texts).toarray().astype("float32")
+
+class SentenceTransformerEmbedder:
+    """Local sentence-transformers model; point EMBED_MODEL at a local path to stay offline."""
+    def __init__(self, model: str, batch_size: int = 64):
+        from sentence_transformers import SentenceTransformer
+        self._model = SentenceTransformer(model, device="cpu")
+        self.dim = self._model.get_sentence_embedding_dimension()
+        self.name = f"st:{model}"
+        self.batch_size = batch_size
+
+    def __call__(self, texts: list[str]) -> np.ndarray:
+        return self._model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True,
+                                  convert_to_numpy=True).astype("float32")
+
+class EmbeddingCache:
+    """content_key -> float32 vector, in SQLite so concurrent workers can share it."""
+    _CHUNK = 500  # stay under SQLite's bound-parameter limit
+
+    def __init__(self, path: str = CACHE_FILE):
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS vecs (key TEXT PRIMARY KEY, vec BLOB NOT NULL)")
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: list[str]) -> dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), self._CHUNK):
+                chunk = keys[i:i + self._CHUNK]
+                rows = self._db.execute(f"SELECT key, vec FROM vecs WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+                found.update((k, np.frombuffer(v, dtype="float32")) for k, v in rows)
+        return found
+
+    def put_many(self, items: dict[str, np.ndarray]):
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO vecs VALUES (?, ?)",
+                                 [(k, np.ascontiguousarray(v, dtype="float32").tobytes()) for k, v in items.items()])
+
+class Embedder:
+    """Batches texts through `backend`, embedding only the content hashes not already cached."""
+    def __init__(self, backend, cache: EmbeddingCache | None = None):
+        self.backend = backend
+        self.cache = cache
+        self.dim = backend.dim
+        self.requested = self.cache_hits = self.computed = 0
+        self.seconds = 0.0
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        keys = [content_key(self.backend.name, t) for t in texts]
+        vecs = self.cache.get_many(list(set(keys))) if self.cache else {}
+        self.requested += len(texts)
+        self.cache_hits += sum(k in vecs for k in keys)
+        todo = {k: t for k, t in zip(keys, texts) if k not in vecs}
+        if todo:
+            t0 = time.perf_counter()
+            fresh = self.backend(list(todo.values()))
+            self.seconds += time.perf_counter() - t0
+            self.computed += len(todo)
+            fresh = dict(zip(todo, fresh))
+            if self.cache:
+                self.cache.put_many(fresh)
+            vecs.update(fresh)
+        out = np.empty((len(texts), self.dim), dtype="float32")
+        for i, k in enumerate(keys):
+            out[i] = vecs[k]
+        return out
+
+    def stats(self) -> dict:
+        return {"backend": self.backend.name, "requested": self.requested, "cache_hits": self.cache_hits,
+                "computed": self.computed,
+                "embeddings_per_sec": round(self.computed / self.seconds, 1) if self.seconds else None}
+
+def make_backend(kind: str | None = None):
+    kind = kind or os.getenv("EMBED_BACKEND", "hashing")
+    if kind == "sentence-transformers":
+        return SentenceTransformerEmbedder(os.getenv("EMBED_MODEL", "all-MiniLM-L6-v2"))
+    return HashingEmbedder()
+
+@lru_cache(maxsize=None)
+def default_embedder() -> Embedder:
+    cache = EmbeddingCache() if os.getenv("EMBED_CACHE", "true").lower() == "true" else None
+    return Embedder(make_backend(), cache)
@@ -0,0 +1,122 @@
+"""Goodwill credit ledger with per-user, per-period caps.
+
+Every grant is an atomic check-and-increment in one BEGIN IMMEDIATE transaction. It reads
+the user's running total for the current period, grants what the caps leave, appends the
+entry and bumps the running totals. Concurrent requests, across threads or processes,
+can't together go past a cap. Amounts are stored in cents.
+
+Running totals are kept per (user, period) and per day, so the remaining allowance is one
+primary-key read and the daily finance export reads one row per day, not the entries.
+
+    GOODWILL_MAX=50                 largest single credit
+    GOODWILL_USER_CAP=100           most one user can receive per period
+    GOODWILL_PERIOD=month           day | week | month (UTC)
+    ALLOW_GOODWILL_CREDITS=false    grant nothing (requests are still recorded)
+    HELPDESK_DB_PATH=...            shared with the case store
+"""
+import os, sqlite3, threading, time
+from datetime import datetime, timezone
+from functools import lru_cache
+from src.observability.metrics import timed
+from src.tools.case_store import DB_PATH
+
+MAX_CREDIT = float(os.getenv("GOODWILL_MAX", "50"))
+USER_CAP = float(os.getenv("GOODWILL_USER_CAP", "100"))
+PERIOD = os.getenv("GOODWILL_PERIOD", "month")
+ENABLED = os.getenv("ALLOW_GOODWILL_CREDITS", "true").lower() == "true"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS goodwill_entries (seq INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, period TEXT NOT NULL,
+                                             day TEXT NOT NULL, requested_cents INTEGER NOT NULL, granted_cents INTEGER NOT NULL,
+                                             reason TEXT, segment TEXT, ts REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS goodwill_totals (user_id TEXT NOT NULL, period TEXT NOT NULL, granted_cents INTEGER NOT NULL,
+                                            credits INTEGER NOT NULL, PRIMARY KEY (user_id, period)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS goodwill_daily (day TEXT PRIMARY KEY, granted_cents INTEGER NOT NULL, credits INTEGER NOT NULL,
+                                           requests INTEGER NOT NULL, denied INTEGER NOT NULL) WITHOUT ROWID;
+"""
+
+def _cents(amount: float) -> int:
+    return max(0, round(amount * 100))
+
+def period_of(ts: float, period: str = PERIOD) -> str:
+    d = datetime.fromtimestamp(ts, timezone.utc)
+    if period == "day":
+        return d.strftime("%Y-%m-%d")
+    if period == "week":
+        year, week, _ = d.isocalendar()
+        return f"{year}-W{week:02d}"
+    return d.strftime("%Y-%m")
+
+class GoodwillLedger:
+    def __init__(self, path: str = DB_PATH, max_credit: float = MAX_CREDIT, user_cap: float = USER_CAP,
+                 period: str = PERIOD, enabled: bool = ENABLED):
+        if period not in ("day", "week", "month"):
+            raise ValueError(f"period must be day, week or month, got {period!r}")
+        self.path, self.period, self.enabled = path, period, enabled
+        self.max_cents, self.cap_cents = _cents(max_credit), _cents(user_cap)
+        self._connect()
+        self._db.executescript(SCHEMA)
+
+    def _connect(self):
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        if os.getpid() != self._pid:  # a forked child must not reuse the parent's connection
+            self._connect()
+
+    @timed("goodwill.grant")
+    def grant(self, user_id: str, amount: float, reason: str | None = None, segment: str | None = None) -> dict:
+        """Grant up to `amount`, clamped to the per-credit maximum and what is left of the user's cap this period."""
+        self._check_fork()
+        now = time.time()
+        period, day = period_of(now, self.period), period_of(now, "day")
+        requested = _cents(amount)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT granted_cents FROM goodwill_totals WHERE user_id = ? AND period = ?",
+                                       (user_id, period)).fetchone()
+                used = row[0] if row else 0
+                granted = min(requested, self.max_cents, max(0, self.cap_cents - used)) if self.enabled else 0
+                self._db.execute("INSERT INTO goodwill_entries (user_id, period, day, requested_cents, granted_cents, reason, segment, ts) "
+                                 "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (user_id, period, day, requested, granted, reason, segment, now))
+                if granted:
+                    self._db.execute("INSERT INTO goodwill_totals VALUES (?, ?, ?, 1) ON CONFLICT(user_id, period) DO UPDATE "
+                                     "SET granted_cents = granted_cents + excluded.granted_cents, credits = credits + 1",
+                                     (user_id, period, granted))
+                self._db.execute("INSERT INTO goodwill_daily VALUES (?, ?, ?, 1, ?) ON CONFLICT(day) DO UPDATE "
+                                 "SET granted_cents = granted_cents + excluded.granted_cents, credits = credits + excluded.credits, "
+                                 "requests = requests + 1, denied = denied + excluded.denied",
+                                 (day, granted, int(granted > 0), int(granted == 0)))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return {"amount": granted / 100, "requested": requested / 100, "remaining": max(0, self.cap_cents - used - granted) / 100,
+                "period": period, "capped": granted < requested}
+
+    def remaining(self, user_id: str) -> float:
+        """What the user can still receive this period (one primary-key read); never negative, even after
+        GOODWILL_USER_CAP is lowered below what the user already received."""
+        self._check_fork()
+        with self._lock:
+            row = self._db.execute("SELECT granted_cents FROM goodwill_totals WHERE user_id = ? AND period = ?",
+                                   (user_id, period_of(time.time(), self.period))).fetchone()
+        return max(0, self.cap_cents - (row[0] if row else 0)) / 100 if self.enabled else 0.0
+
+    def daily_totals(self, since: str | None = None, until: str | None = None) -> list[dict]:
+        """Per-day totals (UTC, YYYY-MM-DD, inclusive bounds) from the running daily rows."""
+        self._check_fork()
+        with self._lock:
+            rows = self._db.execute("SELECT day, granted_cents, credits, requests, denied FROM goodwill_daily "
+                                    "WHERE day >= ? AND day <= ? ORDER BY day", (since or "", until or "9999")).fetchall()
+        return [{"day": day, "granted": cents / 100, "credits": credits, "requests": requests, "denied": denied}
+                for day, cents, credits, requests, denied in rows]
+
+@lru_cache(maxsize=None)
+def default_ledger() -> GoodwillLedger:
+    return GoodwillLedger()
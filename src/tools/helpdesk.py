@@ -1,8 +1,24 @@
-import os
-GOODWILL_MAX = float(os.getenv("GOODWILL_MAX", "50"))
+from src.tools.case_store import default_case_store
+from src.tools.goodwill_ledger import default_ledger
+def open_cases_note(cases: list[dict]) -> str:
+    return f" Your open cases: {', '.join(c['id'] for c in cases[:3])}{' and more' if len(cases) > 3 else ''}." if cases else ""
+def credit_note(credit: dict) -> str:
+    return f" + ${credit['amount']:g} credit" if credit["amount"] else ""
 class HelpdeskTool:
+    def __init__(self, cases=None, ledger=None):
+        self.cases = cases or default_case_store()
+        self.ledger = ledger or default_ledger()
     def create_case(self, user_id: str, summary: str, details: dict):
-        return {"id": f"C{hash(user_id+summary)%100000}", "summary": summary, "details": details}
-    def issue_goodwill(self, user_id: str, amount: float):
-        amt = min(amount, GOODWILL_MAX)
-        return {"amount": amt, "currency": "USD"}
+        """Open a case, or add to the open case already covering this order; `repeat` says which."""
+        case = self.cases.open_case(user_id, summary, details, order_id=(details or {}).get("order_id"))
+        return {"id": case["id"], "summary": case["summary"], "details": case["details"],
+                "repeat": case["repeat"], "repeats": case["repeats"]}
+    def list_open_cases(self, user_id: str, limit: int = 50):
+        return [{"id": c["id"], "summary": c["summary"], "order_id": c["order_id"], "repeats": c["repeats"]}
+                for c in self.cases.list_open(user_id, limit)]
+    def issue_goodwill(self, user_id: str, amount: float, traits: dict | None = None):
+        """Credit up to `amount`, within the per-credit maximum and the user's cap for the period (goodwill_ledger)."""
+        credit = self.ledger.grant(user_id, amount, segment=(traits or {}).get("segment"))
+        return {"amount": credit["amount"], "currency": "USD", "remaining": credit["remaining"], "capped": credit["capped"]}
+    def goodwill_remaining(self, user_id: str) -> float:
+        return self.ledger.remaining(user_id)
@@ -1,49 +1,77 @@
-import os, json, faiss, numpy as np
-KB_DIR = os.path.join(os.path.dirname(__file__), "../../demo_data/kb")
-INDEX_FILE = os.path.join(KB_DIR, "kb.index")
-TXT_FILE = os.path.join(KB_DIR, "kb.jsonl")
-def embed(texts):
-    vecs = []
-    for t in texts:
-        h = abs(hash(t)) % 10**8
-        np.random.seed(h)
-        vecs.append(np.random.rand(384).astype("float32"))
-    return np.vstack(vecs)
+import os, threading, time, numpy as np
+from src.tools import answer_cache
+from src.tools.catalog_index import RELOAD_SECS
+from src.tools.embeddings import KB_DIR, default_embedder
+from src.tools.kb_index import ChunkStore, current_dir, ingest, load_index
+from src.observability.metrics import timed
+INGEST_ON_START = os.getenv("KB_INGEST_ON_START", "false").lower() == "true"
+# Cosine similarity below which a hit is treated as "nothing relevant" (tuned for the hashing backend)
+KB_MIN_SCORE = float(os.getenv("KB_MIN_SCORE", "0.3"))
+NO_ANSWER = "I couldn't find that in our help center."
+@timed("kb.embed")
+def embed(texts) -> np.ndarray:
+    return default_embedder().embed(list(texts))
+def format_hit(hit: dict) -> str:
+    return f"{hit['text']} (source: {hit['source']})"
+def open_generation(gen_dir: str) -> tuple:
+    """(gen_dir, index, chunks) for a published generation, ready for KBTool.use()."""
+    return gen_dir, load_index(gen_dir), ChunkStore(gen_dir)
 class KBTool:
+    """Serves the published index generation, switching to a newer one (see seed_kb) within RELOAD_SECS."""
     def __init__(self):
-        self.texts = []
-        self.meta = []
-        if os.path.exists(TXT_FILE) and os.path.exists(INDEX_FILE):
-            self._load()
-        else:
-            self._seed()
-    def _seed(self):
-        docs = [
-            {"text":"Return policy: free returns within 30 days; use prepaid label provided by the agent.", "source":"policy.md"},
-            {"text":"Sizing guide: lounge sofas seat 3 adults; premium fabric is stain resistant.", "source":"sizing.md"},
-            {"text":"Shipping: standard 3-5 business days; delays may occur during holidays.", "source":"shipping.md"},
-            {"text":"Warranty: 2-year structural warranty; 1-year upholstery defects.", "source":"warranty.md"},
-        ]
-        self.texts = [d["text"] for d in docs]
-        self.meta = [d["source"] for d in docs]
-        vecs = embed(self.texts)
-        index = faiss.IndexFlatIP(vecs.shape[1])
-        index.add(vecs)
-        faiss.write_index(index, INDEX_FILE)
-        with open(TXT_FILE, "w") as f:
-            for d in docs:
-                f.write(json.dumps(d) + "\n")
-    def _load(self):
-        self.texts = []
-        self.meta = []
-        with open(TXT_FILE) as f:
-            for line in f:
-                d = json.loads(line)
-                self.texts.append(d["text"]); self.meta.append(d["source"])
-        self.index = faiss.read_index(INDEX_FILE)
-    def answer(self, q: str) -> str:
-        if not hasattr(self, "index"):
-            self.index = faiss.read_index(INDEX_FILE)
-        vec = embed([q])
-        D,I = self.index.search(vec, 1)
-        return f"{self.texts[I[0][0]]} (source: {self.meta[I[0][0]]})"
+        if INGEST_ON_START or current_dir() is None:
+            ingest()
+        self._lock = threading.Lock()
+        self.pinned = False  # set by the prefork coordinator: the generation only changes through use()
+        self.use(open_generation(current_dir()))
+    def use(self, generation: tuple):
+        """Serve `generation` from now on; searches already running finish on the one they started with."""
+        self._gen, self._checked = generation, time.monotonic()
+        answer_cache.invalidate_all(generation[0])
+    gen_dir = property(lambda self: self._gen[0])
+    index = property(lambda self: self._gen[1])
+    chunks = property(lambda self: self._gen[2])
+    def refresh(self) -> bool:
+        """Switch to the latest published index generation, if a newer one exists."""
+        latest = current_dir()
+        if latest == self.gen_dir:
+            return False
+        self.use(open_generation(latest))
+        return True
+    def _current(self) -> tuple:
+        if not self.pinned and time.monotonic() - self._checked >= RELOAD_SECS:
+            with self._lock:
+                if time.monotonic() - self._checked >= RELOAD_SECS:
+                    self._checked = time.monotonic()
+                    self.refresh()
+        return self._gen
+    def answer_many(self, queries: list[str], k: int = 3, min_score: float | None = None) -> list[list[dict]]:
+        """Top-k hits per query, best first, as {"text", "source", "score"}; one embed and one search call.
+
+        Near-duplicates of recently answered queries are served from the semantic answer cache.
+        """
+        if not queries:
+            return []
+        _, index, chunks = self._current()
+        vecs = embed(queries)
+        cache = answer_cache.get_cache(f"kb:k{k}", vecs.shape[1])
+        results = cache.lookup_many(vecs) if cache else [None] * len(queries)
+        todo = [i for i, r in enumerate(results) if r is None]
+        if todo:
+            with timed("kb.search"):
+                D, I = index.search(vecs[todo], k)
+            for i, scores, ids in zip(todo, D.tolist(), I.tolist()):
+                hits = []
+                for score, cid in zip(scores, ids):
+                    if cid >= 0:
+                        c = chunks.get(cid)
+                        hits.append({"text": c["text"], "source": c["source"], "score": round(score, 4)})
+                results[i] = hits
+                if cache and hits:
+                    cache.store(vecs[i], hits)
+        if min_score is None:
+            return results
+        return [[h for h in hits if h["score"] >= min_score] for hits in results]
+    def answer(self, q: str, min_score: float | None = None) -> str:
+        hits = self.answer_many([q], k=1, min_score=min_score)[0]
+        return format_hit(hits[0]) if hits else NO_ANSWER
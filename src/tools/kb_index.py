@@ -0,0 +1,255 @@
+"""Incremental KB ingestion and on-disk index layout.
+
+Every .md/.txt file under the KB directory is split into chunks. A chunk's id is derived
+from a hash of its source and text, so re-ingesting only embeds chunks that are new and
+only drops chunks that disappeared. Each ingest publishes a new generation directory
+
+    demo_data/kb/index/v000003/  index.faiss  chunks.jsonl  ids.npy  offsets.npy  manifest.json
+    demo_data/kb/index/CURRENT   -> "v000003"
+
+and flips CURRENT atomically, so readers never see a half-written index. Readers map the
+faiss index and the chunk offsets read-only instead of loading them.
+
+The index type follows corpus size: exact `IDMap2,Flat` below KB_ANN_MIN_CHUNKS, otherwise
+IVF (KB_INDEX_KIND=ivf, default) or HNSW (KB_INDEX_KIND=hnsw), with KB_QUANT=none|sq8|pq
+(pq is IVF only; other combinations are rejected).
+"""
+import hashlib, json, os, re, shutil, time
+import faiss, numpy as np
+from src.tools.embeddings import KB_DIR, default_embedder
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+INDEX_ROOT = os.path.join(KB_DIR, "index")
+SOURCE_EXTS = (".md", ".txt")
+CHUNK_CHARS = int(os.getenv("KB_CHUNK_CHARS", "800"))
+ANN_MIN_CHUNKS = int(os.getenv("KB_ANN_MIN_CHUNKS", "20000"))
+KEEP_GENERATIONS = 2
+
+# --- chunking ----------------------------------------------------------------
+
+def _split_long(line: str, max_chars: int):
+    piece = []
+    for word in line.split():
+        if piece and sum(map(len, piece)) + len(piece) + len(word) > max_chars:
+            yield " ".join(piece)
+            piece = []
+        piece.append(word)
+    if piece:
+        yield " ".join(piece)
+
+def chunk_text(text: str, max_chars: int = CHUNK_CHARS) -> list[str]:
+    """Split markdown into heading-prefixed chunks of at most ~max_chars."""
+    chunks, title, buf = [], "", []
+
+    def flush():
+        body = " ".join(buf).strip()
+        if body:
+            chunks.append(f"{title}: {body}" if title else body)
+        buf.clear()
+
+    for block in re.split(r"\n\s*\n", text):
+        for line in block.splitlines():
+            line = line.strip()
+            if line.startswith("#"):
+                flush()
+                title = line.lstrip("#").strip()
+            elif line:
+                for piece in _split_long(line, max_chars):
+                    if buf and len(" ".join(buf)) + len(piece) > max_chars:
+                        flush()
+                    buf.append(piece)
+        if buf and len(" ".join(buf)) >= max_chars // 2:
+            flush()
+    flush()
+    return chunks
+
+def chunk_id(source: str, text: str) -> int:
+    return int.from_bytes(hashlib.sha1(f"{source}\0{text}".encode()).digest()[:8], "little") & (2**63 - 1)
+
+def iter_sources(root: str = KB_DIR):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if os.path.join(dirpath, d) != INDEX_ROOT)
+        for name in sorted(filenames):
+            if name.endswith(SOURCE_EXTS):
+                yield os.path.relpath(os.path.join(dirpath, name), root)
+
+# --- index type ---------------------------------------------------------------
+
+_QUANTS = {"ivf": ("none", "sq8", "pq"), "hnsw": ("none", "sq8")}
+
+def index_spec(n: int, dim: int) -> str:
+    kind, quant = os.getenv("KB_INDEX_KIND", "ivf"), os.getenv("KB_QUANT", "none")
+    if quant not in _QUANTS.get(kind, ()):  # checked even for small corpora, so a bad setting shows up early
+        raise ValueError(f"unsupported KB_INDEX_KIND={kind!r} with KB_QUANT={quant!r}; "
+                         f"supported: {', '.join(f'{k}: {q}' for k, v in _QUANTS.items() for q in v)}")
+    if n < ANN_MIN_CHUNKS:
+        return "IDMap2,Flat"
+    if kind == "hnsw":
+        return {"sq8": "IDMap2,HNSW32_SQ8"}.get(quant, "IDMap2,HNSW32")
+    nlist = int(min(65536, max(256, 4 * np.sqrt(n))))
+    codec = {"sq8": "SQ8", "pq": f"PQ{dim // 8}x8"}.get(quant, "Flat")
+    return f"IVF{nlist},{codec}"
+
+def _new_index(spec: str, vecs: np.ndarray, ids: np.ndarray):
+    index = faiss.index_factory(vecs.shape[1], spec, faiss.METRIC_INNER_PRODUCT)
+    if not index.is_trained:
+        sample = vecs[np.random.default_rng(0).permutation(len(vecs))[:100_000]]
+        index.train(sample)
+    if len(ids):
+        index.add_with_ids(vecs, ids)
+    return index
+
+def _supports_remove(spec: str) -> bool:
+    return "HNSW" not in spec
+
+# --- generations ---------------------------------------------------------------
+
+def current_dir(root: str = INDEX_ROOT) -> str | None:
+    try:
+        with open(os.path.join(root, "CURRENT")) as f:
+            gen = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(root, gen)
+
+def read_manifest(gen_dir: str | None) -> dict:
+    if not gen_dir:
+        return {}
+    with open(os.path.join(gen_dir, "manifest.json")) as f:
+        return json.load(f)
+
+def _publish(root: str, gen: int, chunks: dict[int, dict], index, manifest: dict) -> str:
+    name = f"v{gen:06d}"
+    out = os.path.join(root, name)
+    os.makedirs(out, exist_ok=True)
+    ids = np.array(sorted(chunks), dtype=np.int64)
+    offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    with open(os.path.join(out, "chunks.jsonl"), "wb") as f:
+        for i, cid in enumerate(ids.tolist()):
+            f.write((json.dumps({"id": cid, **chunks[cid]}) + "\n").encode())
+            offsets[i + 1] = f.tell()
+    np.save(os.path.join(out, "ids.npy"), ids)
+    np.save(os.path.join(out, "offsets.npy"), offsets)
+    faiss.write_index(index, os.path.join(out, "index.faiss"))
+    with open(os.path.join(out, "manifest.json"), "w") as f:
+        json.dump({**manifest, "generation": gen, "chunks": len(ids)}, f)
+    tmp = os.path.join(root, f"CURRENT.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        f.write(name)
+    os.replace(tmp, os.path.join(root, "CURRENT"))
+    gens = sorted(d for d in os.listdir(root) if re.fullmatch(r"v\d{6}", d))
+    for old in gens[:-KEEP_GENERATIONS]:  # readers mapping these keep their open inodes
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return out
+
+def _load_chunks(gen_dir: str) -> dict[int, dict]:
+    chunks = {}
+    with open(os.path.join(gen_dir, "chunks.jsonl")) as f:
+        for line in f:
+            d = json.loads(line)
+            chunks[d.pop("id")] = d
+    return chunks
+
+def ingest(kb_dir: str = KB_DIR, root: str = INDEX_ROOT, force: bool = False) -> dict:
+    """Bring the published index in line with the files under `kb_dir`; returns stats."""
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, ".lock"), "w") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        return _ingest_locked(kb_dir, root, force)
+
+def _ingest_locked(kb_dir: str, root: str, force: bool) -> dict:
+    t0 = time.perf_counter()
+    emb = default_embedder()
+    gen_dir = current_dir(root)
+    manifest = read_manifest(gen_dir)
+    files_before = manifest.get("files", {})
+    rebuild = force or not gen_dir or manifest.get("embedder") != emb.backend.name
+
+    files, wanted = {}, {}
+    for rel in iter_sources(kb_dir):
+        path = os.path.join(kb_dir, rel)
+        st = os.stat(path)
+        prev = files_before.get(rel)
+        if not rebuild and prev and prev["mtime_ns"] == st.st_mtime_ns and prev["size"] == st.st_size:
+            files[rel] = prev
+            continue
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        sha = hashlib.sha1(text.encode()).hexdigest()
+        files[rel] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha1": sha,
+                      "ids": prev["ids"] if prev and prev["sha1"] == sha and not rebuild else None}
+        if files[rel]["ids"] is None:
+            parts = chunk_text(text)
+            files[rel]["ids"] = [chunk_id(rel, t) for t in parts]
+            wanted.update({cid: {"text": t, "source": rel} for cid, t in zip(files[rel]["ids"], parts)})
+
+    if not rebuild and files == files_before:
+        return {"generation": manifest["generation"], "chunks": manifest["chunks"], "added": 0, "removed": 0,
+                "rebuilt": False, "seconds": round(time.perf_counter() - t0, 3)}
+
+    chunks = {} if rebuild else _load_chunks(gen_dir)
+    keep = {cid for f in files.values() for cid in f["ids"]}
+    removed = [cid for cid in chunks if cid not in keep]
+    for cid in removed:
+        del chunks[cid]
+    added = {cid: c for cid, c in wanted.items() if cid not in chunks}
+    chunks.update(added)
+
+    spec = index_spec(len(chunks), emb.dim)
+    if rebuild or spec != manifest.get("index") or (removed and not _supports_remove(spec)):
+        ids = np.array(list(chunks), dtype=np.int64)
+        vecs = emb.embed([chunks[c]["text"] for c in ids.tolist()]) if len(ids) else np.empty((0, emb.dim), "float32")
+        index, rebuilt = _new_index(spec, vecs, ids), True
+    else:
+        index, rebuilt = faiss.read_index(os.path.join(gen_dir, "index.faiss")), False
+        if removed:
+            index.remove_ids(np.array(removed, dtype=np.int64))
+        if added:
+            ids = np.array(list(added), dtype=np.int64)
+            index.add_with_ids(emb.embed([added[c]["text"] for c in ids.tolist()]), ids)
+
+    gen = manifest.get("generation", 0) + 1
+    _publish(root, gen, chunks, index, {"embedder": emb.backend.name, "dim": emb.dim, "index": spec, "files": files})
+    return {"generation": gen, "chunks": len(chunks), "added": len(added), "removed": len(removed),
+            "rebuilt": rebuilt, "index": spec, "seconds": round(time.perf_counter() - t0, 3)}
+
+# --- readers -----------------------------------------------------------------
+
+class ChunkStore:
+    """Chunk text by id, read on demand from chunks.jsonl through a mapped offset table."""
+    def __init__(self, gen_dir: str):
+        self.ids = np.load(os.path.join(gen_dir, "ids.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(gen_dir, "offsets.npy"), mmap_mode="r")
+        self._fd = os.open(os.path.join(gen_dir, "chunks.jsonl"), os.O_RDONLY)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get(self, cid: int) -> dict:
+        i = int(np.searchsorted(self.ids, cid))
+        if i >= len(self.ids) or self.ids[i] != cid:
+            raise KeyError(cid)
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return json.loads(os.pread(self._fd, end - start, start))
+
+    def __del__(self):
+        try:
+            os.close(self._fd)
+        except (AttributeError, OSError):
+            pass
+
+def load_index(gen_dir: str):
+    """Map the generation's faiss index read-only; fall back to a full read where unsupported."""
+    path = os.path.join(gen_dir, "index.faiss")
+    try:
+        index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        index = faiss.read_index(path)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = int(os.getenv("KB_NPROBE", "16"))
+    return index
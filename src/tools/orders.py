@@ -1,5 +1,8 @@
-import random
+import random, re
+ORDER_ID = re.compile(r"\bNW\d{5}\b", re.I)
 class OrderTool:
     def lookup(self, message: str):
+        m = ORDER_ID.search(message)
         delayed = "delayed" in message.lower() or random.random() < 0.5
-        return {"order_id": f"NW{random.randint(10000,99999)}", "delayed": delayed, "eta_days": 2 if not delayed else 5}
+        order_id = m[0].upper() if m else f"NW{random.randint(10000,99999)}"
+        return {"order_id": order_id, "delayed": delayed, "eta_days": 2 if not delayed else 5}
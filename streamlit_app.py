@@ -8,8 +8,8 @@ load_dotenv()
 
 sys.path.append(os.path.dirname(__file__))
 
+from src.agents import resources
 from src.agents.orchestrator import Orchestrator
-from src.memory.store import MemoryStore
 
 st.set_page_config(
     page_title="NestWell Living",
@@ -165,14 +165,20 @@ if 'history' not in st.session_state:
 # Display hero image
 st.image("https://images.unsplash.com/photo-1586023492125-27b2c045efd7?ixlib=rb-4.0.3&auto=format&fit=crop&w=1200&h=400&q=80", use_container_width=True)
 
-# Initialize memory store (needed for both display and message handling)
-mem = MemoryStore()
+@st.cache_resource
+def get_orchestrator(use_graph: bool) -> Orchestrator:
+    # one per planner setting for the whole server; tools, memory and the KB index are shared and load on first use
+    return Orchestrator(use_graph=use_graph)
+
+# Shared memory store (needed for both display and message handling)
+mem = resources.memory()
 
 # Memory and profile sidebar - render after user_id is set
 if user_id:
-    prof = mem.get_profile(user_id)
+    prof = mem.get_profile(user_id, last_n=3)
     traits = prof.get("traits", {})
     hist = prof.get("history", [])
+    hist_total = prof.get("history_total", len(hist))
 
     # Main Profile section - collapsible, expanded if there's any data
     has_data = bool(traits) or bool(hist)
@@ -206,12 +212,12 @@ if user_id:
                 st.markdown("• _No traits recorded yet_")
 
         # Recent History sub-section - collapsible
-        with st.expander(f"📝 Recent History ({len(hist)} events)", expanded=bool(hist)):
+        with st.expander(f"📝 Recent History ({hist_total} events)", expanded=bool(hist)):
             if hist:
                 # Show last 3 interactions
                 for i, event in enumerate(hist[-3:]):
-                    event_num = len(hist) - len(hist[-3:]) + i + 1
-                    st.markdown(f"**Event {event_num}:** {event.get('stage', 'unknown').title()}")
+                    event_num = hist_total - len(hist[-3:]) + i + 1
+                    st.markdown(f"**Event {event_num}:** {event.get('stage', event.get('intent', 'unknown')).title()}")
                     if 'tools' in event:
                         st.markdown(f"  - Tools: {', '.join(event['tools'])}")
                     if 'bundle' in event:
@@ -223,8 +229,7 @@ if user_id:
             else:
                 st.markdown("• _No history yet_")
 
-# Initialize orchestrator
-orc = Orchestrator(use_graph=use_graph)
+orc = get_orchestrator(use_graph)
 
 # Header section
 st.markdown("<h1 style='text-align: center; font-size: 3.5rem; color: #2c2c2c; margin: 2rem 0 0.5rem 0;'>🛋️ NestWell Living</h1>", unsafe_allow_html=True)
@@ -254,27 +259,46 @@ st.code(
 # Message input and send functionality
 msg = st.text_input("Your message", placeholder="Tell us how we can help with your home...")
 if st.button("Send", type="primary") and msg:
-    with st.spinner("Processing your message..."):
-        reply, tags, trace = orc.handle_message(user_id, msg)
-
-        # Add to chat history with improved formatting
-        st.session_state.history.append(("You", msg))
-
-        # Format the agent response with clean metadata
-        formatted_reply = reply
-        if tags or trace:
-            metadata_parts = []
-            if tags:
-                metadata_parts.append(f"**Tags:** {', '.join(tags)}")
-            if trace:
-                metadata_parts.append(f"**Trace:** `{trace[:8]}...`")
-
-            formatted_reply += f"\n\n---\n<small>{' | '.join(metadata_parts)}</small>"
-
-        st.session_state.history.append(("Agent", formatted_reply))
-
-        # Force a rerun to refresh the memory panel
-        st.rerun()
+    st.chat_message("user").markdown(msg)
+    done = {}
+    with st.chat_message("assistant"):
+        progress = st.empty()
+
+        def reply_tokens():
+            # Render the reply as it streams; tool progress shows above it
+            for event in orc.handle_message_stream(user_id, msg):
+                if event["event"] == "token":
+                    yield event["text"]
+                elif event["event"] == "tool_call":
+                    progress.caption(f"Calling {event['name']}...")
+                elif event["event"] == "tool_result":
+                    progress.caption(f"{event['name']} {'done' if event['ok'] else 'failed'}")
+                elif event["event"] == "done":
+                    done.update(event)
+
+        st.write_stream(reply_tokens())
+        progress.empty()
+    reply, tags, trace = done["reply"], done["tags"], done["trace_id"]
+
+    # Add to chat history with improved formatting
+    st.session_state.history.append(("You", msg))
+
+    # Format the agent response with clean metadata
+    formatted_reply = reply
+    if tags or trace:
+        metadata_parts = []
+        if tags:
+            metadata_parts.append(f"**Tags:** {', '.join(tags)}")
+        if trace:
+            metadata_parts.append(f"**Trace:** `{trace[:8]}...`")
+        metadata_parts.append(f"**TTFT:** {done['ttft_ms']:.0f} ms")
+
+        formatted_reply += f"\n\n---\n<small>{' | '.join(metadata_parts)}</small>"
+
+    st.session_state.history.append(("Agent", formatted_reply))
+
+    # Force a rerun to refresh the memory panel
+    st.rerun()
 
 st.divider()
 
@@ -0,0 +1,12 @@
+import atexit, os, shutil, tempfile
+
+# Settings are read when modules are imported, so point every default store at a scratch
+# directory before any test imports src; tests that need their own files pass paths in.
+_scratch = tempfile.mkdtemp(prefix="nestwell-tests-")
+atexit.register(shutil.rmtree, _scratch, ignore_errors=True)  # registered first, so it runs after the stores' own close()
+for name, default in {"MEMORY_LOG_DIR": "log", "MEMORY_INDEX_PATH": "memory.db", "HELPDESK_DB_PATH": "helpdesk.sqlite",
+                      "CRM_OUTBOX_PATH": "crm_outbox.sqlite", "CRM_FAKE_PATH": "crm_fake.sqlite",
+                      "EVALS_CHECKPOINT": "checkpoint.json"}.items():
+    os.environ.setdefault(name, os.path.join(_scratch, default))
+os.environ.setdefault("TRACE_EXPORTER", "none")
+os.environ.setdefault("LLM_BACKEND", "stub")
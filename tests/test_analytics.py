@@ -0,0 +1,100 @@
+import json, os
+import pytest
+from src.evals.analytics import CHECKPOINT_PATH, Analytics, checkpoint_before_compaction
+from src.memory.store import MemoryStore
+
+def make(tmp_path):
+    return MemoryStore(tmp_path / "log", tmp_path / "memory.db", legacy_path=None, buffered=False, segment_bytes=1500)
+
+def fill(m, n, start=0):
+    for i in range(start, start + n):
+        m.add_interaction(f"u{i % 4}", {"intent": "sales_assist" if i % 3 else "kb_answer", "tags": ["lead_created"], "i": i})
+
+@pytest.fixture
+def checkpoint():
+    """The checkpoint compaction keeps up to date (EVALS_CHECKPOINT, a scratch file under test)."""
+    yield CHECKPOINT_PATH
+    CHECKPOINT_PATH.unlink(missing_ok=True)
+
+def counted(path, window="day"):
+    return Analytics.load(path, window).events[("total", "")]
+
+def test_resumes_from_the_checkpoint(tmp_path):
+    m, ck = make(tmp_path), tmp_path / "ck.json"
+    fill(m, 120)
+    first = Analytics.load(ck)
+    assert first.update(m.log_dir, None, workers=1)["events"] == 120
+    first.save(ck)
+    fill(m, 30, start=120)
+    resumed = Analytics.load(ck)
+    stats = resumed.update(m.log_dir, None, workers=1, range_bytes=700)
+    assert stats["events"] == 30  # only what was appended since
+    full = Analytics()
+    full.update(m.log_dir, None, workers=2, range_bytes=700)
+    assert resumed.events == full.events and resumed.contained == full.contained
+    assert resumed.report()["containment_rate"] == round(100 / 150, 3)
+
+def test_a_checkpoint_for_another_window_starts_over(tmp_path):
+    m, ck = make(tmp_path), tmp_path / "ck.json"
+    fill(m, 20)
+    state = Analytics("day")
+    state.update(m.log_dir, None, workers=1)
+    state.save(ck)
+    assert Analytics.load(ck, "hour").offsets == {}
+
+def test_leaves_a_partial_line_for_the_next_run(tmp_path):
+    m, ck = make(tmp_path), tmp_path / "ck.json"
+    fill(m, 10)
+    seg = m._seg_path(m.segments()[-1])
+    line = json.dumps({"user_id": "u0", "intent": "sales_assist", "ts": 0}) + "\n"
+    with open(seg, "a") as f:
+        f.write(line[:12])
+    state = Analytics.load(ck)
+    state.update(m.log_dir, None, workers=1)
+    state.save(ck)
+    with open(seg, "a") as f:
+        f.write(line[12:])
+    resumed = Analytics.load(ck)
+    assert resumed.update(m.log_dir, None, workers=1)["events"] == 1
+    assert resumed.bad_lines == 0
+
+def test_compaction_brings_the_checkpoint_up_to_date(tmp_path, checkpoint):
+    m = make(tmp_path)
+    fill(m, 100)
+    state = Analytics()
+    state.update(m.log_dir, None, workers=1)
+    state.save(checkpoint)
+    fill(m, 60, start=100)  # logged after the last run, then compacted away
+    assert m.compact(keep=2)
+    resumed = Analytics.load(checkpoint)
+    resumed.update(m.log_dir, None, workers=1)
+    assert resumed.events[("total", "")] == 160
+
+def test_checkpoint_for_another_log_is_left_alone(tmp_path):
+    other = make(tmp_path / "other")
+    fill(other, 5)
+    state = Analytics()
+    state.update(other.log_dir, None, workers=1)
+    state.save(tmp_path / "ck.json")
+    assert checkpoint_before_compaction(tmp_path / "log", None, tmp_path / "ck.json") is None
+    assert counted(tmp_path / "ck.json") == 5
+
+def test_full_run_reads_compacted_segments_from_the_archive(tmp_path):
+    m = make(tmp_path)
+    fill(m, 200)
+    m.compact(keep=1)
+    state = Analytics()
+    state.update(m.log_dir, None, workers=2)
+    assert state.events[("total", "")] == 200 and "missing_segments" not in state.report()
+
+def test_full_run_flags_missing_archives(tmp_path):
+    m = make(tmp_path)
+    fill(m, 200)
+    m.compact(keep=1)
+    os.remove(tmp_path / "log" / "archive" / "00000002.jsonl.gz")
+    state = Analytics()
+    state.update(m.log_dir, None, workers=1)
+    assert state.events[("total", "")] < 200
+    assert state.report()["missing_segments"] == [2]
+    state.save(tmp_path / "ck.json")
+    assert Analytics.load(tmp_path / "ck.json").missing == [2]
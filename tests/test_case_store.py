@@ -0,0 +1,64 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from src.tools.case_store import MIGRATIONS, CaseStore, case_id, case_seq
+
+def test_a_repeat_complaint_about_an_order_updates_the_open_case(tmp_path):
+    store = CaseStore(str(tmp_path / "h.sqlite"))
+    first = store.open_case("jamie", "Delay on NW1", {"delayed": True}, order_id="NW1")
+    again = store.open_case("jamie", "Still waiting on NW1", order_id="NW1")
+    assert not first["repeat"] and again["repeat"]
+    assert again["id"] == first["id"] and again["repeats"] == 1
+    assert store.get(first["id"])["summary"] == "Delay on NW1"  # the first report stays the case's summary
+    assert store.open_for_order("jamie", "NW1")["repeats"] == 1
+
+def test_another_user_naming_the_order_gets_their_own_case(tmp_path):
+    store = CaseStore(str(tmp_path / "h.sqlite"))
+    mine = store.open_case("jamie", "Delay on NW1", order_id="NW1")
+    theirs = store.open_case("riley", "Delay on NW1", order_id="NW1")
+    assert theirs["id"] != mine["id"] and not theirs["repeat"]
+    assert store.open_for_order("riley", "NW1")["id"] == theirs["id"]
+
+def test_cases_without_an_order_dedupe_on_summary(tmp_path):
+    store = CaseStore(str(tmp_path / "h.sqlite"))
+    a = store.open_case("jamie", "Sofa arrived scratched")
+    assert store.open_case("jamie", "Sofa arrived scratched")["id"] == a["id"]
+    assert store.open_case("jamie", "Wrong colour")["id"] != a["id"]
+    assert [c["summary"] for c in store.list_open("jamie")] == ["Wrong colour", "Sofa arrived scratched"]
+
+def test_closing_lets_a_new_case_open(tmp_path):
+    store = CaseStore(str(tmp_path / "h.sqlite"))
+    first = store.open_case("jamie", "Delay on NW1", order_id="NW1")
+    assert store.close(first["id"]) and not store.close(first["id"])
+    assert not store.close("not-a-case")
+    second = store.open_case("jamie", "Delay on NW1", order_id="NW1")
+    assert second["id"] != first["id"] and not second["repeat"]
+    assert [c["id"] for c in store.list_open("jamie")] == [second["id"]]
+
+def test_concurrent_reports_open_one_case(tmp_path):
+    path = str(tmp_path / "h.sqlite")
+    stores = [CaseStore(path) for _ in range(4)]  # one connection each, like separate workers
+    with ThreadPoolExecutor(16) as pool:
+        results = list(pool.map(lambda i: stores[i % 4].open_case("jamie", "Delay", order_id="NW1"), range(64)))
+    assert len({r["id"] for r in results}) == 1 and sum(not r["repeat"] for r in results) == 1
+    assert stores[0].open_for_order("jamie", "NW1")["repeats"] == 63
+
+def test_the_old_per_order_index_is_dropped_once(tmp_path):
+    path = str(tmp_path / "h.sqlite")
+    db = sqlite3.connect(path)
+    db.executescript("""CREATE TABLE cases (seq INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, order_id TEXT,
+                                            summary TEXT NOT NULL, details TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'open',
+                                            repeats INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, updated_at REAL NOT NULL);
+                        CREATE UNIQUE INDEX cases_open_by_order ON cases (order_id) WHERE status = 'open';""")
+    db.close()
+    CaseStore(path)
+    db = sqlite3.connect(path)
+    assert db.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    assert "cases_open_by_order" not in {r[0] for r in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    db.execute("CREATE INDEX cases_open_by_order ON cases (order_id)")  # not ours any more: left alone from now on
+    db.commit()
+    CaseStore(path)
+    assert "cases_open_by_order" in {r[0] for r in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+def test_case_ids_round_trip():
+    assert case_id(42) == "C0000042" and case_seq("C0000042") == 42
+    assert case_seq("X12") is None and case_seq("C") is None
@@ -0,0 +1,73 @@
+import time
+import pytest
+from src.tools import crm_outbox
+from src.tools.crm import CRMTool
+from src.tools.crm_outbox import FakeCRM, Outbox
+
+class Down:
+    calls = 0
+
+    def upsert(self, records):
+        self.calls += 1
+        raise ConnectionError("CRM unavailable")
+
+@pytest.fixture(autouse=True)
+def manual_flush(monkeypatch):
+    """No background flusher: each test sends with flush_once() when it wants to."""
+    monkeypatch.setattr(Outbox, "_run", lambda self: None)
+    monkeypatch.setattr(crm_outbox, "BACKOFF_BASE", 0.0)
+
+def outbox(tmp_path, backend=None, **kw):
+    return Outbox(str(tmp_path / "outbox.sqlite"), backend=backend or FakeCRM(str(tmp_path / "crm.sqlite")), **kw)
+
+def records(tmp_path):
+    return FakeCRM(str(tmp_path / "crm.sqlite")).stats()
+
+def test_retried_writes_land_on_one_record(tmp_path):
+    crm = CRMTool(outbox(tmp_path))
+    first = crm.create_lead("jamie", {"bundle": ["sofa"]}, source="I want a sofa")
+    assert crm.create_lead("jamie", {"bundle": ["sofa"]}, source="I want a sofa") == first
+    assert crm.create_lead("jamie", {"bundle": ["bed"]}, source="and a bed") != first
+    assert crm.outbox.pending() == 2
+    assert crm.outbox.flush_once() == 2
+    assert crm.outbox.pending() == 0 and records(tmp_path) == {"records": 2, "upserts": 2}
+
+def test_a_claimed_batch_is_retried_once_its_lease_expires(tmp_path, monkeypatch):
+    monkeypatch.setattr(crm_outbox, "LEASE_SECS", 0.2)
+    dying, survivor = outbox(tmp_path), outbox(tmp_path)
+    CRMTool(dying).create_lead("jamie", {}, source="hello")
+    assert len(dying._claim(time.time())) == 1  # claimed, then the worker dies before sending
+    assert survivor.flush_once() == 0  # still leased
+    time.sleep(0.25)
+    assert survivor.flush_once() == 1
+    assert survivor.stats()["sent"] == 1 and records(tmp_path)["records"] == 1
+
+def test_a_resent_batch_updates_rather_than_duplicates(tmp_path, monkeypatch):
+    monkeypatch.setattr(crm_outbox, "LEASE_SECS", 0.0)
+    box = outbox(tmp_path)
+    CRMTool(box).create_opportunity("jamie", {"total": 10.0, "items": []}, source="quote")
+    claimed = box._claim(time.time())
+    box.backend.upsert([{k: r[k] for k in ("key", "kind", "id", "user_id", "payload")} for r in claimed])
+    assert box.flush_once() == 1  # sent again: the CRM saw the first copy, the outbox never recorded it
+    assert records(tmp_path) == {"records": 1, "upserts": 2}
+
+def test_failures_back_off_then_dead_letter(tmp_path, monkeypatch):
+    monkeypatch.setattr(crm_outbox, "MAX_ATTEMPTS", 3)
+    down = Down()
+    box = outbox(tmp_path, backend=down)
+    CRMTool(box).create_lead("jamie", {}, source="hello")
+    for attempt in range(1, 4):
+        assert box.flush_once() == 1
+        row = box._db.execute("SELECT status, attempts, error FROM outbox").fetchone()
+        assert row[:2] == ("pending" if attempt < 3 else "dead", attempt) and "CRM unavailable" in row[2]
+    assert box.flush_once() == 0 and down.calls == 3
+    assert box.pending() == 0 and box.stats()["dead"] == 1 and box.failed == 3
+
+def test_failed_records_wait_for_their_backoff(tmp_path, monkeypatch):
+    monkeypatch.setattr(crm_outbox, "BACKOFF_BASE", 30.0)
+    monkeypatch.setattr(crm_outbox.random, "uniform", lambda lo, hi: hi)  # the longest jittered delay
+    box = outbox(tmp_path, backend=Down())
+    CRMTool(box).create_lead("jamie", {}, source="hello")
+    box.flush_once()
+    assert box._db.execute("SELECT next_at FROM outbox").fetchone()[0] > time.time() + 25
+    assert box.flush_once() == 0 and box.pending() == 1
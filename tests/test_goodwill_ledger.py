@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+from src.tools.goodwill_ledger import GoodwillLedger, period_of
+
+def ledger(tmp_path, **kw):
+    kw = {"max_credit": 50, "user_cap": 100, "period": "month", "enabled": True, **kw}
+    return GoodwillLedger(str(tmp_path / "h.sqlite"), **kw)
+
+def test_grants_are_clamped_to_the_per_credit_maximum(tmp_path):
+    credit = ledger(tmp_path).grant("jamie", 80)
+    assert credit["amount"] == 50 and credit["requested"] == 80 and credit["capped"]
+    assert credit["remaining"] == 50
+
+def test_the_user_cap_holds_for_the_period(tmp_path):
+    book = ledger(tmp_path)
+    amounts = [book.grant("jamie", 40)["amount"] for _ in range(4)]
+    assert amounts == [40, 40, 20, 0]
+    assert book.remaining("jamie") == 0 and book.remaining("riley") == 100
+    day = book.daily_totals()
+    assert len(day) == 1 and day[0]["granted"] == 100 and day[0]["requests"] == 4 and day[0]["denied"] == 1
+
+def test_lowering_the_cap_never_makes_remaining_negative(tmp_path):
+    ledger(tmp_path).grant("jamie", 50)
+    lowered = ledger(tmp_path, user_cap=20)
+    assert lowered.remaining("jamie") == 0
+    credit = lowered.grant("jamie", 10)
+    assert credit["amount"] == 0 and credit["remaining"] == 0
+
+def test_disabled_grants_nothing_but_records_the_request(tmp_path):
+    book = ledger(tmp_path, enabled=False)
+    assert book.grant("jamie", 20)["amount"] == 0 and book.remaining("jamie") == 0
+    assert book.daily_totals()[0]["denied"] == 1
+
+def test_concurrent_grants_stop_at_the_cap(tmp_path):
+    books = [ledger(tmp_path) for _ in range(4)]  # one connection each, like separate workers
+    with ThreadPoolExecutor(16) as pool:
+        granted = list(pool.map(lambda i: books[i % 4].grant("jamie", 7.5)["amount"], range(80)))
+    assert round(sum(granted), 2) == 100 and books[0].remaining("jamie") == 0
+    assert books[0].daily_totals()[0]["granted"] == 100
+
+def test_periods():
+    ts = 1760745600  # 2025-10-18 00:00 UTC
+    assert period_of(ts, "day") == "2025-10-18"
+    assert period_of(ts, "week") == "2025-W42"
+    assert period_of(ts, "month") == "2025-10"
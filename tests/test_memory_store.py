@@ -0,0 +1,129 @@
+import json, threading, time
+import pytest
+from src.memory import store
+from src.memory.store import MemoryStore
+
+def make(tmp_path, **kw):
+    kw.setdefault("buffered", False)
+    kw.setdefault("segment_bytes", 1000)
+    return MemoryStore(tmp_path / "log", tmp_path / "memory.db", legacy_path=None, **kw)
+
+def fill(m, n, users=5, start=0):
+    for i in range(start, start + n):
+        m.add_interaction(f"u{i % users}", {"intent": "sales_assist", "i": i})
+
+def seen(m, user_id, limit=1000):
+    return [e["i"] for e in m.history(user_id, limit=limit)["events"]]
+
+def test_rolls_over_to_a_new_segment_when_full(tmp_path):
+    m = make(tmp_path)
+    fill(m, 100)
+    segs = m.segments()
+    assert len(segs) > 3 and segs == list(range(1, len(segs) + 1))
+    sizes = [m._seg_path(s).stat().st_size for s in segs[:-1]]
+    assert all(size <= 1000 + 100 for size in sizes)  # a segment is sealed once the next batch would overflow it
+    assert seen(m, "u0") == list(range(0, 100, 5))
+
+def test_rolls_over_by_age(tmp_path):
+    m = make(tmp_path, segment_bytes=10**9, segment_secs=0.05)
+    fill(m, 3)
+    time.sleep(0.1)
+    fill(m, 3, start=3)
+    assert len(m.segments()) == 2
+
+def test_buffered_writes_are_read_back(tmp_path):
+    m = make(tmp_path, buffered=True, flush_ms=5)
+    fill(m, 50)
+    assert seen(m, "u1") == list(range(1, 50, 5))
+    m.close()
+
+def test_recovers_the_index_from_the_log(tmp_path):
+    m = make(tmp_path)
+    fill(m, 60)
+    m.update_traits("u2", {"tier": "gold"})
+    m.close()
+    (tmp_path / "memory.db").unlink()
+    fresh = make(tmp_path)
+    assert seen(fresh, "u2") == list(range(2, 60, 5))
+    assert fresh.get_profile("u2")["history_total"] == 12
+
+def test_skips_a_torn_line_until_it_is_complete(tmp_path):
+    m = make(tmp_path, segment_bytes=10**9)
+    fill(m, 5)
+    m.close()
+    line = json.dumps({"user_id": "u0", "ts": time.time(), "i": 99}) + "\n"
+    path = m._seg_path(m.segments()[-1])
+    with open(path, "a") as f:
+        f.write(line[:10])  # a writer died mid-line
+    reopened = make(tmp_path, segment_bytes=10**9)
+    assert seen(reopened, "u0") == [0]
+    with open(path, "a") as f:
+        f.write(line[10:])
+    assert seen(make(tmp_path, segment_bytes=10**9), "u0") == [0, 99]
+
+def test_compaction_keeps_the_last_events_per_user(tmp_path):
+    m = make(tmp_path)
+    fill(m, 200)
+    active = m.segments()[-1]
+    stats = m.compact(keep=4)
+    assert stats["segments"] == active - 1 and stats["bytes_after"] < stats["bytes_before"]
+    assert m.segments() == [-(active - 1), active]
+    snapshot = [json.loads(line) for line in m._seg_path(-(active - 1)).read_text().splitlines()]
+    assert sorted(e["user_id"] for e in snapshot) == sorted(f"u{u}" for u in range(5) for _ in range(4))
+    for u in range(5):
+        mine = [i for i in range(200) if i % 5 == u]
+        assert seen(m, f"u{u}") == mine[len(mine) - len(seen(m, f"u{u}")):]  # the newest events, in order
+    assert sorted(p.name for p in (tmp_path / "log" / "archive").iterdir()) == \
+        [f"{s:08d}.jsonl.gz" for s in range(1, active)]
+
+def test_compaction_drops_cleared_users(tmp_path):
+    m = make(tmp_path)
+    fill(m, 200)
+    m.clear_profile("u3")
+    fill(m, 40, start=200)
+    m.compact(keep=100)
+    assert seen(m, "u3") == list(range(203, 240, 5))
+    snapshot = m._seg_path(m.segments()[0]).read_text().splitlines()
+    assert not any(json.loads(line)["user_id"] == "u3" and json.loads(line)["i"] < 200 for line in snapshot)
+    assert make(tmp_path).get_profile("u3")["history_total"] == 8
+
+def test_compaction_needs_enough_sealed_segments(tmp_path):
+    m = make(tmp_path)
+    fill(m, 30)
+    assert m.compact(min_segments=len(m.segments()) + 1) is None
+
+def test_compaction_runs_hooks_and_lets_appends_through(tmp_path, monkeypatch):
+    m = make(tmp_path)
+    fill(m, 200)
+    started, release = threading.Event(), threading.Event()
+
+    def hook(log_dir, legacy_path):
+        assert log_dir == m.log_dir and legacy_path is None
+        started.set()
+        release.wait(5)
+
+    monkeypatch.setattr(store, "_compaction_hooks", [hook])
+    compacting = threading.Thread(target=m.compact)
+    compacting.start()
+    assert started.wait(5)
+    t0 = time.monotonic()
+    fill(m, 10, start=200)  # the hook is still running, with the compaction lock held
+    assert time.monotonic() - t0 < 1
+    release.set()
+    compacting.join(5)
+    assert seen(m, "u0")[-2:] == [200, 205]
+
+def test_compaction_backs_off_if_a_profile_is_cleared_meanwhile(tmp_path, monkeypatch):
+    m = make(tmp_path)
+    fill(m, 200)
+    monkeypatch.setattr(store, "_compaction_hooks", [lambda log_dir, legacy_path: m.clear_profile("u1")])
+    before = m.segments()
+    assert m.compact() is None
+    assert m.segments() == before and not list((tmp_path / "log").glob("*.tmp"))
+    monkeypatch.setattr(store, "_compaction_hooks", [])
+    assert m.compact()["segments"] == len(before) - 1
+    assert seen(m, "u1") == []
+
+def test_rejects_unknown_durability(tmp_path):
+    with pytest.raises(ValueError):
+        make(tmp_path, durability="sometimes")
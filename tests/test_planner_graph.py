@@ -0,0 +1,87 @@
+import threading, time
+import pytest
+from src.agents import planner_graph
+from src.agents.planner_graph import TIMEOUT_RESULT, Deadline, NodeTimeout, support_node
+
+class Orders:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def lookup(self, message):
+        time.sleep(self.delay)
+        return {"order_id": "NW12345", "delayed": True}
+
+class Helpdesk:
+    def __init__(self, credit_delay=0.0, case_delay=0.0):
+        self.credit_delay, self.case_delay = credit_delay, case_delay
+        self.cases = 0
+
+    def list_open_cases(self, user_id):
+        return []
+
+    def issue_goodwill(self, user_id, amount):
+        time.sleep(self.credit_delay)
+        return {"amount": amount, "remaining": 80}
+
+    def create_case(self, user_id, summary, details):
+        time.sleep(self.case_delay)
+        self.cases += 1
+        return {"id": "C0000001", "repeat": False}
+
+@pytest.fixture(autouse=True)
+def short_budget(monkeypatch):
+    monkeypatch.setattr(planner_graph, "NODE_TIMEOUT", 0.2)
+    monkeypatch.setattr(planner_graph, "SETTLE_SECS", 0.3)
+
+def run(helpdesk, orders=None):
+    state = {"message": "where is order NW12345", "user_id": "jamie"}
+    return support_node(state, {"orders": orders or Orders(), "helpdesk": helpdesk})["result"]
+
+def test_within_budget_the_node_answers():
+    text, tags = run(Helpdesk())
+    assert "NW12345 delayed" in text and "Case C0000001 opened" in text
+    assert tags == ["resolved_autonomously", "goodwill_credit", "case_with_context"]
+
+def test_a_timeout_hands_off_and_reports_writes_that_landed():
+    text, tags = run(Helpdesk(credit_delay=0.0, case_delay=0.35))  # the case lands during the settle grace
+    assert text.startswith(TIMEOUT_RESULT[0])
+    assert "Already done: issued a $20 credit; opened case C0000001." in text and "Still in progress" not in text
+    assert tags == ["goodwill_credit", "case_with_context", "tool_timeout", "human_handoff"]
+
+def test_writes_still_running_after_the_grace_are_pending():
+    helpdesk = Helpdesk(case_delay=1.0)
+    t0 = time.monotonic()
+    text, tags = run(helpdesk)
+    assert time.monotonic() - t0 < 0.2 + 0.3 + 0.2  # the budget plus the grace, not the slow write
+    assert "Already done: issued a $20 credit." in text and "Still in progress: your case." in text
+    assert tags == ["goodwill_credit", "write_pending", "tool_timeout", "human_handoff"]
+
+def test_a_timeout_before_any_write_reports_none():
+    text, tags = run(Helpdesk(), orders=Orders(delay=0.5))
+    assert text == TIMEOUT_RESULT[0] and tags == TIMEOUT_RESULT[1]
+
+def test_calls_that_never_started_are_cancelled(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    pool = ThreadPoolExecutor(1)
+    monkeypatch.setattr(planner_graph, "_pool", pool)
+    gate = threading.Event()
+    deadline = Deadline(0.05)
+    blocker = deadline.submit(gate.wait, 5)
+    queued = deadline.write("your case", lambda case: ("opened a case", "case_with_context"), lambda: "case")
+    with pytest.raises(NodeTimeout):
+        deadline.result(queued)
+    done, pending = deadline.settle(grace=0.05)
+    assert queued.cancelled() and done == [] and pending == []
+    gate.set()
+    assert blocker.result(1)
+    pool.shutdown()
+
+def test_failed_writes_are_not_reported():
+    deadline = Deadline(0.05)
+
+    def boom():
+        raise RuntimeError("CRM down")
+
+    deadline.write("your lead", lambda lead: ("created a lead", "lead_created"), boom)
+    time.sleep(0.05)
+    assert deadline.settle(grace=0.1) == ([], [])
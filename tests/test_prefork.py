@@ -0,0 +1,110 @@
+import json, multiprocessing, threading, time
+import pytest
+from src.server import prefork
+from src.server.prefork import Follower, ReloadState
+import src.tools.kb  # Follower imports it on first use; keep that out of the timed polls
+
+def test_read_returns_what_was_published():
+    state = ReloadState()
+    assert state.read() == (0, None)
+    state.publish({"epoch": 1, "kb": "gen-1"})
+    state.publish({"epoch": 2, "kb": "gen-2"})
+    assert state.read() == (4, {"epoch": 2, "kb": "gen-2"})
+
+def test_read_waits_out_a_write_in_progress():
+    state = ReloadState()
+    state.publish({"epoch": 1})
+    body = json.dumps({"epoch": 2}).encode()
+    state._mm[0:8] = (3).to_bytes(8, "little")  # odd: the master is mid-write...
+    state._mm[8:16] = len(body).to_bytes(8, "little")  # ...and the length no longer matches the body
+
+    def finish():
+        state._mm[16:16 + len(body)] = body
+        state._mm[0:8] = (4).to_bytes(8, "little")
+
+    threading.Timer(0.1, finish).start()
+    t0 = time.monotonic()
+    assert state.read() == (4, {"epoch": 2})
+    assert time.monotonic() - t0 >= 0.09
+
+def test_reads_never_see_a_torn_plan():
+    state = ReloadState()
+    stop = threading.Event()
+
+    def publish():
+        n = 0
+        while not stop.is_set():
+            n += 1
+            state.publish({"epoch": n, "kb": f"gen-{n}" * (n % 7 + 1), "check": n})
+
+    writer = threading.Thread(target=publish)
+    writer.start()
+    try:
+        last = 0
+        for _ in range(5000):
+            seq, plan = state.read()
+            assert seq % 2 == 0 and seq >= last
+            last = seq
+            if plan:
+                assert plan["kb"] == f"gen-{plan['check']}" * (plan["check"] % 7 + 1) and plan["epoch"] == plan["check"]
+    finally:
+        stop.set()
+        writer.join()
+
+def test_forked_workers_see_later_plans():
+    ctx = multiprocessing.get_context("fork")
+    state, seen = ReloadState(), ctx.Queue()
+
+    def worker():
+        deadline = time.monotonic() + 5
+        while state.read()[1] is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        seen.put(state.read()[1])
+
+    child = ctx.Process(target=worker)
+    child.start()
+    state.publish({"epoch": 7})  # after the fork: the page is shared, not copied
+    assert seen.get(timeout=5) == {"epoch": 7}
+    child.join(5)
+
+@pytest.fixture
+def versions(monkeypatch):
+    current = {"kb": None, "catalog": 1}
+    monkeypatch.setattr(prefork, "current_versions", lambda: dict(current))
+    return current
+
+def plan(epoch, switch_in=0.0, catalog=1):
+    return {"epoch": epoch, "kb": None, "catalog": catalog, "switch_at": time.time() + switch_in}
+
+def test_follower_switches_at_switch_at(versions):
+    state = ReloadState()
+    follower = Follower(state, background=False)
+    state.publish(plan(1, switch_in=0.2))
+    follower.poll()
+    assert follower.epoch == 0 and follower.stats()["pending"]
+    time.sleep(0.25)
+    follower.poll()
+    assert follower.epoch == 1 and follower.switches == 1 and not follower.stats()["pending"]
+    follower.poll()
+    assert follower.switches == 1  # the same plan isn't applied twice
+
+def test_follower_takes_the_newest_plan(versions):
+    state = ReloadState()
+    follower = Follower(state, background=False)
+    state.publish(plan(1, switch_in=60))
+    follower.poll()
+    state.publish(plan(2))
+    follower.poll()
+    assert follower.epoch == 2 and follower.switches == 1
+
+def test_follower_keeps_serving_when_preparation_fails(versions, monkeypatch):
+    class Broken:
+        def prepare(self, rebuild=True):
+            raise OSError("snapshot unreadable")
+
+    monkeypatch.setattr(prefork, "_snapshots", lambda: Broken())
+    state = ReloadState()
+    follower = Follower(state, background=False)
+    state.publish(plan(1, catalog=2))
+    follower.poll()
+    assert follower.epoch == 0 and follower.errors == 1 and "snapshot unreadable" in follower.last_error